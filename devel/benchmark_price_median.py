@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+# Standard Library
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+# make libbrick importable when run as devel/benchmark_price_median.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# local repo modules
+import libbrick.price_stats
+
+#============================================
+def parse_args() -> argparse.Namespace:
+	"""
+	Parse command-line arguments.
+	"""
+	parser = argparse.ArgumentParser(
+		description='Time the weighted median against the quantity-expanded median')
+	parser.add_argument('-r', '--rows', dest='rows', metavar='N', type=int, default=500,
+		help='price guide rows per guide (default: 500)')
+	parser.add_argument('-q', '--max-quantity', dest='max_quantity', metavar='N', type=int,
+		default=200, help='largest quantity in one row (default: 200)')
+	parser.add_argument('-n', '--repeat', dest='repeat', metavar='N', type=int, default=20,
+		help='guides to time (default: 20)')
+	parser.add_argument('-s', '--seed', dest='seed', type=int, default=1,
+		help='random seed (default: 1)')
+	args = parser.parse_args()
+	return args
+
+#============================================
+def make_price_details(rows: int, max_quantity: int) -> dict:
+	"""
+	Random price guide shaped like a BrickLink reply for a common part.
+	"""
+	price_detail = []
+	for _ in range(rows):
+		price_detail.append({
+			'quantity': random.randint(1, max_quantity),
+			'unit_price': '{0:.4f}'.format(random.lognormvariate(-2.5, 0.8)),
+		})
+	total_quantity = sum(item['quantity'] for item in price_detail)
+	price_details = {'total_quantity': total_quantity, 'price_detail': price_detail}
+	return price_details
+
+#============================================
+def expanded_median_price(price_details: dict, min_qty: int = 1, trim_above_median: bool = False) -> int:
+	"""
+	The list-expanding median that compilePriceData used before, for comparison.
+	"""
+	if int(price_details['total_quantity']) < 1:
+		return -1
+	prices = []
+	for item in price_details['price_detail']:
+		if int(item['quantity']) < min_qty:
+			continue
+		for i in range(int(item['quantity'])):
+			prices.append(int(float(item['unit_price'])*100))
+	if len(prices) <= libbrick.price_stats.MIN_PRICES_FOR_MEDIAN:
+		return -1
+	median = int(statistics.median(prices))
+	if trim_above_median is True:
+		median = int(statistics.median([price for price in prices if price <= median]))
+	return median
+
+#============================================
+def time_function(function, guides: list) -> tuple:
+	"""
+	Run function on every guide, both trimmed and untrimmed.
+
+	Returns:
+		tuple: (seconds, list of results)
+	"""
+	t0 = time.perf_counter()
+	results = []
+	for price_details in guides:
+		results.append(function(price_details))
+		results.append(function(price_details, trim_above_median=True))
+	seconds = time.perf_counter() - t0
+	return seconds, results
+
+#============================================
+def main():
+	"""
+	Time both medians on the same random guides and check they agree.
+	"""
+	args = parse_args()
+	random.seed(args.seed)
+	guides = [make_price_details(args.rows, args.max_quantity) for _ in range(args.repeat)]
+	units = sum(price_details['total_quantity'] for price_details in guides)
+	expanded_seconds, expanded_results = time_function(expanded_median_price, guides)
+	weighted_seconds, weighted_results = time_function(libbrick.price_stats.median_price, guides)
+	if weighted_results != expanded_results:
+		raise RuntimeError("weighted and expanded medians disagree")
+	print(f"{args.repeat} guides, {args.rows} rows each, {units} units in all")
+	print(f"expanded median: {expanded_seconds*1000:.1f} ms")
+	print(f"weighted median: {weighted_seconds*1000:.1f} ms")
+	print(f"speedup: {expanded_seconds/weighted_seconds:.1f}x, results identical")
+
+#============================================
+if __name__ == '__main__':
+	main()
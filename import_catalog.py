@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+# Standard Library
+import os
+import sys
+import argparse
+
+# local repo modules
+import libbrick.catalog_import
+import libbrick.wrappers.rebrick_wrapper as rebrick_wrapper
+import libbrick.wrappers.bricklink_wrapper as bricklink_wrapper
+
+#============================
+#============================
+def parse_args() -> argparse.Namespace:
+	"""
+	Parse command-line arguments.
+	"""
+	parser = argparse.ArgumentParser(
+		description='Fill the local caches from BrickLink XML and Rebrickable CSV catalog downloads')
+	parser.add_argument('catalog_files', metavar='FILE', nargs='+',
+		help='BrickLink catalog XML (items, categories, colors, codes) or '
+			+ 'Rebrickable CSV (sets, minifigs, parts, themes), any order')
+	parser.add_argument('-o', '--overwrite', dest='overwrite', action='store_true',
+		help='replace entries already cached, by default only missing keys are added')
+	args = parser.parse_args()
+	return args
+
+#============================
+#============================
+def main():
+	"""
+	Detect each file's kind, then import them colors first.
+	"""
+	args = parse_args()
+	kinds = {}
+	for file_path in args.catalog_files:
+		if not os.path.isfile(file_path):
+			print(f"Error: The file '{file_path}' does not exist.")
+			sys.exit(1)
+		kind = libbrick.catalog_import.detect_catalog_kind(file_path)
+		if kind is None:
+			print(f"Error: '{file_path}' is not a known catalog download.")
+			sys.exit(1)
+		kinds[file_path] = kind
+	order = libbrick.catalog_import.CATALOG_KINDS
+	file_paths = sorted(kinds, key=lambda file_path: order.index(kinds[file_path]))
+
+	# only open the wrappers that are needed, Rebrick needs its API key file
+	wrappers = {}
+	if any(kind.startswith('bricklink_') for kind in kinds.values()):
+		wrappers['bricklink'] = bricklink_wrapper.BrickLink()
+	if any(kind.startswith('rebrickable_') for kind in kinds.values()):
+		wrappers['rebrickable'] = rebrick_wrapper.Rebrick()
+
+	for file_path in file_paths:
+		kind = kinds[file_path]
+		wrapper = wrappers[kind.split('_')[0]]
+		importer = libbrick.catalog_import.IMPORTERS[kind]
+		counts = importer(wrapper, file_path, overwrite=args.overwrite)
+		for cache_name, count in counts.items():
+			print(f"{os.path.basename(file_path)}: wrote {count} entries to {cache_name}")
+	for wrapper in wrappers.values():
+		wrapper.close()
+
+#============================
+#============================
+if __name__ == '__main__':
+	main()
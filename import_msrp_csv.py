@@ -70,10 +70,8 @@ def _get_cache_path(cache_path: str = None) -> str:
 	"""
 	if cache_path is not None:
 		return cache_path
-	git_root = libbrick.path_utils.get_git_root()
-	if git_root is None:
-		return os.path.join('CACHE', 'msrp_cache.yml')
-	return os.path.join(git_root, 'CACHE', 'msrp_cache.yml')
+	cache_path = os.path.join(libbrick.path_utils.get_cache_dir(), 'msrp_cache.yml')
+	return cache_path
 
 #============================
 #============================
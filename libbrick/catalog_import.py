@@ -0,0 +1,451 @@
+"""
+Bulk import of BrickLink and Rebrickable catalog downloads into the wrapper caches.
+
+BrickLink catalog downloads (Catalog > Download, XML format) fill the
+BrickLink set, minifig, part, category, color, and element ID caches.
+Rebrickable CSV downloads (rebrickable.com/downloads, plain or .csv.gz)
+fill the Rebrickable set, minifig, part, and theme caches. The getters
+then serve these items from the cache with no API calls.
+"""
+
+# Standard Library
+import re
+import csv
+import gzip
+import time
+
+# PIP3 modules
+import lxml.etree
+
+# BrickLink ITEMTYPE codes, as the 'type' field of the API item data
+BRICKLINK_ITEM_TYPES = {
+	'S': 'SET',
+	'M': 'MINIFIG',
+	'P': 'PART',
+	'B': 'BOOK',
+	'G': 'GEAR',
+	'C': 'CATALOG',
+	'I': 'INSTRUCTION',
+	'O': 'ORIGINAL_BOX',
+}
+
+# item types with a BrickLink item cache
+BRICKLINK_ITEM_CACHES = {
+	'SET': 'bricklink_set_cache',
+	'MINIFIG': 'bricklink_minifig_cache',
+	'PART': 'bricklink_part_cache',
+}
+
+# (image_url, thumbnail_url) templates in the form the API item data uses;
+# the catalog download has no image fields, the label scripts need them
+BRICKLINK_IMAGE_URLS = {
+	'SET': ('//img.bricklink.com/ItemImage/SN/0/{no}.png',
+		'//img.bricklink.com/ItemImage/ST/0/{no}.t1.png'),
+	'MINIFIG': ('//img.bricklink.com/ItemImage/MN/0/{no}.png',
+		'//img.bricklink.com/ItemImage/MT/0/{no}.t1.png'),
+	'PART': ('//img.bricklink.com/ItemImage/PL/{no}.png',
+		'//img.bricklink.com/ItemImage/PL/{no}.png'),
+}
+
+# an ampersand that does not start an entity such as &amp; or &#40;
+BARE_AMPERSAND = re.compile(rb'&(?!#?[0-9A-Za-z]+;)')
+
+# import order, colors before the element IDs that name them
+CATALOG_KINDS = (
+	'bricklink_categories',
+	'bricklink_colors',
+	'bricklink_items',
+	'bricklink_codes',
+	'rebrickable_themes',
+	'rebrickable_sets',
+	'rebrickable_minifigs',
+	'rebrickable_parts',
+)
+
+#============================
+#============================
+def read_xml_items(xml_path: str):
+	"""
+	Yield each <ITEM> of a BrickLink XML download as a dict.
+
+	The file is streamed, so a full parts catalog never sits in memory.
+	BrickLink downloads are not always well formed, item names can hold a
+	bare ampersand, so those are escaped before parsing.
+
+	Args:
+		xml_path (str): path to the XML file.
+
+	Yields:
+		dict: lowercase tag name to stripped text, e.g. {'itemid': '3001'}.
+	"""
+	parser = lxml.etree.XMLPullParser(events=('end',), tag='ITEM', recover=True,
+		resolve_entities=False)
+	with open(xml_path, 'rb') as f:
+		for line in f:
+			parser.feed(BARE_AMPERSAND.sub(b'&amp;', line))
+			for row in _read_item_events(parser):
+				yield row
+	parser.close()
+	for row in _read_item_events(parser):
+		yield row
+
+#============================
+#============================
+def _read_item_events(parser):
+	"""
+	Turn the <ITEM> elements a pull parser has finished into dicts.
+	"""
+	for _, element in parser.read_events():
+		row = {}
+		for child in element:
+			row[str(child.tag).lower()] = (child.text or '').strip()
+		# drop parsed items as we go
+		element.clear()
+		yield row
+
+#============================
+#============================
+def read_csv_rows(csv_path: str):
+	"""
+	Yield each row of a Rebrickable CSV download, plain or gzipped, as a dict.
+	"""
+	if csv_path.endswith('.gz'):
+		f = gzip.open(csv_path, 'rt', newline='', encoding='utf-8')
+	else:
+		f = open(csv_path, 'r', newline='', encoding='utf-8')
+	with f:
+		reader = csv.DictReader(f)
+		for row in reader:
+			yield row
+
+#============================
+#============================
+def detect_catalog_kind(file_path: str) -> str:
+	"""
+	Tell which catalog download a file is from its first item or header.
+
+	Args:
+		file_path (str): BrickLink XML or Rebrickable CSV file.
+
+	Returns:
+		str: one of CATALOG_KINDS, or None if the file is not recognized.
+	"""
+	if '.xml' in file_path.lower():
+		items = read_xml_items(file_path)
+		row = next(items, None)
+		items.close()
+		if row is None:
+			return None
+		if 'codename' in row:
+			return 'bricklink_codes'
+		if 'itemtype' in row:
+			return 'bricklink_items'
+		if 'categoryname' in row:
+			return 'bricklink_categories'
+		if 'colorname' in row:
+			return 'bricklink_colors'
+		return None
+	rows = read_csv_rows(file_path)
+	header = set(next(rows, {}).keys())
+	rows.close()
+	if {'set_num', 'theme_id'} <= header:
+		return 'rebrickable_sets'
+	if 'fig_num' in header:
+		return 'rebrickable_minifigs'
+	if {'part_num', 'part_cat_id'} <= header:
+		return 'rebrickable_parts'
+	if {'id', 'name', 'parent_id'} <= header:
+		return 'rebrickable_themes'
+	return None
+
+#============================
+#============================
+def _int_or_none(text: str):
+	"""
+	Integer value of a catalog field, None for an empty or non-numeric field.
+	"""
+	if text is None or not text.strip().isdigit():
+		return None
+	return int(text)
+
+#============================
+#============================
+def _merge_entries(cache, entries: dict, overwrite: bool) -> int:
+	"""
+	Write new entries into a cache in one bulk write.
+
+	Args:
+		cache: wrapper cache dict.
+		entries (dict): key to entry.
+		overwrite (bool): also replace keys already in the cache, which
+			may hold richer data from the API.
+
+	Returns:
+		int: number of entries written.
+	"""
+	if overwrite is False:
+		entries = {key: value for key, value in entries.items() if key not in cache}
+	cache.update(entries)
+	return len(entries)
+
+#============================
+#============================
+def fold_parent_names(names: list) -> str:
+	"""
+	Join a category path the way the getters join parent and child names.
+
+	'Star Wars / Star Wars Episode 4/5/6' becomes 'Star Wars Episode 4/5/6',
+	'Town / City' becomes 'Town City'.
+
+	Args:
+		names (list): names from the root category down.
+
+	Returns:
+		str: folded name.
+	"""
+	full_name = names[0]
+	for name in names[1:]:
+		if not name.startswith(full_name):
+			name = full_name + ' ' + name
+		full_name = name
+	return full_name
+
+#============================
+#============================
+def bricklink_item_entry(row: dict, now: int) -> dict:
+	"""
+	Turn one catalog <ITEM> into item data shaped like the API reply.
+
+	Args:
+		row (dict): item from read_xml_items().
+		now (int): time stamp for the cache entry.
+
+	Returns:
+		dict: item data with 'no', 'name', 'type', 'category_id', the
+			'image_url' and 'thumbnail_url' for sets, minifigs, and parts,
+			and any of 'year_released', 'weight', 'dim_x', 'dim_y', 'dim_z'
+			present.
+	"""
+	item_data = {
+		'no': row['itemid'],
+		'name': row.get('itemname', ''),
+		'type': BRICKLINK_ITEM_TYPES.get(row.get('itemtype'), row.get('itemtype')),
+		'category_id': _int_or_none(row.get('category')),
+		'time': now,
+	}
+	if item_data['type'] in BRICKLINK_IMAGE_URLS:
+		image_template, thumbnail_template = BRICKLINK_IMAGE_URLS[item_data['type']]
+		item_data['image_url'] = image_template.format(no=item_data['no'])
+		item_data['thumbnail_url'] = thumbnail_template.format(no=item_data['no'])
+	year_released = _int_or_none(row.get('itemyear'))
+	if year_released is not None:
+		item_data['year_released'] = year_released
+	# the API sends weight and dimensions as strings too
+	for tag, key in (('itemweight', 'weight'), ('itemdimx', 'dim_x'),
+			('itemdimy', 'dim_y'), ('itemdimz', 'dim_z')):
+		if row.get(tag):
+			item_data[key] = row[tag]
+	return item_data
+
+#============================
+#============================
+def import_bricklink_items(blw, xml_path: str, overwrite: bool = False) -> dict:
+	"""
+	Fill the BrickLink set, minifig, and part caches from a catalog items download.
+
+	Args:
+		blw: BrickLink wrapper.
+		xml_path (str): Catalog > Download > Items XML file.
+		overwrite (bool): replace entries already cached.
+
+	Returns:
+		dict: cache name to number of entries written.
+	"""
+	now = int(time.time())
+	entries = {cache_name: {} for cache_name in BRICKLINK_ITEM_CACHES.values()}
+	for row in read_xml_items(xml_path):
+		if not row.get('itemid'):
+			continue
+		item_data = bricklink_item_entry(row, now)
+		cache_name = BRICKLINK_ITEM_CACHES.get(item_data['type'])
+		if cache_name is None:
+			continue
+		item_data['name'] = blw.decode_and_normalize(item_data['name'])
+		entries[cache_name][item_data['no']] = item_data
+	counts = {}
+	for cache_name, cache_entries in entries.items():
+		counts[cache_name] = _merge_entries(getattr(blw, cache_name), cache_entries, overwrite)
+	return counts
+
+#============================
+#============================
+def import_bricklink_categories(blw, xml_path: str, overwrite: bool = False) -> dict:
+	"""
+	Fill the BrickLink category cache from a catalog categories download.
+	"""
+	entries = {}
+	for row in read_xml_items(xml_path):
+		category_id = _int_or_none(row.get('category'))
+		if category_id is None:
+			continue
+		names = [name.strip() for name in row.get('categoryname', '').split(' / ')]
+		entries[category_id] = blw.decode_and_normalize(fold_parent_names(names))
+	counts = {'bricklink_category_cache': _merge_entries(blw.bricklink_category_cache, entries, overwrite)}
+	return counts
+
+#============================
+#============================
+def import_bricklink_colors(blw, xml_path: str, overwrite: bool = False) -> dict:
+	"""
+	Fill the BrickLink color cache from a catalog colors download.
+	"""
+	entries = {}
+	for row in read_xml_items(xml_path):
+		color_id = _int_or_none(row.get('color'))
+		if color_id is None:
+			continue
+		entries[color_id] = {
+			'color_id': color_id,
+			'color_name': row.get('colorname', ''),
+			'color_code': row.get('colorrgb', ''),
+			'color_type': row.get('colortype', ''),
+		}
+	counts = {'bricklink_color_cache': _merge_entries(blw.bricklink_color_cache, entries, overwrite)}
+	# rebuild the in-memory table on next use
+	blw.color_dict = None
+	return counts
+
+#============================
+#============================
+def import_bricklink_codes(blw, xml_path: str, overwrite: bool = False) -> dict:
+	"""
+	Fill the BrickLink element ID map from a catalog item codes download.
+
+	The codes file names colors, so the color cache must be filled first,
+	by import_bricklink_colors() or an earlier getColorList().
+	When a part and color have several element IDs, the newest (largest)
+	one is kept for the part-and-color lookup.
+
+	Returns:
+		dict: cache name to number of entries written.
+	"""
+	color_ids = {color_data['color_name']: color_id
+		for color_id, color_data in blw.bricklink_color_cache.items()}
+	entries = {}
+	unknown_colors = set()
+	for row in read_xml_items(xml_path):
+		if row.get('itemtype') != 'P':
+			continue
+		elementID = _int_or_none(row.get('codename'))
+		colorID = color_ids.get(row.get('color'))
+		if colorID is None:
+			unknown_colors.add(row.get('color'))
+			continue
+		if elementID is None:
+			continue
+		partID = row['itemid']
+		entries[elementID] = [partID, colorID]
+		key_str = "{0},{1}".format(partID, colorID)
+		if elementID > entries.get(key_str, 0):
+			entries[key_str] = elementID
+	if len(unknown_colors) > 0:
+		print(f"skipped codes for {len(unknown_colors)} colors not in the color cache")
+	counts = {'bricklink_element_id_map_cache':
+		_merge_entries(blw.bricklink_element_id_map_cache, entries, overwrite)}
+	return counts
+
+#============================
+#============================
+def import_rebrickable_themes(rbw, csv_path: str, overwrite: bool = False) -> dict:
+	"""
+	Fill the Rebrickable theme cache, with parent names joined like getThemeName().
+	"""
+	rows = {}
+	for row in read_csv_rows(csv_path):
+		rows[int(row['id'])] = (row['name'], _int_or_none(row.get('parent_id')))
+	entries = {}
+	for themeID in rows:
+		names = []
+		parentID = themeID
+		# walk up to the root theme, a missing parent ends the walk
+		while parentID is not None and parentID in rows and len(names) < 20:
+			name, parentID = rows[parentID]
+			names.insert(0, name)
+		entries[themeID] = fold_parent_names(names)
+	counts = {'rebrick_theme_cache': _merge_entries(rbw.rebrick_theme_cache, entries, overwrite)}
+	return counts
+
+#============================
+#============================
+def import_rebrickable_sets(rbw, csv_path: str, overwrite: bool = False) -> dict:
+	"""
+	Fill the Rebrickable set cache from sets.csv.
+	"""
+	now = int(time.time())
+	entries = {}
+	for row in read_csv_rows(csv_path):
+		setID = row['set_num']
+		entries[setID] = {
+			'set_num': setID,
+			'name': row['name'],
+			'year': _int_or_none(row.get('year')),
+			'theme_id': _int_or_none(row.get('theme_id')),
+			'num_parts': _int_or_none(row.get('num_parts')),
+			'set_img_url': row.get('img_url', ''),
+			'set_id': setID,
+			'time': now,
+		}
+	counts = {'rebrick_set_cache': _merge_entries(rbw.rebrick_set_cache, entries, overwrite)}
+	return counts
+
+#============================
+#============================
+def import_rebrickable_minifigs(rbw, csv_path: str, overwrite: bool = False) -> dict:
+	"""
+	Fill the Rebrickable minifig cache from minifigs.csv.
+	"""
+	now = int(time.time())
+	entries = {}
+	for row in read_csv_rows(csv_path):
+		entries[row['fig_num']] = {
+			# the API names the minifig ID set_num too
+			'set_num': row['fig_num'],
+			'name': row['name'],
+			'num_parts': _int_or_none(row.get('num_parts')),
+			'set_img_url': row.get('img_url', ''),
+			'time': now,
+		}
+	counts = {'rebrick_minifig_cache': _merge_entries(rbw.rebrick_minifig_cache, entries, overwrite)}
+	return counts
+
+#============================
+#============================
+def import_rebrickable_parts(rbw, csv_path: str, overwrite: bool = False) -> dict:
+	"""
+	Fill the Rebrickable part cache from parts.csv.
+	"""
+	now = int(time.time())
+	entries = {}
+	for row in read_csv_rows(csv_path):
+		entries[row['part_num']] = {
+			'part_num': row['part_num'],
+			'name': row['name'],
+			'part_cat_id': _int_or_none(row.get('part_cat_id')),
+			'part_material': row.get('part_material', ''),
+			'time': now,
+		}
+	counts = {'rebrick_part_cache': _merge_entries(rbw.rebrick_part_cache, entries, overwrite)}
+	return counts
+
+#============================
+#============================
+IMPORTERS = {
+	'bricklink_categories': import_bricklink_categories,
+	'bricklink_colors': import_bricklink_colors,
+	'bricklink_items': import_bricklink_items,
+	'bricklink_codes': import_bricklink_codes,
+	'rebrickable_themes': import_rebrickable_themes,
+	'rebrickable_sets': import_rebrickable_sets,
+	'rebrickable_minifigs': import_rebrickable_minifigs,
+	'rebrickable_parts': import_rebrickable_parts,
+}
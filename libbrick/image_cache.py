@@ -1,18 +1,29 @@
 # Standard Library
 import os
-import fcntl
+import sys
+import json
 import time
-import random
+import queue
+import fcntl
+import atexit
+import select
 import shutil
+import hashlib
+import threading
 import subprocess
+import multiprocessing
+import concurrent.futures
 
 # PIP3 modules
 import requests
+import requests.adapters
 import PIL.Image
 import PIL.ImageChops
 
 # local repo modules
 import libbrick.path_utils
+import libbrick.image_index
+import libbrick.rate_limiter
 
 #============================
 #============================
@@ -20,6 +31,20 @@ REMBG_MODEL = 'isnet-general-use'
 LABEL_IMAGE_WIDTH_IN = 1.45
 LABEL_IMAGE_HEIGHT_IN = 1.95
 LABEL_MAX_CROP_FRACTION = 0.10
+# seconds a rembg worker keeps the model loaded without work, and the
+# longest one image may take before the worker is treated as hung
+REMBG_IDLE_TIMEOUT = 60
+REMBG_TIMEOUT = 600
+# raw image downloads in flight at once, each host still paced by rate_limiter
+IMAGE_DOWNLOAD_WORKERS = 8
+# images waiting between two pipeline stages, see process_images()
+PIPELINE_QUEUE_SIZE = 16
+# a cached raw image is checked with the server again after this many
+# seconds, by a conditional GET that downloads nothing if it is unchanged
+IMAGE_REVALIDATE_SECONDS = 30 * 24 * 3600
+# label images are resampled to this resolution for the PDF, see get_image_rendition()
+RENDITION_DPI = 300
+RENDITION_JPEG_QUALITY = 90
 
 HEADERS = {
 	'User-Agent': (
@@ -33,11 +58,11 @@ HEADERS = {
 #============================
 def ensure_images_directory(base_dir: str) -> None:
 	"""
-	Creates an 'images' directory with raw and processed subfolders.
+	Creates an 'images' directory with raw, processed, and blobs subfolders.
 	"""
 	if not os.path.isdir(base_dir):
 		os.mkdir(base_dir)
-	for subdir in ('raw', 'processed'):
+	for subdir in ('raw', 'processed', 'renditions', libbrick.image_index.BLOBS_DIR_NAME):
 		subdir_path = os.path.join(base_dir, subdir)
 		if not os.path.isdir(subdir_path):
 			os.mkdir(subdir_path)
@@ -65,25 +90,198 @@ def normalize_image_url(image_url: str) -> str:
 
 #============================
 
-def download_image(image_url: str, filename: str) -> str:
+def processing_fingerprint(model: str = None) -> str:
+	"""
+	Short hash of every setting that shapes a processed image.
+
+	A processed image recorded with another fingerprint is rebuilt.
+	"""
+	if model is None:
+		model = REMBG_MODEL
+	params = {
+		'model': model,
+		'width_in': LABEL_IMAGE_WIDTH_IN,
+		'height_in': LABEL_IMAGE_HEIGHT_IN,
+		'max_crop_fraction': LABEL_MAX_CROP_FRACTION,
+	}
+	params_text = json.dumps(params, sort_keys=True)
+	fingerprint = hashlib.sha256(params_text.encode('ascii')).hexdigest()[:16]
+	return fingerprint
+
+#============================
+
+def _index_for(filename: str) -> libbrick.image_index.ImageIndex:
+	"""
+	Return the index of the cache holding <images>/raw|processed/<file>.
+	"""
+	images_dir = os.path.dirname(os.path.dirname(os.path.abspath(filename)))
+	return libbrick.image_index.get_image_index(images_dir)
+
+#============================
+
+def _image_decodes(filename: str) -> bool:
+	"""
+	Check that PIL can read the whole image, a truncated download fails.
+	"""
+	try:
+		with PIL.Image.open(filename) as image:
+			image.load()
+	except (OSError, SyntaxError):
+		return False
+	return True
+
+#============================
+
+def source_entry(raw_filename: str, image_url: str = None) -> dict:
+	"""
+	Return the index entry of a raw image on disk, indexing it on first sight.
+
+	A raw image cached before the index existed is checked to decode fully
+	and then recorded without an ETag.
+
+	Returns:
+		dict: url, etag, last_modified, sha256, size, and time last checked,
+			or None if the file is missing or not a readable image.
+	"""
+	if not os.path.exists(raw_filename):
+		return None
+	index = _index_for(raw_filename)
+	key = os.path.basename(raw_filename)
+	entry = index.sources.get(key)
+	if entry is not None and entry['size'] == os.path.getsize(raw_filename):
+		return entry
+	if not _image_decodes(raw_filename):
+		return None
+	sha256, size = index.store_file(raw_filename)
+	entry = {
+		'url': normalize_image_url(image_url),
+		'etag': None,
+		'last_modified': None,
+		'sha256': sha256,
+		'size': size,
+		'time': int(time.time()),
+	}
+	index.sources[key] = entry
+	return entry
+
+#============================
+
+def raw_image_is_current(image_url: str, raw_filename: str) -> bool:
+	"""
+	True if the raw image is complete, from image_url, and checked recently.
+	"""
+	entry = source_entry(raw_filename, image_url)
+	if entry is None:
+		return False
+	if image_url is None:
+		return True
+	if entry['url'] is not None and entry['url'] != normalize_image_url(image_url):
+		return False
+	return time.time() - entry['time'] < IMAGE_REVALIDATE_SECONDS
+
+#============================
+
+def processed_image_is_current(raw_filename: str, processed_filename: str,
+		model: str = None) -> bool:
+	"""
+	True if the processed image was made from the current raw image with
+	the current processing settings.
+	"""
+	if not os.path.exists(processed_filename):
+		return False
+	index = _index_for(processed_filename)
+	output = index.outputs.get(os.path.basename(processed_filename))
+	source = source_entry(raw_filename)
+	if output is None:
+		# processed before the index existed, only a newer raw image replaces it
+		if source is None:
+			return True
+		return os.path.getmtime(processed_filename) >= os.path.getmtime(raw_filename)
+	if output['params'] != processing_fingerprint(model):
+		return False
+	if output['size'] != os.path.getsize(processed_filename):
+		return False
+	# raw images may be deleted to save space once processed
+	if source is None:
+		return True
+	return output['source_sha256'] == source['sha256']
+
+#============================
+
+def image_needs_download(image_url: str, raw_filename: str, processed_filename: str) -> bool:
+	"""
+	True if the raw image is missing, incomplete, or due for revalidation.
+
+	A missing raw image is not fetched again while its processed image is current.
+	"""
+	if image_url is None:
+		return False
+	if os.path.exists(raw_filename):
+		return not raw_image_is_current(image_url, raw_filename)
+	return not processed_image_is_current(raw_filename, processed_filename)
+
+#============================
+
+def download_image(image_url: str, filename: str, session: requests.Session = None) -> str:
 	"""
 	Download an image from a URL and save it locally.
+
+	The file is written under a temporary name and renamed when complete,
+	so an interrupted download never leaves a truncated image behind.
+	A cached image that is due for revalidation is fetched with a
+	conditional GET (If-None-Match / If-Modified-Since); a 304 answer
+	keeps the file. Each download is recorded in the image index with
+	its ETag, Last-Modified, sha256, and size.
+
+	Args:
+		image_url (str): image URL, '//host/...' is fetched over https.
+		filename (str): local path to save to.
+		session: optional; pooled requests.Session, for many downloads.
 	"""
 	if image_url is None:
 		raise TypeError
-	if os.path.exists(filename):
+	if raw_image_is_current(image_url, filename):
 		return filename
 	image_url = normalize_image_url(image_url)
-	time.sleep(random.random())
-	r = requests.get(image_url, stream=True, timeout=15, headers=HEADERS)
-	if r.status_code == 200:
-		r.raw.decode_content = True
-		with open(filename, 'wb') as f:
-			shutil.copyfileobj(r.raw, f)
-		print(f'.. image successfully downloaded: {filename}')
+	index = _index_for(filename)
+	key = os.path.basename(filename)
+	entry = source_entry(filename)
+	headers = {}
+	if entry is not None and entry['url'] == image_url:
+		if entry['etag'] is not None:
+			headers['If-None-Match'] = entry['etag']
+		if entry['last_modified'] is not None:
+			headers['If-Modified-Since'] = entry['last_modified']
+	libbrick.rate_limiter.wait_for_url(image_url)
+	if session is None:
+		response = requests.get(image_url, stream=True, timeout=15, headers=HEADERS | headers)
 	else:
-		print(f"!! image couldn't be retrieved: {image_url}")
-		raise FileNotFoundError(f"image fetch HTTP {r.status_code} for {image_url}")
+		response = session.get(image_url, stream=True, timeout=15, headers=headers)
+	# closing returns the connection to the session's pool on every path
+	with response:
+		if response.status_code == 304 and entry is not None:
+			entry['time'] = int(time.time())
+			index.sources[key] = entry
+			print(f'.. image unchanged: {filename}')
+		elif response.status_code == 200:
+			response.raw.decode_content = True
+			partial_filename = f"{filename}.{os.getpid()}.{threading.get_ident()}.part"
+			with open(partial_filename, 'wb') as f:
+				shutil.copyfileobj(response.raw, f)
+			os.replace(partial_filename, filename)
+			sha256, size = index.store_file(filename)
+			index.sources[key] = {
+				'url': image_url,
+				'etag': response.headers.get('ETag'),
+				'last_modified': response.headers.get('Last-Modified'),
+				'sha256': sha256,
+				'size': size,
+				'time': int(time.time()),
+			}
+			print(f'.. image successfully downloaded: {filename}')
+		else:
+			print(f"!! image couldn't be retrieved: {image_url}")
+			raise FileNotFoundError(f"image fetch HTTP {response.status_code} for {image_url}")
 	return filename
 
 #============================
@@ -163,46 +361,317 @@ def _crop_to_aspect(image: PIL.Image.Image, target_ratio: float,
 
 #============================
 
-def process_image(raw_filename: str, processed_filename: str, model: str = None) -> str:
+class RembgWorker(object):
 	"""
-	Remove background and trim the image for label use.
+	A `python -m libbrick.rembg_worker` process that keeps the rembg model loaded.
 
-	A shared file lock at <cache_root>/.rembg.lock serializes rembg subprocess
-	invocations across all callers (CLI label-makers, downstream webservers).
-	The isnet-general-use model peaks ~1.5GB RAM per call; parallel jobs OOM
-	small hosts. subprocess timeout=600 bounds a hung rembg so the lock cannot
-	be pinned indefinitely.
+	Images are sent one at a time over the worker's stdin and stdout pipes.
+	The worker takes the shared .rembg.lock for each image, as `rembg i`
+	did, so rembg still runs one image at a time across all callers (CLI
+	label-makers, downstream webservers) without one caller blocking the
+	others for a whole run. A worker that sat idle for REMBG_IDLE_TIMEOUT
+	seconds exits, freeing the model's memory, and is restarted on the
+	next image.
 	"""
-	if os.path.exists(processed_filename):
+
+	#============================
+	#============================
+	def __init__(self, model: str, lock_path: str, idle_timeout: float = REMBG_IDLE_TIMEOUT):
+		self.model = model
+		self.lock_path = lock_path
+		self.idle_timeout = idle_timeout
+		self.process = None
+		self.images = 0
+		# label threads share one worker, one request in flight at a time
+		self._lock = threading.Lock()
+
+	#============================
+	#============================
+	def _worker_command(self) -> list:
+		""" command line that starts the worker process """
+		command = [sys.executable, '-m', 'libbrick.rembg_worker',
+			'-l', self.lock_path, '-i', str(self.idle_timeout)]
+		if self.model:
+			command += ['-m', self.model]
+		return command
+
+	#============================
+	#============================
+	def _start(self, timeout: float = REMBG_TIMEOUT) -> None:
+		"""
+		Start the worker and wait until it has loaded the model.
+
+		Raises:
+			RuntimeError: the worker exited first, e.g. rembg is not importable,
+				or did not load the model within timeout seconds.
+		"""
+		# python -m needs the directory holding libbrick on the module path
+		python_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+		if os.environ.get('PYTHONPATH'):
+			python_path += os.pathsep + os.environ['PYTHONPATH']
+		env = dict(os.environ, PYTHONPATH=python_path)
+		self.process = subprocess.Popen(self._worker_command(), stdin=subprocess.PIPE,
+			stdout=subprocess.PIPE, text=True, env=env)
+		# a first run may download the model, but a hung start must not
+		# hold up every thread waiting in get_rembg_worker()
+		readable, _, _ = select.select([self.process.stdout], [], [], timeout)
+		if len(readable) == 0:
+			self.process.kill()
+			self.process.wait()
+			self.process = None
+			raise RuntimeError(f"rembg worker did not load the model in {timeout:.0f}s")
+		line = self.process.stdout.readline()
+		if line == '':
+			self.process.wait()
+			self.process = None
+			raise RuntimeError("rembg worker exited before loading the model")
+
+	#============================
+	#============================
+	def _request(self, request: dict, timeout: float) -> dict:
+		"""
+		Send one request and read its reply, None if the worker had exited.
+		"""
+		if self.process is None or self.process.poll() is not None:
+			self._start()
+		try:
+			self.process.stdin.write(json.dumps(request) + '\n')
+			self.process.stdin.flush()
+		except BrokenPipeError:
+			# the worker went idle and exited just now
+			self.process = None
+			return None
+		readable, _, _ = select.select([self.process.stdout], [], [], timeout)
+		if len(readable) == 0:
+			self.process.kill()
+			self.process.wait()
+			self.process = None
+			raise subprocess.TimeoutExpired(self._worker_command(), timeout)
+		line = self.process.stdout.readline()
+		if line == '':
+			self.process.wait()
+			self.process = None
+			return None
+		reply = json.loads(line)
+		return reply
+
+	#============================
+	#============================
+	def remove_background(self, raw_filename: str, processed_filename: str,
+			timeout: float = REMBG_TIMEOUT) -> str:
+		"""
+		Write a copy of raw_filename with the background removed.
+
+		Raises:
+			RuntimeError: rembg could not read the image, or the worker died.
+			subprocess.TimeoutExpired: one image took longer than timeout.
+		"""
+		request = {'input': os.path.abspath(raw_filename),
+			'output': os.path.abspath(processed_filename)}
+		with self._lock:
+			reply = self._request(request, timeout)
+			if reply is None:
+				# exited between two images, start a new one and try once more
+				reply = self._request(request, timeout)
+			if reply is None:
+				raise RuntimeError(f"rembg worker died on {raw_filename}")
+			self.images += 1
+		if 'error' in reply:
+			raise RuntimeError(f"rembg failed on {raw_filename}: {reply['error']}")
 		return processed_filename
-	ensure_image_tools_installed()
-	if model is None:
-		model = REMBG_MODEL
+
+	#============================
+	#============================
+	def close(self) -> None:
+		""" let the worker finish, releasing the model and the lock """
+		with self._lock:
+			if self.process is None:
+				return
+			self.process.stdin.close()
+			self.process.wait(timeout=REMBG_TIMEOUT)
+			self.process.stdout.close()
+			self.process = None
+
+#============================
+#============================
+# one worker per (model, lock path), created on first use
+_rembg_workers = {}
+_rembg_workers_lock = threading.Lock()
+
+#============================
+
+def get_rembg_worker(model: str, lock_path: str) -> RembgWorker:
+	"""
+	Return the process-wide rembg worker, or None if it cannot run here.
+
+	When rembg is only installed as a command (for example with pipx), the
+	worker cannot import it; callers then fall back to one rembg subprocess
+	per image.
+	"""
+	key = (model, lock_path)
+	with _rembg_workers_lock:
+		if key not in _rembg_workers:
+			worker = RembgWorker(model, lock_path)
+			try:
+				worker._start()
+			except RuntimeError as error:
+				print(f"!! {error}, running one rembg command per image")
+				worker = None
+			_rembg_workers[key] = worker
+		worker = _rembg_workers[key]
+	return worker
+
+#============================
+
+def close_rembg_workers() -> None:
+	"""
+	Stop every rembg worker of this process, also run at exit.
+	"""
+	with _rembg_workers_lock:
+		workers = [worker for worker in _rembg_workers.values() if worker is not None]
+		_rembg_workers.clear()
+	for worker in workers:
+		worker.close()
+
+atexit.register(close_rembg_workers)
+
+#============================
+
+def _run_rembg_command(raw_filename: str, processed_filename: str, model: str,
+		lock_path: str) -> None:
+	"""
+	Remove the background with one `rembg i` subprocess, loading the model each time.
+
+	subprocess timeout bounds a hung rembg so the lock cannot be pinned
+	indefinitely.
+	"""
 	command = ['rembg', 'i']
 	if model:
 		command += ['-m', model]
 	command += [raw_filename, processed_filename]
-	# derive shared cache root from convention <cache>/processed/<file>
-	cache_root = os.path.dirname(os.path.dirname(processed_filename))
-	lock_path = os.path.join(cache_root, '.rembg.lock')
 	with open(lock_path, 'w') as lock_f:
 		fcntl.flock(lock_f, fcntl.LOCK_EX)
-		subprocess.run(command, check=True, timeout=600)
-	with PIL.Image.open(processed_filename) as image:
+		subprocess.run(command, check=True, timeout=REMBG_TIMEOUT)
+
+#============================
+
+def remove_background(raw_filename: str, processed_filename: str, model: str = None) -> str:
+	"""
+	Remove the background, writing next to processed_filename for trimming.
+
+	Background removal goes to a long-lived rembg worker (see RembgWorker)
+	that loads the model once per run instead of once per image. A shared
+	file lock at <cache_root>/.rembg.lock serializes rembg across all
+	callers; the isnet-general-use model peaks ~1.5GB RAM, so parallel
+	jobs OOM small hosts.
+
+	Returns:
+		str: the untrimmed image, '<processed_filename>.rembg.png'.
+	"""
+	if model is None:
+		model = REMBG_MODEL
+	rembg_filename = processed_filename + '.rembg.png'
+	# derive shared cache root from convention <cache>/processed/<file>
+	cache_root = os.path.dirname(os.path.dirname(processed_filename))
+	lock_path = os.path.abspath(os.path.join(cache_root, '.rembg.lock'))
+	worker = get_rembg_worker(model, lock_path)
+	if worker is not None:
+		worker.remove_background(raw_filename, rembg_filename)
+	else:
+		_run_rembg_command(raw_filename, rembg_filename, model, lock_path)
+	return rembg_filename
+
+#============================
+
+def trim_for_label(rembg_filename: str, processed_filename: str) -> str:
+	"""
+	Trim and crop a background-free image to the label shape.
+
+	The result is saved to processed_filename only when complete, so an
+	existing processed file is always a finished one. CPU only, safe to
+	run in a worker process.
+	"""
+	with PIL.Image.open(rembg_filename) as image:
 		trimmed = _trim_image(image)
 		target_ratio = LABEL_IMAGE_WIDTH_IN / float(LABEL_IMAGE_HEIGHT_IN)
 		trimmed = _crop_to_aspect(trimmed, target_ratio, LABEL_MAX_CROP_FRACTION)
 		trimmed = trimmed.copy()
-	trimmed.save(processed_filename)
+	# keep the format of processed_filename for the temporary name
+	root, ext = os.path.splitext(processed_filename)
+	partial_filename = f"{root}.{os.getpid()}.part{ext}"
+	trimmed.save(partial_filename)
+	os.replace(partial_filename, processed_filename)
+	os.remove(rembg_filename)
 	return processed_filename
 
 #============================
 
-def get_cached_image(image_url: str, image_prefix: str, item_id: str,
-		raw_ext: str = 'jpg', processed_ext: str = 'png',
-		relpath_from: str = None) -> str:
+def record_processed_image(raw_filename: str, processed_filename: str,
+		model: str = None) -> None:
 	"""
-	Fetch, cache, and process an image, returning a path suitable for LaTeX.
+	Store a finished processed image by hash and record what it was made from.
+	"""
+	index = _index_for(processed_filename)
+	source = source_entry(raw_filename)
+	params = processing_fingerprint(model)
+	sha256, size = index.store_file(processed_filename)
+	index.outputs[os.path.basename(processed_filename)] = {
+		'source_sha256': source['sha256'],
+		'params': params,
+		'sha256': sha256,
+		'size': size,
+	}
+	index.derived[f"{source['sha256']}:{params}"] = sha256
+
+#============================
+
+def reuse_processed_image(raw_filename: str, processed_filename: str,
+		model: str = None) -> bool:
+	"""
+	Link an existing processed copy of an identical raw image, skipping rembg.
+
+	Returns:
+		bool: True if processed_filename now holds a reused image.
+	"""
+	source = source_entry(raw_filename)
+	if source is None:
+		return False
+	index = _index_for(processed_filename)
+	params = processing_fingerprint(model)
+	sha256 = index.derived.get(f"{source['sha256']}:{params}")
+	if sha256 is None:
+		return False
+	blob_filename = index.blob_path(sha256, os.path.splitext(processed_filename)[1])
+	if not os.path.exists(blob_filename):
+		return False
+	libbrick.image_index.link_or_copy(blob_filename, processed_filename)
+	record_processed_image(raw_filename, processed_filename, model)
+	return True
+
+#============================
+
+def process_image(raw_filename: str, processed_filename: str, model: str = None) -> str:
+	"""
+	Remove background and trim the image for label use.
+
+	Skipped when the processed image is current, or when an identical raw
+	image was already processed with the same settings.
+	"""
+	if processed_image_is_current(raw_filename, processed_filename, model):
+		return processed_filename
+	if reuse_processed_image(raw_filename, processed_filename, model):
+		return processed_filename
+	ensure_image_tools_installed()
+	rembg_filename = remove_background(raw_filename, processed_filename, model)
+	trim_for_label(rembg_filename, processed_filename)
+	record_processed_image(raw_filename, processed_filename, model)
+	return processed_filename
+
+#============================
+
+def get_images_dir() -> str:
+	"""
+	Return the image cache directory, <git root>/images, creating it if needed.
 	"""
 	git_root = libbrick.path_utils.get_git_root()
 	if git_root is None:
@@ -210,14 +679,260 @@ def get_cached_image(image_url: str, image_prefix: str, item_id: str,
 	else:
 		images_dir = os.path.join(git_root, 'images')
 	ensure_images_directory(images_dir)
+	return images_dir
+
+#============================
+
+def cached_image_paths(image_prefix: str, item_id: str, raw_ext: str = 'jpg',
+		processed_ext: str = 'png') -> tuple:
+	"""
+	Return the (raw, processed) cache paths for one item's image.
+	"""
+	images_dir = get_images_dir()
 	raw_filename = os.path.join(images_dir, 'raw', f"{image_prefix}_{item_id}.{raw_ext}")
 	processed_filename = os.path.join(
 		images_dir, 'processed', f"{image_prefix}_{item_id}.{processed_ext}"
 	)
-	download_image(image_url, raw_filename)
+	return raw_filename, processed_filename
+
+#============================
+
+def make_image_session(workers: int = IMAGE_DOWNLOAD_WORKERS) -> requests.Session:
+	"""
+	A requests.Session whose connection pool fits one connection per worker.
+	"""
+	session = requests.Session()
+	session.headers.update(HEADERS)
+	adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+	session.mount('https://', adapter)
+	session.mount('http://', adapter)
+	return session
+
+#============================
+
+def process_images(items: list, download_workers: int = IMAGE_DOWNLOAD_WORKERS,
+		trim_workers: int = None, queue_size: int = PIPELINE_QUEUE_SIZE,
+		model: str = None) -> dict:
+	"""
+	Download, remove backgrounds from, and trim a batch of label images as a pipeline.
+
+	Three stages joined by bounded queues:
+	download threads over one pooled session feed finished raw images to
+	the rembg stage, which runs one image at a time on the rembg worker and
+	hands each result to a process pool for trimming and cropping. The
+	rembg stage never waits on the network while downloads are ahead of
+	it, and trimming image N overlaps background removal of image N+1.
+	The queues hold at most queue_size images, so downloads pause when
+	rembg falls behind.
+
+	Images that are current in the image index are skipped, and a raw
+	image identical to one processed before reuses its processed copy.
+	A failed item is reported and left out; get_cached_image() retries it
+	and raises as before.
+
+	Args:
+		items (list): (image_url, image_prefix, item_id) tuples.
+		download_workers (int): downloads in flight at once.
+		trim_workers (int): optional; trim processes, default up to 4.
+		queue_size (int): images waiting between two stages.
+		model (str): optional; rembg model, default REMBG_MODEL.
+
+	Returns:
+		dict: (image_prefix, item_id) to processed image path, or None if
+			the item failed.
+	"""
+	results = {}
+	jobs = []
+	for image_url, image_prefix, item_id in items:
+		key = (image_prefix, item_id)
+		raw_filename, processed_filename = cached_image_paths(image_prefix, item_id)
+		if (not image_needs_download(image_url, raw_filename, processed_filename)
+				and processed_image_is_current(raw_filename, processed_filename, model)):
+			results[key] = processed_filename
+		elif image_url is None and not os.path.exists(raw_filename):
+			results[key] = None
+		else:
+			jobs.append((key, image_url, raw_filename, processed_filename))
+	if len(jobs) == 0:
+		return results
+	ensure_image_tools_installed()
+	if trim_workers is None:
+		trim_workers = min(4, os.cpu_count() or 1)
+	print(f"processing {len(jobs)} images: {download_workers} downloads, "
+		+ f"1 rembg, {trim_workers} trim processes")
+
+	rembg_queue = queue.Queue(maxsize=queue_size)
+	trim_slots = threading.BoundedSemaphore(queue_size)
+	# set when the rembg stage stops early, so no download waits on a full queue
+	stop = threading.Event()
+	session = make_image_session(download_workers)
+
+	def hand_over(item):
+		while not stop.is_set():
+			try:
+				rembg_queue.put(item, timeout=0.1)
+			except queue.Full:
+				continue
+			return
+
+	def download_stage(job):
+		if stop.is_set():
+			return
+		key, image_url, raw_filename, processed_filename = job
+		try:
+			if image_url is not None:
+				download_image(image_url, raw_filename, session)
+		except Exception as error:
+			# every job must reach the rembg stage, or it would wait forever
+			hand_over((job, error))
+			return
+		hand_over((job, None))
+
+	# forkserver: forking this threaded process could copy a held lock
+	trim_context = multiprocessing.get_context('forkserver')
+	with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, download_workers)) as download_pool, \
+			concurrent.futures.ProcessPoolExecutor(max_workers=trim_workers,
+				mp_context=trim_context) as trim_pool:
+		for job in jobs:
+			download_pool.submit(download_stage, job)
+		trim_futures = {}
+		try:
+			# the rembg stage runs here, one image at a time in arrival order
+			for _ in range(len(jobs)):
+				job, error = rembg_queue.get()
+				key, image_url, raw_filename, processed_filename = job
+				if error is not None:
+					if not isinstance(error, (OSError, requests.RequestException)):
+						raise error
+					print(f"!! download failed for {image_url}: {error}")
+					results[key] = None
+					continue
+				# a revalidated raw image may be unchanged, or a duplicate of one processed before
+				if (processed_image_is_current(raw_filename, processed_filename, model)
+						or reuse_processed_image(raw_filename, processed_filename, model)):
+					results[key] = processed_filename
+					continue
+				try:
+					rembg_filename = remove_background(raw_filename, processed_filename, model)
+				except (RuntimeError, subprocess.TimeoutExpired) as error:
+					print(f"!! {error}")
+					results[key] = None
+					continue
+				trim_slots.acquire()
+				future = trim_pool.submit(trim_for_label, rembg_filename, processed_filename)
+				future.add_done_callback(lambda done: trim_slots.release())
+				trim_futures[future] = job
+		finally:
+			# on an error above, let blocked downloads return and drop queued ones
+			stop.set()
+			download_pool.shutdown(cancel_futures=True)
+			session.close()
+		for future in concurrent.futures.as_completed(trim_futures):
+			key, image_url, raw_filename, processed_filename = trim_futures[future]
+			error = future.exception()
+			if error is not None:
+				# BrokenProcessPool is a RuntimeError
+				if not isinstance(error, (OSError, ValueError, RuntimeError)):
+					raise error
+				print(f"!! trimming failed for {processed_filename}: {error}")
+				rembg_filename = processed_filename + '.rembg.png'
+				if os.path.exists(rembg_filename):
+					os.remove(rembg_filename)
+				results[key] = None
+				continue
+			results[key] = future.result()
+			record_processed_image(raw_filename, processed_filename, model)
+	return results
+
+#============================
+
+def get_cached_image(image_url: str, image_prefix: str, item_id: str,
+		raw_ext: str = 'jpg', processed_ext: str = 'png',
+		relpath_from: str = None, box_in: tuple = None) -> str:
+	"""
+	Fetch, cache, and process an image, returning a path suitable for LaTeX.
+
+	With box_in, a (width, height) in inches, the path is that of a
+	rendition sized for the box, see get_image_rendition().
+	"""
+	git_root = libbrick.path_utils.get_git_root()
+	raw_filename, processed_filename = cached_image_paths(image_prefix, item_id,
+		raw_ext, processed_ext)
+	# a current processed image needs no raw download
+	on_disk = os.path.exists(raw_filename) or os.path.exists(processed_filename)
+	if image_needs_download(image_url, raw_filename, processed_filename) or not on_disk:
+		download_image(image_url, raw_filename)
 	process_image(raw_filename, processed_filename)
+	if box_in is not None:
+		processed_filename = get_image_rendition(processed_filename,
+			box_in[0] * 72.0, box_in[1] * 72.0)
 	if relpath_from is not None:
 		return os.path.relpath(processed_filename, relpath_from)
 	if git_root is None:
 		return processed_filename
 	return os.path.relpath(processed_filename, git_root)
+
+#============================
+
+def rendition_size(image_size: tuple, width_pt: float, height_pt: float,
+		dpi: float = RENDITION_DPI) -> tuple:
+	"""
+	Pixel size of an image fitted into a box of width_pt x height_pt points.
+
+	Keeps the aspect ratio, like drawing with preserveAspectRatio, and
+	never exceeds the image's own size.
+	"""
+	image_width, image_height = image_size
+	scale = min(width_pt / image_width, height_pt / image_height) * dpi / 72.0
+	scale = min(scale, 1.0)
+	size = (max(1, round(image_width * scale)), max(1, round(image_height * scale)))
+	return size
+
+#============================
+
+def get_image_rendition(image_path: str, width_pt: float, height_pt: float,
+		dpi: float = RENDITION_DPI) -> str:
+	"""
+	Return a copy of an image resampled for a label slot, making it on first use.
+
+	A PDF embeds every pixel of the file it is given, so drawing full-size
+	processed images makes PDF size and render time grow with the source
+	resolution. The rendition has only the pixels the slot prints at dpi.
+	Images with transparency are stored as palette PNGs that keep the
+	alpha, fully opaque ones as JPEG, which ReportLab embeds unchanged.
+
+	Renditions live in <images>/renditions/, named by the source file's
+	content hash and the pixel size, so a changed source gets a new one
+	and identical sources share one.
+
+	Returns:
+		str: the rendition path, or image_path itself if it is already
+			no larger than the slot needs.
+	"""
+	with PIL.Image.open(image_path) as image:
+		size = rendition_size(image.size, width_pt, height_pt, dpi)
+		if size == image.size:
+			return image_path
+		image.load()
+		source = image
+	sha256, _ = libbrick.image_index.file_sha256(image_path)
+	cache_root = os.path.dirname(os.path.dirname(os.path.abspath(image_path)))
+	rendition_dir = os.path.join(cache_root, 'renditions')
+	if not os.path.isdir(rendition_dir):
+		os.makedirs(rendition_dir, exist_ok=True)
+	rendition_root = os.path.join(rendition_dir, f"{sha256[:16]}_{size[0]}x{size[1]}")
+	for ext in ('.png', '.jpg'):
+		if os.path.exists(rendition_root + ext):
+			return rendition_root + ext
+	resized = source.convert('RGBA').resize(size, PIL.Image.Resampling.LANCZOS)
+	if resized.getextrema()[3][0] == 255:
+		rendition_filename = rendition_root + '.jpg'
+		partial_filename = f"{rendition_root}.{os.getpid()}.{threading.get_ident()}.part.jpg"
+		resized.convert('RGB').save(partial_filename, quality=RENDITION_JPEG_QUALITY, optimize=True)
+	else:
+		rendition_filename = rendition_root + '.png'
+		partial_filename = f"{rendition_root}.{os.getpid()}.{threading.get_ident()}.part.png"
+		palette = resized.quantize(colors=256, method=PIL.Image.Quantize.FASTOCTREE)
+		palette.save(partial_filename, optimize=True)
+	os.replace(partial_filename, rendition_filename)
+	return rendition_filename
@@ -0,0 +1,147 @@
+# Standard Library
+import os
+import atexit
+import shutil
+import hashlib
+import threading
+
+# local repo modules
+import libbrick.wrappers.cache_store as cache_store
+
+#============================
+#============================
+# kept in the images/ directory next to raw/ and processed/
+INDEX_DB_NAME = 'image_index.sqlite3'
+BLOBS_DIR_NAME = 'blobs'
+HASH_CHUNK_BYTES = 1024 * 1024
+
+#============================
+#============================
+def file_sha256(filename: str) -> tuple:
+	"""
+	Hash a file in chunks.
+
+	Returns:
+		tuple: (sha256 hex digest, size in bytes)
+	"""
+	digest = hashlib.sha256()
+	size = 0
+	with open(filename, 'rb') as f:
+		chunk = f.read(HASH_CHUNK_BYTES)
+		while chunk:
+			digest.update(chunk)
+			size += len(chunk)
+			chunk = f.read(HASH_CHUNK_BYTES)
+	return digest.hexdigest(), size
+
+#============================
+
+def link_or_copy(source: str, target: str) -> None:
+	"""
+	Make target a hard link to source, replacing target in one rename.
+
+	Falls back to a copy on filesystems without hard links.
+	"""
+	partial_target = f"{target}.{os.getpid()}.{threading.get_ident()}.part"
+	try:
+		os.link(source, partial_target)
+	except OSError:
+		shutil.copyfile(source, partial_target)
+	os.replace(partial_target, target)
+
+#============================
+#============================
+class ImageIndex(object):
+	"""
+	Metadata index and content-addressed file store for one image cache.
+
+	The index lives in <images>/image_index.sqlite3, one table each:
+	image_sources maps a raw file name to its url, etag, last_modified,
+	sha256, size, and the time it was last checked with the server;
+	image_outputs maps a processed file name to the source_sha256 and
+	processing params it was made from, plus its own sha256 and size;
+	image_derived maps '<source sha256>:<params>' to the processed sha256,
+	so identical raw images are processed once.
+
+	Each distinct file is kept once in <images>/blobs/<sha256>.<ext>; the
+	names under raw/ and processed/ are hard links to it.
+	"""
+
+	#============================
+	#============================
+	def __init__(self, images_dir: str):
+		self.images_dir = images_dir
+		self.blobs_dir = os.path.join(images_dir, BLOBS_DIR_NAME)
+		if not os.path.isdir(self.blobs_dir):
+			os.makedirs(self.blobs_dir, exist_ok=True)
+		self.store = cache_store.SqliteCacheStore(os.path.join(images_dir, INDEX_DB_NAME))
+		for cache_name in ('image_sources', 'image_outputs', 'image_derived'):
+			self.store.ensure_table(cache_name)
+		self.sources = cache_store.SqliteCacheDict(self.store, 'image_sources')
+		self.outputs = cache_store.SqliteCacheDict(self.store, 'image_outputs')
+		self.derived = cache_store.SqliteCacheDict(self.store, 'image_derived')
+
+	#============================
+	#============================
+	def blob_path(self, sha256: str, ext: str) -> str:
+		""" path of the stored copy of a file with this hash and extension """
+		return os.path.join(self.blobs_dir, sha256 + ext)
+
+	#============================
+	#============================
+	def store_file(self, filename: str) -> tuple:
+		"""
+		Move a finished cache file into the blob store, deduplicating by hash.
+
+		If a file with the same content is already stored, filename becomes
+		another link to it and its own copy is dropped.
+
+		Returns:
+			tuple: (sha256 hex digest, size in bytes)
+		"""
+		sha256, size = file_sha256(filename)
+		blob_filename = self.blob_path(sha256, os.path.splitext(filename)[1])
+		if not os.path.exists(blob_filename):
+			link_or_copy(filename, blob_filename)
+		elif not os.path.samefile(blob_filename, filename):
+			link_or_copy(blob_filename, filename)
+		return sha256, size
+
+	#============================
+	#============================
+	def close(self) -> None:
+		""" close the database connections """
+		self.store.close()
+
+#============================
+#============================
+# one index per images directory, opened on first use
+_image_indexes = {}
+_image_indexes_lock = threading.Lock()
+
+#============================
+
+def get_image_index(images_dir: str) -> ImageIndex:
+	"""
+	Return the process-wide index of an images directory.
+	"""
+	key = os.path.abspath(images_dir)
+	with _image_indexes_lock:
+		if key not in _image_indexes:
+			_image_indexes[key] = ImageIndex(key)
+		index = _image_indexes[key]
+	return index
+
+#============================
+
+def close_image_indexes() -> None:
+	"""
+	Close every open image index, also run at exit.
+	"""
+	with _image_indexes_lock:
+		indexes = list(_image_indexes.values())
+		_image_indexes.clear()
+	for index in indexes:
+		index.close()
+
+atexit.register(close_image_indexes)
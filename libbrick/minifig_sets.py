@@ -1,7 +1,3 @@
-# Standard Library
-import time
-import random
-
 #============================
 #============================
 def build_minifig_set_map(fig_list: list, set_list: list, blw) -> dict:
@@ -28,7 +24,6 @@ def build_minifig_set_map(fig_list: list, set_list: list, blw) -> dict:
 		try:
 			superset_ids = blw.getSupersetFromMinifigID(minifig_id)
 		except LookupError:
-			time.sleep(random.random())
 			superset_ids = []
 		valid_sets = []
 		for set_id in superset_ids:
@@ -14,11 +14,7 @@ def load_msrp_cache(cache_path: str = None) -> dict:
 	Load the MSRP cache from a YAML file.
 	"""
 	if cache_path is None:
-		git_root = libbrick.path_utils.get_git_root()
-		if git_root is None:
-			cache_path = os.path.join('CACHE', 'msrp_cache.yml')
-		else:
-			cache_path = os.path.join(git_root, 'CACHE', 'msrp_cache.yml')
+		cache_path = os.path.join(libbrick.path_utils.get_cache_dir(), 'msrp_cache.yml')
 	if not os.path.isfile(cache_path):
 		return {}
 	with open(cache_path, 'r') as f:
@@ -1,15 +1,20 @@
 # Standard Library
 import os
+import functools
 import subprocess
 
 #============================
 #============================
-def get_git_root(path: str = None) -> str:
+# environment variable that points every cache user at one CACHE directory
+CACHE_DIR_ENV_VAR = 'LIBBRICK_CACHE_DIR'
+
+#============================
+#============================
+@functools.lru_cache(maxsize=None)
+def _find_git_root(path: str) -> str:
 	"""
-	Return the absolute path of the repository root.
+	Run git once per directory and remember the answer for the process.
 	"""
-	if path is None:
-		path = os.path.dirname(os.path.abspath(__file__))
 	try:
 		base = subprocess.check_output(
 			['git', 'rev-parse', '--show-toplevel'],
@@ -20,6 +25,52 @@ def get_git_root(path: str = None) -> str:
 	except subprocess.CalledProcessError:
 		# Not inside a git repository
 		return None
+	except FileNotFoundError:
+		# git is not installed
+		return None
+
+#============================
+#============================
+def get_git_root(path: str = None) -> str:
+	"""
+	Return the absolute path of the repository root.
+
+	The git lookup runs once per directory per process; call
+	clear_path_cache() if the checkout moves while the process runs.
+	"""
+	if path is None:
+		path = os.path.dirname(os.path.abspath(__file__))
+	git_root = _find_git_root(os.path.abspath(path))
+	return git_root
+
+#============================
+#============================
+def clear_path_cache() -> None:
+	"""
+	Forget remembered git roots.
+	"""
+	_find_git_root.cache_clear()
+
+#============================
+#============================
+def get_cache_dir(create: bool = False) -> str:
+	"""
+	Return the CACHE directory shared by the wrappers, MSRP cache, and tools.
+
+	Order: the LIBBRICK_CACHE_DIR environment variable, then CACHE/ at the
+	git root, then CACHE/ in the current directory when the package runs
+	outside a git checkout.
+	"""
+	cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+	if not cache_dir:
+		git_root = get_git_root()
+		if git_root is None:
+			cache_dir = os.path.join(os.getcwd(), 'CACHE')
+		else:
+			cache_dir = os.path.join(git_root, 'CACHE')
+	if create and not os.path.isdir(cache_dir):
+		os.makedirs(cache_dir, exist_ok=True)
+	return cache_dir
 
 #============================
 
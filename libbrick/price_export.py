@@ -2,6 +2,9 @@
 Shared CSV export helpers for LEGO pricing pipelines.
 """
 
+# Standard Library
+import threading
+
 FAVORITE_COLUMNS = [
 	'total quantity', 'item_id', 'color_name', 'name',
 	'category name', 'lot value', 'sale price',
@@ -203,3 +206,47 @@ def pick_valid_image_url(blw, urls_in_priority_order: list) -> str:
 		if blw.image_exists(url):
 			return url
 	return ''
+
+#============================================
+class OrderedRowWriter(object):
+	"""
+	Write rows finished out of order by worker threads in input order.
+
+	put(index, data) buffers a row until every row before it is written.
+	The header comes from the first row, as in the sequential scripts.
+	"""
+
+	def __init__(self, writer) -> None:
+		"""
+		Args:
+			writer: csv.writer object.
+		"""
+		self.writer = writer
+		self.allkeys = None
+		self.next_index = 0
+		self._pending = {}
+		self._lock = threading.Lock()
+
+	def put(self, index: int, data: dict) -> int:
+		"""
+		Buffer one cleaned data row and flush every row that is now in order.
+
+		Args:
+			index (int): position of the row in the input, starting at 0.
+			data (dict): cleaned data dictionary for the row.
+
+		Returns:
+			int: number of rows written by this call.
+		"""
+		written = 0
+		with self._lock:
+			self._pending[index] = data
+			while self.next_index in self._pending:
+				row_data = self._pending.pop(self.next_index)
+				if self.allkeys is None:
+					self.allkeys = build_column_order(row_data)
+					self.writer.writerow(self.allkeys)
+				write_csv_row(self.writer, row_data, self.allkeys)
+				self.next_index += 1
+				written += 1
+		return written
@@ -0,0 +1,94 @@
+"""
+Median prices from BrickLink price guide rows without expanding quantities.
+"""
+
+# Standard Library
+import statistics
+
+# a guide with this many units or fewer gets no median, -1 instead
+MIN_PRICES_FOR_MEDIAN = 5
+
+#============================================
+def price_quantity_pairs(price_detail: list, min_qty: int = 1) -> list:
+	"""
+	Turn price guide rows into (unit price in cents, quantity) pairs.
+
+	Args:
+		price_detail (list): rows with 'unit_price' and 'quantity'.
+		min_qty (int): skip rows (lots) with fewer units than this.
+
+	Returns:
+		list: (cents, quantity) tuples, in row order.
+	"""
+	pairs = []
+	for item in price_detail:
+		quantity = int(item['quantity'])
+		if quantity < min_qty:
+			continue
+		pairs.append((int(float(item['unit_price'])*100), quantity))
+	return pairs
+
+#============================================
+def weighted_median(pairs: list):
+	"""
+	Median of the values as if each was repeated quantity times.
+
+	Gives the same answer as statistics.median() on the expanded list,
+	including the mean of the two middle values for an even count, but
+	sorts the rows instead of building a list as long as the total quantity.
+
+	Args:
+		pairs (list): (value, quantity) tuples.
+
+	Returns:
+		the median, an int or a float for an even count.
+
+	Raises:
+		statistics.StatisticsError: if the total quantity is zero.
+	"""
+	pairs = sorted(pair for pair in pairs if pair[1] > 0)
+	total = sum(quantity for value, quantity in pairs)
+	if total == 0:
+		raise statistics.StatisticsError("no median for empty data")
+	# zero-based positions of the middle value(s) in the expanded list
+	upper_index = total // 2
+	lower_index = upper_index if total % 2 == 1 else upper_index - 1
+	lower_value = None
+	seen = 0
+	for value, quantity in pairs:
+		seen += quantity
+		if lower_value is None and seen > lower_index:
+			lower_value = value
+		if seen > upper_index:
+			upper_value = value
+			break
+	if total % 2 == 1:
+		return upper_value
+	return (lower_value + upper_value) / 2
+
+#============================================
+def median_price(price_details: dict, min_qty: int = 1, trim_above_median: bool = False) -> int:
+	"""
+	Median unit price in cents for one price guide, -1 if too few units.
+
+	Args:
+		price_details (dict): BrickLink price guide with 'total_quantity'
+			and 'price_detail'.
+		min_qty (int): skip lots with fewer units than this.
+		trim_above_median (bool): drop units priced above the median and
+			take the median again, used for asking (stock) prices.
+
+	Returns:
+		int: median price in cents, or -1.
+	"""
+	if int(price_details['total_quantity']) < 1:
+		return -1
+	pairs = price_quantity_pairs(price_details['price_detail'], min_qty)
+	total = sum(quantity for price, quantity in pairs)
+	if total <= MIN_PRICES_FOR_MEDIAN:
+		return -1
+	median = int(weighted_median(pairs))
+	if trim_above_median is True:
+		lower_pairs = [(price, quantity) for price, quantity in pairs if price <= median]
+		median = int(weighted_median(lower_pairs))
+	return median
@@ -0,0 +1,481 @@
+# Standard Library
+import os
+import json
+import atexit
+import time
+import asyncio
+import threading
+import urllib.parse
+
+# local repo modules
+import libbrick.path_utils
+import libbrick.wrappers.cache_store as cache_store
+
+#============================
+#============================
+# file in CACHE/ holding the hourly call counts per host and endpoint
+QUOTA_FILE_NAME = 'api_quota.json'
+
+# the daily limits are enforced over this many most recent hours
+WINDOW_HOURS = 24
+
+# (calls per second, burst size, calls per day or None) for each host
+# BrickLink allows 5000 API calls per day, Rebrickable asks for 1 call per second,
+# BrickSet allows 100 getSets calls per day
+HOST_LIMITS = {
+	'api.bricklink.com': (2.0, 10, 5000),
+	'rebrickable.com': (1.0, 3, None),
+	'brickset.com': (1.0, 2, 100),
+	'img.bricklink.com': (4.0, 8, None),
+	'www.lego.com': (20.0, 20, None),
+}
+
+# hosts not listed above
+DEFAULT_LIMIT = (2.0, 4, None)
+
+# calls a process counts in memory before adding them to the quota file
+QUOTA_FLUSH_CALLS = 10
+
+#============================
+#============================
+class QuotaExceededError(RuntimeError):
+	"""
+	Raised when a host's daily call quota is used up.
+
+	Not a LookupError, so callers that treat LookupError as
+	'item not found' do not mistake a spent quota for a missing item.
+	"""
+	pass
+
+#============================
+#============================
+class TokenBucket(object):
+	"""
+	Thread-safe token bucket: rate tokens per second, up to capacity saved up.
+	"""
+
+	#============================
+	#============================
+	def __init__(self, rate: float, capacity: int, clock=time.monotonic, sleep=time.sleep):
+		"""
+		Args:
+			rate: tokens added per second.
+			capacity: most tokens the bucket holds, the burst size.
+			clock: optional; monotonic time function, replaced in tests.
+			sleep: optional; sleep function, replaced in tests.
+		"""
+		self.rate = rate
+		self.capacity = capacity
+		self._clock = clock
+		self._sleep = sleep
+		self._tokens = float(capacity)
+		self._updated = clock()
+		self._lock = threading.Lock()
+
+	#============================
+	#============================
+	def _reserve(self) -> float:
+		"""
+		Take one token, possibly going negative, and return the wait needed.
+		"""
+		with self._lock:
+			now = self._clock()
+			elapsed = now - self._updated
+			self._tokens = min(float(self.capacity), self._tokens + elapsed * self.rate)
+			self._updated = now
+			self._tokens -= 1.0
+			if self._tokens >= 0:
+				return 0.0
+			wait_seconds = -self._tokens / self.rate
+			return wait_seconds
+
+	#============================
+	#============================
+	def acquire(self) -> float:
+		"""
+		Block until a token is available and return the seconds waited.
+		"""
+		# the token is reserved under the lock, the sleep happens outside it,
+		# so concurrent callers queue up one interval apart
+		wait_seconds = self._reserve()
+		if wait_seconds > 0:
+			self._sleep(wait_seconds)
+		return wait_seconds
+
+	#============================
+	#============================
+	async def acquire_async(self) -> float:
+		"""
+		Like acquire(), but yields to the event loop instead of blocking it.
+		"""
+		wait_seconds = self._reserve()
+		if wait_seconds > 0:
+			await asyncio.sleep(wait_seconds)
+		return wait_seconds
+
+#============================
+#============================
+class DailyQuota(object):
+	"""
+	Per-host call ledger over a rolling 24 hours, saved in CACHE/api_quota.json.
+
+	Calls are counted per endpoint in hourly buckets; the last 24 buckets,
+	the current hour included, make up the window. Every process sharing
+	the CACHE directory adds to the same ledger.
+
+	Calls are kept in memory and added to the file every flush_every calls,
+	when the limit looks reached, and at exit, so a process may be that many
+	calls behind the others in what it sees of their use.
+	"""
+
+	#============================
+	#============================
+	def __init__(self, host: str, daily_limit: int = None, quota_path: str = None,
+			clock=time.time, flush_every: int = QUOTA_FLUSH_CALLS):
+		"""
+		Args:
+			host: host name used as the key in the quota file.
+			daily_limit: optional; most calls per 24 hours, None only counts.
+			quota_path: optional; quota file, defaults to CACHE/api_quota.json.
+			clock: optional; wall clock function, replaced in tests.
+			flush_every: optional; calls kept in memory before writing the file.
+		"""
+		self.host = host
+		self.daily_limit = daily_limit
+		self.quota_path = quota_path
+		self.flush_every = flush_every
+		self._clock = clock
+		self._lock = threading.Lock()
+		# calls not yet in the quota file, {hour: {endpoint: count}}
+		self._pending = {}
+		self._pending_calls = 0
+		# calls in the window according to the file at the last flush
+		self._saved_used = None
+
+	#============================
+	#============================
+	def _get_quota_path(self) -> str:
+		"""
+		Resolve the quota file the first time it is needed.
+		"""
+		if self.quota_path is None:
+			cache_dir = libbrick.path_utils.get_cache_dir(create=True)
+			self.quota_path = os.path.join(cache_dir, QUOTA_FILE_NAME)
+		return self.quota_path
+
+	#============================
+	#============================
+	def _read_counts(self) -> dict:
+		"""
+		Read the quota file, or start empty if it does not exist.
+		"""
+		quota_path = self._get_quota_path()
+		if not os.path.isfile(quota_path):
+			return {}
+		with open(quota_path, 'r') as f:
+			counts = json.load(f)
+		return counts
+
+	#============================
+	#============================
+	def _window_hours(self, counts: dict) -> dict:
+		"""
+		This host's hourly buckets still inside the window, {hour: {endpoint: count}}.
+		"""
+		entry = counts.get(self.host)
+		# entries from the older once-a-day format have no 'hours'
+		if not isinstance(entry, dict) or 'hours' not in entry:
+			return {}
+		first_hour = int(self._clock() // 3600) - (WINDOW_HOURS - 1)
+		hours = {}
+		for hour, endpoints in entry['hours'].items():
+			if int(hour) >= first_hour:
+				hours[hour] = endpoints
+		return hours
+
+	#============================
+	#============================
+	def _add_pending(self, hours: dict) -> None:
+		"""
+		Add the calls kept in memory to hourly buckets read from the file.
+		"""
+		for hour, pending_endpoints in self._pending.items():
+			endpoints = hours.setdefault(hour, {})
+			for endpoint, count in pending_endpoints.items():
+				endpoints[endpoint] = endpoints.get(endpoint, 0) + count
+
+	#============================
+	#============================
+	def _flush_locked(self) -> int:
+		"""
+		Write the pending calls to the quota file; self._lock must be held.
+
+		Returns:
+			calls used in the window, all processes together.
+		"""
+		quota_path = self._get_quota_path()
+		with cache_store.file_lock(quota_path + '.lock', exclusive=True):
+			counts = self._read_counts()
+			hours = self._window_hours(counts)
+			if self._pending_calls > 0:
+				self._add_pending(hours)
+				counts[self.host] = {'hours': hours}
+				cache_store.write_file_atomic(quota_path, lambda f: json.dump(counts, f, indent=1))
+		self._pending = {}
+		self._pending_calls = 0
+		self._saved_used = sum(sum(endpoints.values()) for endpoints in hours.values())
+		return self._saved_used
+
+	#============================
+	#============================
+	def _count_locked(self, endpoint: str, calls: int) -> None:
+		"""
+		Keep calls in memory under the current hour; self._lock must be held.
+		"""
+		hour = str(int(self._clock() // 3600))
+		endpoints = self._pending.setdefault(hour, {})
+		endpoints[endpoint] = endpoints.get(endpoint, 0) + calls
+		self._pending_calls += calls
+
+	#============================
+	#============================
+	def flush(self) -> None:
+		"""
+		Write calls kept in memory to the quota file.
+		"""
+		with self._lock:
+			if self._pending_calls > 0:
+				self._flush_locked()
+
+	#============================
+	#============================
+	def used_by_endpoint(self) -> dict:
+		"""
+		Return calls in the window for this host, per endpoint.
+		"""
+		hours = self._window_hours(self._read_counts())
+		with self._lock:
+			self._add_pending(hours)
+		first_hour = int(self._clock() // 3600) - (WINDOW_HOURS - 1)
+		totals = {}
+		for hour, endpoints in hours.items():
+			if int(hour) < first_hour:
+				continue
+			for endpoint, count in endpoints.items():
+				totals[endpoint] = totals.get(endpoint, 0) + count
+		return totals
+
+	#============================
+	#============================
+	def used(self) -> int:
+		"""
+		Return calls in the window for this host, all endpoints together.
+		"""
+		total = sum(self.used_by_endpoint().values())
+		return total
+
+	#============================
+	#============================
+	def remaining(self) -> int:
+		"""
+		Return calls left in the window, or None when the host has no limit.
+		"""
+		if self.daily_limit is None:
+			return None
+		remaining = max(0, self.daily_limit - self.used())
+		return remaining
+
+	#============================
+	#============================
+	def record(self, endpoint: str = None) -> int:
+		"""
+		Count one call, raising if the limit is already used.
+
+		Args:
+			endpoint: optional; API endpoint name, e.g. 'price' or 'items'.
+
+		Returns:
+			calls used in the window, including this one.
+
+		Raises:
+			QuotaExceededError: if the limit was reached before this call.
+		"""
+		with self._lock:
+			if self._saved_used is None:
+				self._flush_locked()
+			used = self._saved_used + self._pending_calls
+			if self.daily_limit is not None and used >= self.daily_limit:
+				# the count in memory only grows; read the file again in case
+				# old calls have left the window since the last flush
+				used = self._flush_locked()
+				if used >= self.daily_limit:
+					raise QuotaExceededError(
+						f"{self.host} quota of {self.daily_limit} calls per 24 hours is used up")
+			self._count_locked(endpoint or 'other', 1)
+			used += 1
+			if self._pending_calls >= self.flush_every:
+				self._flush_locked()
+		return used
+
+	#============================
+	#============================
+	def mark_exhausted(self) -> None:
+		"""
+		Record that the server refused a call for quota, so every process stops.
+
+		Fills the window up to daily_limit; calls counted elsewhere (another
+		machine, the web site) are why the server's count can be higher.
+		"""
+		if self.daily_limit is None:
+			return
+		with self._lock:
+			missing = self.daily_limit - self._flush_locked()
+			if missing > 0:
+				self._count_locked('exhausted', missing)
+				self._flush_locked()
+
+#============================
+#============================
+class RateLimiter(object):
+	"""
+	Token bucket plus, for hosts with a daily limit, a persisted daily quota.
+	"""
+
+	#============================
+	#============================
+	def __init__(self, host: str, rate: float, burst: int, daily_limit: int = None,
+			quota_path: str = None):
+		self.host = host
+		self.bucket = TokenBucket(rate, burst)
+		# image CDNs have no daily limit, skip the quota file write per call
+		self.quota = None
+		if daily_limit is not None:
+			self.quota = DailyQuota(host, daily_limit, quota_path)
+
+	#============================
+	#============================
+	def wait(self, endpoint: str = None) -> float:
+		"""
+		Count the call against the daily quota, then wait for a token.
+
+		Args:
+			endpoint: optional; endpoint name for the quota ledger.
+
+		Returns:
+			seconds spent waiting.
+		"""
+		if self.quota is not None:
+			self.quota.record(endpoint)
+		wait_seconds = self.bucket.acquire()
+		return wait_seconds
+
+	#============================
+	#============================
+	async def wait_async(self, endpoint: str = None) -> float:
+		"""
+		Same as wait(), for coroutines running on an asyncio event loop.
+		"""
+		if self.quota is not None:
+			# a flush locks and rewrites the quota file, keep it off the loop
+			await asyncio.to_thread(self.quota.record, endpoint)
+		wait_seconds = await self.bucket.acquire_async()
+		return wait_seconds
+
+	#============================
+	#============================
+	def remaining(self) -> int:
+		"""
+		Calls left in the rolling 24 hours, or None for hosts without a limit.
+		"""
+		if self.quota is None:
+			return None
+		remaining = self.quota.remaining()
+		return remaining
+
+	#============================
+	#============================
+	def flush(self) -> None:
+		"""
+		Write calls counted in memory to the quota file.
+		"""
+		if self.quota is not None:
+			self.quota.flush()
+
+#============================
+#============================
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+#============================
+def get_limiter(host: str) -> RateLimiter:
+	"""
+	Return the process-wide limiter for a host, creating it from HOST_LIMITS.
+	"""
+	with _limiters_lock:
+		if host not in _limiters:
+			rate, burst, daily_limit = HOST_LIMITS.get(host, DEFAULT_LIMIT)
+			_limiters[host] = RateLimiter(host, rate, burst, daily_limit)
+		limiter = _limiters[host]
+	return limiter
+
+#============================
+def configure_limiter(host: str, rate: float, burst: int, daily_limit: int = None,
+		quota_path: str = None) -> RateLimiter:
+	"""
+	Replace the limiter for a host, for example to match a different API plan.
+	"""
+	limiter = RateLimiter(host, rate, burst, daily_limit, quota_path)
+	with _limiters_lock:
+		old_limiter = _limiters.get(host)
+		_limiters[host] = limiter
+	if old_limiter is not None:
+		old_limiter.flush()
+	return limiter
+
+#============================
+def flush_limiters() -> None:
+	"""
+	Write every limiter's pending calls to the quota file, also run at exit.
+	"""
+	with _limiters_lock:
+		limiters = list(_limiters.values())
+	for limiter in limiters:
+		limiter.flush()
+
+atexit.register(flush_limiters)
+
+#============================
+def wait_for_url(url: str) -> float:
+	"""
+	Wait on the limiter for the host of a URL.
+	"""
+	host = urllib.parse.urlparse(url).hostname
+	wait_seconds = get_limiter(host).wait()
+	return wait_seconds
+
+#============================
+def schedule_by_value(items: list, budget: int = None, cost: int = 1, value=None) -> tuple:
+	"""
+	Choose which cache-miss lookups to make when the API budget is short.
+
+	If every item fits the budget the order is kept. Otherwise items are
+	taken highest value first, ties in input order, until the budget is
+	spent; the rest are deferred to a later run.
+
+	Args:
+		items: lookups still needing API calls.
+		budget: optional; API calls available, None for no limit.
+		cost: optional; API calls per item.
+		value: optional; function of an item, larger runs first.
+
+	Returns:
+		tuple: (scheduled items, deferred items)
+	"""
+	if budget is None or len(items) * cost <= budget:
+		return list(items), []
+	ranked = list(items)
+	if value is not None:
+		# sorted() is stable, equal values keep their input order
+		ranked = sorted(ranked, key=value, reverse=True)
+	fit = max(0, budget // cost)
+	return ranked[:fit], ranked[fit:]
@@ -0,0 +1,92 @@
+"""
+Long-lived rembg background remover, started by libbrick.image_cache.
+
+Run as `python -m libbrick.rembg_worker`. Loads the model once, then reads
+one JSON request per line on stdin, {"input": raw_path, "output":
+processed_path}, and answers one JSON line per request on stdout. The
+shared .rembg.lock is held while each image is processed, as `rembg i`
+was, and the worker exits after idle_timeout seconds without a request
+to free the model's memory.
+"""
+
+# Standard Library
+import os
+import sys
+import json
+import fcntl
+import select
+import argparse
+
+# PIP3 modules
+import rembg
+
+# local repo modules
+import libbrick.image_cache
+
+#============================
+#============================
+def parse_args() -> argparse.Namespace:
+	"""
+	Parse command-line arguments.
+	"""
+	parser = argparse.ArgumentParser(description='Remove image backgrounds for requests on stdin')
+	parser.add_argument('-m', '--model', dest='model', default=libbrick.image_cache.REMBG_MODEL,
+		help=f'rembg model name (default: {libbrick.image_cache.REMBG_MODEL})')
+	parser.add_argument('-l', '--lock-file', dest='lock_path', required=True,
+		help='lock file shared by every rembg user of the image cache')
+	parser.add_argument('-i', '--idle-timeout', dest='idle_timeout', type=float,
+		default=libbrick.image_cache.REMBG_IDLE_TIMEOUT,
+		help='exit after this many seconds without a request')
+	args = parser.parse_args()
+	return args
+
+#============================
+#============================
+def remove_background(session, request: dict, lock_path: str) -> dict:
+	"""
+	Remove the background of one image file, holding the shared lock.
+
+	Returns:
+		dict: reply, {'output': path} or {'error': message} for a bad image.
+	"""
+	with open(request['input'], 'rb') as f:
+		raw_bytes = f.read()
+	with open(lock_path, 'w') as lock_f:
+		fcntl.flock(lock_f, fcntl.LOCK_EX)
+		try:
+			processed_bytes = rembg.remove(raw_bytes, session=session)
+		except OSError as error:
+			# PIL cannot read the image, the next request may be fine
+			return {'error': str(error)}
+	with open(request['output'], 'wb') as f:
+		f.write(processed_bytes)
+	return {'output': request['output']}
+
+#============================
+#============================
+def main():
+	"""
+	Load the model, then serve requests until idle or closed.
+	"""
+	args = parse_args()
+	# replies get their own copy of stdout, library output goes to stderr
+	replies = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+	os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+	session = rembg.new_session(args.model)
+	replies.write(json.dumps({'ready': True}) + '\n')
+	replies.flush()
+	while True:
+		readable, _, _ = select.select([sys.stdin], [], [], args.idle_timeout)
+		if len(readable) == 0:
+			break
+		line = sys.stdin.readline()
+		if line == '':
+			break
+		reply = remove_background(session, json.loads(line), args.lock_path)
+		replies.write(json.dumps(reply) + '\n')
+		replies.flush()
+
+#============================
+#============================
+if __name__ == '__main__':
+	main()
@@ -6,6 +6,9 @@ import os
 import reportlab.lib.pagesizes
 import reportlab.pdfbase.pdfmetrics
 
+# local repo modules
+import libbrick.image_cache
+
 
 POINTS_PER_INCH = 72.0
 
@@ -224,11 +227,15 @@ def draw_fitted_text(pdf, text: str, x: float, y: float, max_width: float, font_
 def draw_image_fit(pdf, image_path: str, x: float, y: float, width: float, height: float) -> None:
 	"""
 	Draw image fitted to a target box while preserving aspect ratio.
+
+	The image is drawn from a rendition resampled to the box size, so the
+	PDF does not carry the full-size source.
 	"""
 	if image_path is None or not os.path.exists(image_path):
 		return
+	rendition_path = libbrick.image_cache.get_image_rendition(image_path, width, height)
 	pdf.drawImage(
-		image_path,
+		rendition_path,
 		x,
 		y,
 		width=width,
@@ -63,6 +63,12 @@ if TEXTUAL_AVAILABLE:
 			get_columns() -> list of (key, label) tuples
 			get_row_label(task) -> str
 			process_task(task) -> tuple of (ok: bool, summary: str)
+
+		With workers > 1, up to that many process_task calls run at once in
+		threads; results are still applied to the table in task order.
+		A subclass may define process_task with async def instead, then it
+		runs on the event loop with no thread per task, for example with
+		AsyncBrickLink lookups.
 		"""
 
 		STATUS_STYLES = {
@@ -83,9 +89,10 @@ if TEXTUAL_AVAILABLE:
 			"#task_table { height: 1fr; border: solid gray; }\n"
 		)
 
-		def __init__(self, tasks: list, title: str = "Task Runner") -> None:
+		def __init__(self, tasks: list, title: str = "Task Runner", workers: int = 1) -> None:
 			super().__init__()
 			self.tasks = tasks
+			self.workers = max(1, workers)
 			self.app_title = title
 			self.total = len(tasks)
 			self.start_time = time.time()
@@ -236,19 +243,34 @@ if TEXTUAL_AVAILABLE:
 			row_key = self.task_rows[idx]
 			table.update_cell(row_key, self.column_keys[column_key], value)
 
-		async def run_tasks(self) -> None:
-			"""Iterate through tasks, running each and updating the UI."""
-			table = self.query_one(DataTable)
-			for idx, task in enumerate(self.tasks):
+		async def run_one_task(self, idx: int, task, semaphore: asyncio.Semaphore) -> tuple:
+			"""Run one task, in a thread unless it is async, once a worker slot is free."""
+			async with semaphore:
 				# Mark row as running and scroll table to current task
 				self.update_row_column(idx, "status", self.format_status("running"))
-				table.move_cursor(row=idx)
+				self.query_one(DataTable).move_cursor(row=idx)
 				start = time.time()
-				# Run process_task in a background thread via asyncio
-				ok, summary, column_updates = await asyncio.to_thread(
-					self.process_task, task
-				)
+				if asyncio.iscoroutinefunction(self.process_task):
+					# async tasks share the event loop, no thread needed
+					ok, summary, column_updates = await self.process_task(task)
+				else:
+					# Run process_task in a background thread via asyncio
+					ok, summary, column_updates = await asyncio.to_thread(
+						self.process_task, task
+					)
 				duration = time.time() - start
+			return ok, summary, column_updates, duration
+
+		async def run_tasks(self) -> None:
+			"""Run tasks on self.workers threads, updating the UI in task order."""
+			# asyncio.Semaphore wakes waiters in FIFO order, so tasks start in order
+			semaphore = asyncio.Semaphore(self.workers)
+			pending = [
+				asyncio.create_task(self.run_one_task(idx, task, semaphore))
+				for idx, task in enumerate(self.tasks)
+			]
+			for idx, task in enumerate(self.tasks):
+				ok, summary, column_updates, duration = await pending[idx]
 				self.durations.append(duration)
 				self.completed += 1
 				# Apply column updates returned by process_task
@@ -0,0 +1,416 @@
+# Standard Library
+import sys
+import time
+import asyncio
+
+# PIP3 modules
+import httpx
+import oauthlib.oauth1
+
+# local repo modules
+import libbrick.rate_limiter
+import libbrick.wrappers.wrapper_base as wrapper_base
+import libbrick.wrappers.bricklink_wrapper as bricklink_wrapper
+
+#https://www.bricklink.com/v3/api.page
+
+#============================
+#============================
+BRICKLINK_API_URL = 'https://api.bricklink.com/api/store/v1'
+
+# open connections kept per client, BrickLink's token bucket still paces the calls
+MAX_CONNECTIONS = 8
+
+#============================
+#============================
+class AsyncBrickLink(object):
+	"""
+	asyncio BrickLink client with pooled keep-alive HTTP connections.
+
+	Shares the caches, cache checks, and price compilation of a BrickLink
+	wrapper, so sync and async lookups read and fill the same CACHE files.
+	The wrapper's cache helpers do blocking sqlite, msgpack, and file lock
+	I/O, so they run in worker threads through asyncio.to_thread().
+	Every getter is a coroutine with the same name and arguments as in
+	BrickLink, and independent calls (the four price guides of an item)
+	run concurrently.
+
+	Example:
+		async with AsyncBrickLink() as ABL:
+			set_data, price_data = await asyncio.gather(
+				ABL.getSetData('75151-1'), ABL.getSetPriceData('75151-1'))
+	"""
+
+	#============================
+	#============================
+	def __init__(self, blw=None, max_connections: int = MAX_CONNECTIONS, transport=None):
+		"""
+		Args:
+			blw: optional; BrickLink wrapper whose caches are used, created if None.
+			max_connections: optional; pooled connections per client.
+			transport: optional; httpx transport, replaced in tests.
+		"""
+		if blw is None:
+			blw = bricklink_wrapper.BrickLink()
+		self.blw = blw
+		self.max_connections = max_connections
+		self._transport = transport
+		self._api_client = None
+		self._image_client = None
+		self._oauth_client = None
+		self._color_lock = asyncio.Lock()
+		# API calls in flight, keyed by url
+		self._flights = {}
+
+	#============================
+	#============================
+	async def __aenter__(self):
+		return self
+
+	#============================
+	#============================
+	async def __aexit__(self, exc_type, exc_value, traceback):
+		await self.close()
+
+	#============================
+	#============================
+	def _make_client(self, headers: dict = None) -> httpx.AsyncClient:
+		""" build one pooled client, connections stay open between calls """
+		limits = httpx.Limits(
+			max_connections=self.max_connections,
+			max_keepalive_connections=self.max_connections,
+		)
+		client = httpx.AsyncClient(limits=limits, timeout=30, headers=headers,
+			transport=self._transport)
+		return client
+
+	#============================
+	#============================
+	def _sign(self, url: str) -> tuple:
+		""" OAuth1 HMAC-SHA1 sign a GET request, returns (url, headers) """
+		if self._oauth_client is None:
+			api_data = self.blw.load_api_data()
+			self._oauth_client = oauthlib.oauth1.Client(
+				api_data['consumer_key'],
+				client_secret=api_data['consumer_secret'],
+				resource_owner_key=api_data['token_value'],
+				resource_owner_secret=api_data['token_secret'],
+			)
+		signed_url, headers, _ = self._oauth_client.sign(url, http_method='GET')
+		return signed_url, headers
+
+	#============================
+	#============================
+	async def close(self):
+		""" close the pooled connections, the caches are saved by self.blw.close() """
+		if self._api_client is not None:
+			await self._api_client.aclose()
+			self._api_client = None
+		if self._image_client is not None:
+			await self._image_client.aclose()
+			self._image_client = None
+
+	#============================
+	#============================
+	async def _single_flight(self, key, coroutine_function, *args):
+		""" run coroutine_function(*args) once for all callers asking for key at the same time """
+		task = self._flights.get(key)
+		if task is None:
+			task = asyncio.ensure_future(coroutine_function(*args))
+			self._flights[key] = task
+			task.add_done_callback(lambda done: self._flights.pop(key, None))
+		else:
+			self.blw.shared_fetches += 1
+		# shield: one caller being cancelled must not cancel the others' fetch
+		data = await asyncio.shield(task)
+		return data
+
+	#============================
+	#============================
+	async def _bricklink_get(self, url):
+		""" common function for all API calls, coroutines asking for the same url share one """
+		data = await self._single_flight(url, self._fetch_with_retry, url)
+		return data
+
+	#============================
+	#============================
+	async def _fetch_with_retry(self, url):
+		""" _bricklink_fetch() under the sync wrapper's retry policy and circuit breaker """
+		breaker = wrapper_base.get_circuit_breaker('api.bricklink.com')
+		attempt = 0
+		while True:
+			breaker.before_call()
+			try:
+				data = await self._bricklink_fetch(url)
+			except LookupError:
+				breaker.record_success()
+				raise
+			except wrapper_base.TransientError as error:
+				attempt += 1
+				delay = self.blw.retry_delay('api.bricklink.com', error, attempt)
+				if delay is None:
+					raise
+				await asyncio.sleep(delay)
+				continue
+			breaker.record_success()
+			return data
+
+	#============================
+	#============================
+	async def _bricklink_fetch(self, url):
+		""" make one signed API call and unwrap the data, errors as in BrickLink """
+		if self._api_client is None:
+			self._api_client = self._make_client()
+		# same token bucket and daily quota as the sync wrapper
+		await libbrick.rate_limiter.get_limiter('api.bricklink.com').wait_async(
+			self.blw.endpointName(url))
+		# sign after the wait, so the nonce and timestamp are fresh when sent
+		full_url = BRICKLINK_API_URL + '/' + url
+		signed_url, headers = self._sign(full_url)
+		try:
+			response = await self._api_client.get(signed_url, headers=headers)
+			payload = response.json() if len(response.content) > 0 else {}
+		except (httpx.TransportError, ValueError) as error:
+			# ValueError: an HTML error page where JSON was expected
+			raise wrapper_base.TransientError(f"{url}: {error}")
+		with self.blw.api_lock:
+			self.blw.api_calls += 1
+			self.blw.api_log.append(url)
+		sys.stderr.write('#')
+		if not isinstance(payload, dict):
+			payload = {}
+		code = payload.get('meta', {}).get('code', response.status_code)
+		if code >= 400 or payload.get('data') is None or len(payload.get('data')) == 0:
+			print('URL', url)
+			print("STATUS", response.status_code)
+			print("HEADERS", dict(response.headers))
+			print("RESPONSE", payload)
+			wrapper_base.raise_for_status(code, response.headers, url)
+			raise wrapper_base.NotFoundError(f"no data for {url}")
+		data = payload['data']
+		if isinstance(data, dict):
+			data['time'] = int(time.time())
+		return data
+
+	#============================
+	#============================
+	async def getColorList(self, refresh=False):
+		""" load the color table, from the shared cache unless refresh is True """
+		blw = self.blw
+		if refresh is False and await asyncio.to_thread(blw.loadColorList) is True:
+			return
+		colors_data = await self._bricklink_get('colors')
+		await asyncio.to_thread(blw.storeColorList, colors_data)
+		return
+
+	#============================
+	#============================
+	async def getColorDataFromColorID(self, colorID):
+		# the first caller fetches the table, the others wait for it
+		async with self._color_lock:
+			if self.blw.color_dict is None:
+				await self.getColorList()
+			if colorID not in self.blw.color_dict:
+				# a color newer than the cached table
+				await self.getColorList(refresh=True)
+		return self.blw.color_dict[colorID]
+
+	#============================
+	#============================
+	async def getCategoryName(self, categoryID):
+		""" get the category name from BrickLink """
+		blw = self.blw
+		# expire does NOT apply to category names
+		category_name = await asyncio.to_thread(blw.bricklink_category_cache.get, categoryID)
+		if category_name is not None:
+			return category_name
+		category_data = await self._bricklink_get('categories/{0}'.format(categoryID))
+		parent_name = None
+		parent_id = blw.categoryParentID(category_data)
+		if parent_id is not None:
+			parent_name = await self.getCategoryName(parent_id)
+		category_name = await asyncio.to_thread(blw.storeCategoryName,
+			categoryID, category_data, parent_name)
+		return category_name
+
+	#============================
+	#============================
+	async def getSetData(self, setID, verbose=True):
+		""" get the set data from BrickLink using the string setID """
+		self.blw.check_set_ID(setID)
+		set_data = await self.getSetDataDirect(setID, verbose)
+		set_data['set_id'] = setID
+		return set_data
+
+	#============================
+	#============================
+	async def getSetDataDirect(self, setID, verbose=True):
+		""" get the set data from BrickLink using a setID with hyphen, e.g. 71515-2 """
+		self.blw.check_set_ID(setID)
+		# the whole lookup is shared: a cache check finishing in its thread after
+		# another caller's fetch and store would otherwise fetch the set again
+		set_data = await self._single_flight(('set', setID), self._loadSetData, setID, verbose)
+		return set_data
+
+	#============================
+	#============================
+	async def _loadSetData(self, setID, verbose=True):
+		""" set data from the shared cache or the API, with its category name """
+		blw = self.blw
+		set_data = await asyncio.to_thread(blw.cachedItemData, 'set', setID, verbose)
+		if set_data is None:
+			set_data = await self._bricklink_get('items/set/{0}'.format(setID))
+			set_data = blw.fetchedItemData('set', setID, set_data, verbose)
+		set_data['category_name'] = await self.getCategoryName(set_data['category_id'])
+		set_data['name'] = blw.decode_and_normalize(set_data['name'])
+		await asyncio.to_thread(blw.storeItemData, 'set', setID, set_data)
+		return set_data
+
+	#============================
+	#============================
+	async def _getItemData(self, item_type, item_id, verbose=True):
+		""" catalog entry of a minifig or part, one lookup shared by concurrent callers """
+		item_data = await self._single_flight((item_type, item_id), self._loadItemData,
+			item_type, item_id, verbose)
+		return item_data
+
+	#============================
+	#============================
+	async def _loadItemData(self, item_type, item_id, verbose=True):
+		""" catalog entry of a minifig or part, from the shared cache or the API """
+		blw = self.blw
+		item_data = await asyncio.to_thread(blw.cachedItemData, item_type, item_id, verbose)
+		if item_data is not None:
+			return item_data
+		item_data = await self._bricklink_get('items/{0}/{1}'.format(item_type, item_id))
+		item_data = blw.fetchedItemData(item_type, item_id, item_data, verbose)
+		await asyncio.to_thread(blw.storeItemData, item_type, item_id, item_data)
+		return item_data
+
+	#============================
+	#============================
+	async def getMinifigData(self, minifigID, verbose=True):
+		""" get individual minifig data from BrickLink using an string minifigID """
+		minifig_data = await self._getItemData('minifig', minifigID, verbose)
+		return minifig_data
+
+	#============================
+	#============================
+	async def getPartData(self, partID, verbose=True):
+		""" get individual part data from BrickLink using an string partID """
+		part_data = await self._getItemData('part', partID, verbose)
+		return part_data
+
+	#============================
+	#============================
+	async def getPriceDetails(self, item_id, type, guide_type='sold', new_or_used='U',
+			country_code='US', currency_code='USD', color_id=None):
+		""" get price details from BrickLink using the string """
+		url = self.blw.priceDetailsUrl(item_id, type, guide_type, new_or_used,
+			country_code, currency_code, color_id)
+		price_details = await self._bricklink_get(url)
+		return price_details
+
+	#============================
+	#============================
+	async def _getPriceData(self, item_id, type, color_id=None, min_qty=1, verbose=False):
+		""" price data of an item, one lookup shared by concurrent callers """
+		price_data = await self._single_flight(('price', type, item_id, color_id, min_qty),
+			self._loadPriceData, item_id, type, color_id, min_qty, verbose)
+		return price_data
+
+	#============================
+	#============================
+	async def _loadPriceData(self, item_id, type, color_id=None, min_qty=1, verbose=False):
+		""" fetch the four price guides at once and compile them like BrickLink """
+		blw = self.blw
+		# the cache helpers read and write sqlite, keep them off the event loop
+		price_data = await asyncio.to_thread(blw.lookUpPriceDataCache, item_id, color_id, verbose)
+		if min_qty == 1 and price_data is not None:
+			return price_data
+		# raw guides stored by either client are reused, min_qty variants included
+		guide_list = await asyncio.to_thread(blw.loadPriceGuides, item_id, color_id)
+		if guide_list is None:
+			guide_list = await asyncio.gather(*[
+				self.getPriceDetails(item_id, type, guide_type, new_or_used, color_id=color_id)
+				for guide_type, new_or_used in bricklink_wrapper.PRICE_GUIDES])
+			await asyncio.to_thread(blw.storePriceGuides, item_id, color_id, guide_list)
+		price_data = await asyncio.to_thread(blw.compileGuideList, item_id, type, guide_list,
+			color_id, min_qty)
+		return price_data
+
+	#============================
+	#============================
+	async def getSetPriceData(self, setID, min_qty=1, verbose=False):
+		""" compile price data from BrickLink using the string setID """
+		self.blw.check_set_ID(setID)
+		price_data = await self._getPriceData(setID, 'set', min_qty=min_qty, verbose=verbose)
+		return price_data
+
+	#============================
+	#============================
+	async def getPartPriceData(self, partID, colorID=None, min_qty=1, verbose=False):
+		""" compile price data from BrickLink using the string partID """
+		price_data = await self._getPriceData(partID, 'part', color_id=colorID,
+			min_qty=min_qty, verbose=verbose)
+		return price_data
+
+	#============================
+	#============================
+	async def getMinifigPriceData(self, minifigID, min_qty=1, verbose=False):
+		""" compile price data from BrickLink using an string minifigID """
+		price_data = await self._getPriceData(minifigID, 'minifig', min_qty=min_qty, verbose=verbose)
+		return price_data
+
+	#============================
+	#============================
+	async def elementIDtoPartIDandColorID(self, elementID, verbose=True):
+		""" get part ID and color ID from BrickLink using a elementID number"""
+		blw = self.blw
+		elementID = int(elementID)
+		map_list = await asyncio.to_thread(blw.cachedElementMap, elementID, verbose)
+		if map_list is not None:
+			return map_list
+		try:
+			map_data = await self._bricklink_get('item_mapping/{0}'.format(elementID))
+		except LookupError:
+			print("UNKNOWN Element ID")
+			return None
+		map_list = await asyncio.to_thread(blw.storeElementMap, elementID, map_data, verbose)
+		return map_list
+
+	#============================
+	#============================
+	async def image_exists(self, url, verbose=True):
+		""" check if the image exists at a given URL, sharing the wrapper's answers """
+		blw = self.blw
+		if blw.image_url_checks.get(url, None) is not None:
+			return blw.image_url_checks[url]
+		if verbose:
+			print(f"check {url}")
+		blw.image_checks += 1
+		if self._image_client is None:
+			self._image_client = self._make_client(bricklink_wrapper.IMAGE_CHECK_HEADERS)
+		limiter = libbrick.rate_limiter.get_limiter(httpx.URL(url).host)
+		await limiter.wait_async()
+		try:
+			response = await self._image_client.get(url, timeout=2)
+		except httpx.TimeoutException:
+			if verbose:
+				print("TIMEOUT")
+			blw.status_counts['timeout'] += 1
+			return False
+		exists = (response.status_code == 200)
+		if verbose:
+			print("success" if exists else "FAIL")
+		blw.status_counts['success' if exists else 'fail'] += 1
+		blw.image_url_checks[url] = exists
+		return exists
+
+	#============================
+	#============================
+	async def elementID_image_exists(self, elementID):
+		url = "https://www.lego.com/cdn/product-assets/"
+		url += f"element.img.lod5photo.192x192/{elementID}.jpg"
+		exists = await self.image_exists(url)
+		return exists
@@ -5,8 +5,7 @@ import os
 import sys
 import math
 import time
-import random
-import statistics
+import concurrent.futures
 
 # PIP3 modules
 import yaml
@@ -16,10 +15,31 @@ import bricklink.api
 
 # local repo modules
 import libbrick.path_utils
+import libbrick.price_stats
+import libbrick.rate_limiter
 import libbrick.wrappers.wrapper_base as wrapper_base
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# (guide_type, new_or_used) of the four price guides behind one price entry
+PRICE_GUIDES = (('sold', 'U'), ('sold', 'N'), ('stock', 'U'), ('stock', 'N'))
+
+# catalog item type -> (cache name, label in progress lines)
+ITEM_CACHES = {
+	'set': ('bricklink_set_cache', 'SET'),
+	'minifig': ('bricklink_minifig_cache', 'MINIFIG'),
+	'part': ('bricklink_part_cache', 'PART'),
+}
+
+# browser-like headers for the lego.com CDN image checks
+IMAGE_CHECK_HEADERS = {
+	'User-Agent': ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 '
+		'(KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36'),
+	'Accept': 'image/webp,*/*',
+	'Accept-Encoding': 'gzip, deflate, br',
+	'Accept-Language': 'en-US,en;q=0.5',
+}
+
 #https://www.bricklink.com/v3/api.page
 
 class BrickLink(wrapper_base.BaseWrapperClass):
@@ -29,42 +49,65 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 		self.debug = True
 		self.api_data = None
 		self.bricklink_api = None
+		self.http_session = None
 		self.color_dict = None
 		self.price_count = 0
 		self.image_checks = 0
 		self.image_url_checks = {}
 		self.status_counts = {'success': 0, 'timeout': 0, 'fail': 0}
+		# rate limiter and daily quota key
+		self.api_host = 'api.bricklink.com'
 		self.data_caches = {
-			'bricklink_category_cache': 		'yml',
 			'bricklink_set_brick_weight_cache': 'yml',
 			'bricklink_minifig_set_cache': 		'yml',
 			'bricklink_minifig_category_cache': 'yml',
-			'bricklink_minifig_superset_cache': 'yml',
-			'bricklink_element_id_map_cache':	'yml',
-
-			'bricklink_price_cache': 			'json',
-			'bricklink_subset_cache': 			'json',
-			'bricklink_minifig_cache': 			'json',
-			'bricklink_part_cache': 			'json',
-			'bricklink_set_cache': 				'json',
+
+			# machine-written, fix entries by hand in CACHE/<name>_overrides.yml
+			'bricklink_category_cache': 		'msgpack',
+			'bricklink_color_cache': 			'msgpack',
+			'bricklink_minifig_superset_cache': 'msgpack',
+			'bricklink_element_id_map_cache':	'msgpack',
+
+			'bricklink_subset_cache': 			'msgpack',
+			'bricklink_minifig_cache': 			'msgpack',
+			'bricklink_set_cache': 				'msgpack',
+
+			'bricklink_price_cache': 			'sqlite',
+			'bricklink_price_guide_cache': 		'sqlite',
+			'bricklink_part_cache': 			'sqlite',
+		}
+		# entries past expire_time are refetched anyway, keep a margin for
+		# offline runs, then drop them so the tables stop growing
+		self.cache_limits = {
+			'bricklink_price_cache': {'max_entries': 200000, 'ttl': 90 * 24 * 3600},
+			'bricklink_price_guide_cache': {'max_entries': 200000, 'ttl': 90 * 24 * 3600},
+			'bricklink_part_cache': {'max_entries': 100000, 'ttl': 180 * 24 * 3600},
 		}
+		# time-stamped caches that refresh_bricklink_cache.py renews
+		self.refresh_caches = (
+			'bricklink_price_cache',
+			'bricklink_part_cache',
+			'bricklink_set_cache',
+			'bricklink_minifig_cache',
+		)
 		self.start()
 
 	#============================
 	#============================
-	def _ensure_api_client(self):
+	def load_api_data(self):
 		"""
-		Lazily load OAuth1 credentials and build BrickLinkAPI client on first use.
+		Load the OAuth1 credentials from bricklink_api_private.yml on first use.
 
-		2026-05-19: Deferred credential loading for downstream FastAPI service;
-		construction must succeed without bricklink_api_private.yml.
+		Shared by the BrickLinkAPI client and the async client.
+
+		Returns:
+			dict: consumer_key, consumer_secret, token_value, token_secret.
 
 		Raises:
 			FileNotFoundError: if no credential file resolved.
-			KeyError: if file is missing a required field.
 		"""
-		if self.bricklink_api is not None:
-			return
+		if self.api_data is not None:
+			return self.api_data
 		key_file_name = 'bricklink_api_private.yml'
 		env_path = os.environ.get('BRICKLINK_API_FILE')
 		key_paths = []
@@ -82,70 +125,200 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 				break
 		if self.api_data is None:
 			raise FileNotFoundError(f"BrickLink API key file not found in: {key_paths}")
+		return self.api_data
+
+	#============================
+	#============================
+	def _ensure_api_client(self):
+		"""
+		Lazily load OAuth1 credentials and build BrickLinkAPI client on first use.
+
+		2026-05-19: Deferred credential loading for downstream FastAPI service;
+		construction must succeed without bricklink_api_private.yml.
+
+		Raises:
+			FileNotFoundError: if no credential file resolved.
+			KeyError: if file is missing a required field.
+		"""
+		if self.bricklink_api is not None:
+			return
+		api_data = self.load_api_data()
 		self.bricklink_api = bricklink.api.BrickLinkAPI(
-			self.api_data['consumer_key'],
-			self.api_data['consumer_secret'],
-			self.api_data['token_value'],
-			self.api_data['token_secret'],
+			api_data['consumer_key'],
+			api_data['consumer_secret'],
+			api_data['token_value'],
+			api_data['token_secret'],
 		)
 
+	#============================
+	#============================
+	def _refresh_cache_entry(self, cache_name, key):
+		""" refetch one entry picked by refresh_oldest() """
+		if cache_name == 'bricklink_set_cache':
+			self.getSetDataDirect(key, verbose=False)
+		elif cache_name == 'bricklink_minifig_cache':
+			self.getMinifigData(key, verbose=False)
+		elif cache_name == 'bricklink_part_cache':
+			self.getPartData(key, verbose=False)
+		elif cache_name == 'bricklink_price_cache':
+			item_type, item_id, color_id = self._priceItem(key)
+			# the raw guides are as old as the entry, the getter must refetch them too
+			guide_entry = ('bricklink_price_guide_cache', key)
+			self._refresh_bypass.add(guide_entry)
+			try:
+				if item_type == 'set':
+					self.getSetPriceData(item_id)
+				elif item_type == 'minifig':
+					self.getMinifigPriceData(item_id)
+				elif item_type == 'part':
+					self.getPartPriceData(item_id, color_id)
+				else:
+					raise ValueError(f"unknown item_type {item_type} in price entry {key}")
+			finally:
+				self._refresh_bypass.discard(guide_entry)
+		else:
+			raise ValueError(f"no refresh defined for cache {cache_name}")
+
+	#============================
+	#============================
+	def _priceItem(self, key):
+		"""
+		Return (item_type, item_id, color_id) of a bricklink_price_cache entry.
+
+		Entries store their item type and color. Entries cached before they
+		did are read from the key: 'part_color' for parts, '1234-1' for sets,
+		else a minifig if one is cached under that ID, or a colorless part.
+		"""
+		price_data = self.bricklink_price_cache[key]
+		if price_data.get('item_type') is not None:
+			return price_data['item_type'], price_data['item_id'], price_data.get('color_id')
+		if '_' in key:
+			partID, colorID = key.rsplit('_', 1)
+			return 'part', partID, int(colorID)
+		if '-' in key:
+			return 'set', key, None
+		if key in self.bricklink_minifig_cache:
+			return 'minifig', key, None
+		return 'part', key, None
+
 	#============================
 	#============================
 	def _bricklink_get(self, url):
-		""" common function for all API calls """
-		self._ensure_api_client()
-		#random sleep of 0-1 seconds to help server load
-		time.sleep(random.random()+random.random())
-		status, headers, response = self.bricklink_api.get(url)
-		self.api_calls += 1
+		""" common function for all API calls, shared by threads asking for the same url """
+		data = self.single_flight(url,
+			lambda: self.call_with_retry('api.bricklink.com', lambda: self._bricklink_fetch(url)))
+		return data
+
+	#============================
+	#============================
+	@staticmethod
+	def endpointName(url):
+		""" endpoint for the quota ledger: 'items/part/3001/price?...' is 'price' """
+		path_parts = url.split('?')[0].split('/')
+		if path_parts[0] == 'items' and len(path_parts) >= 4:
+			# price, supersets, subsets
+			return path_parts[3]
+		return path_parts[0]
+
+	#============================
+	#============================
+	def _bricklink_fetch(self, url):
+		"""
+		Make one signed API call and unwrap the data.
+
+		Raises:
+			wrapper_base.NotFoundError: no such item, a LookupError.
+			wrapper_base.TransientError: network error or 5xx, retried by the caller.
+			wrapper_base.ThrottledError: BrickLink asked us to slow down.
+		"""
+		with self.api_lock:
+			self._ensure_api_client()
+		# token bucket and daily quota shared by every BrickLink wrapper in the process
+		libbrick.rate_limiter.get_limiter(self.api_host).wait(self.endpointName(url))
+		try:
+			status, headers, response = self.bricklink_api.get(url)
+		except (requests.exceptions.RequestException, ValueError) as error:
+			# ValueError: an HTML error page where JSON was expected
+			raise wrapper_base.TransientError(f"{url}: {error}")
+		with self.api_lock:
+			self.api_calls += 1
+			self.api_log.append(url)
 		sys.stderr.write('#')
 		#sys.stderr.flush()
-		self.api_log.append(url)
-		error_msg = False
-		if response.get('data') is None or len(response.get('data')) == 0:
-			error_msg = True
-		if error_msg is True:
-			self.save_cache()
+		if not isinstance(response, dict):
+			response = {}
+		# BrickLink puts the real status in meta.code, even on an HTTP 200 reply
+		code = response.get('meta', {}).get('code', status)
+		if code >= 400 or response.get('data') is None or len(response.get('data')) == 0:
 			print('URL', url)
 			print("STATUS", status)
 			print("HEADERS", headers)
 			print("RESPONSE", response)
-			raise LookupError
+			wrapper_base.raise_for_status(code, headers, url)
+			raise wrapper_base.NotFoundError(f"no data for {url}")
 		data = response['data']
 		if isinstance(data, dict):
 			data['time'] = int(time.time())
-		if self.api_calls % 50 == 0:
-			self.save_cache()
 		return data
 
 	#============================
 	#============================
-	def getColorList(self):
+	def getColorList(self, refresh=False):
+		""" load the color table, from the cache unless refresh is True """
+		if refresh is False and self.loadColorList() is True:
+			return
 		colors_data = self._bricklink_get('colors')
+		self.storeColorList(colors_data)
+		return
+
+	#============================
+	#============================
+	def loadColorList(self):
+		""" build color_dict from the color cache, False if the cache is empty """
+		# expire does NOT apply to colors, a catalog import or an earlier run stored them
+		if len(self.bricklink_color_cache) == 0:
+			return False
+		self.setColorList(list(self.bricklink_color_cache.values()))
+		return True
+
+	#============================
+	#============================
+	def storeColorList(self, colors_data):
+		""" build color_dict from colors fetched from the API and cache them """
 		print("received data for {0} colors".format(len(colors_data)))
-		self.color_dict = {0: {}, }
+		self.setColorList(colors_data)
+		self.bricklink_color_cache.update({color_data['color_id']: color_data for color_data in colors_data})
+
+	#============================
+	#============================
+	def setColorList(self, colors_data):
+		""" build color_dict from a list of color data dicts """
+		# fill a local dict first, worker threads must never see a partial table
+		color_dict = {0: {}, }
 		for color_data in colors_data:
 			#import pprint
 			#pprint.pprint(color_data)
 			if len(color_data.get('color_code', '')) == 6:
 				color_data['color_code'] = '#' + color_data.get('color_code')
 			color_id = color_data['color_id']
-			self.color_dict[color_id] = color_data
-		return
+			color_dict[color_id] = color_data
+		self.color_dict = color_dict
 
 	#============================
 	#============================
 	def getColorDataFromColorID(self, colorID):
 		if self.color_dict is None:
 			self.getColorList()
+		if colorID not in self.color_dict:
+			# a color newer than the cached table
+			self.getColorList(refresh=True)
 		return self.color_dict[colorID]
 
 	#============================
 	#============================
 	def getColorNameFromColorID(self, colorID):
-		if self.color_dict is None:
-			self.getColorList()
-		return self.color_dict[colorID]['color_name']
+		color_data = self.getColorDataFromColorID(colorID)
+		return color_data['color_name']
 
 	#============================
 	#============================
@@ -159,19 +332,31 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 		###################
 		category_data = self._bricklink_get('categories/{0}'.format(categoryID))
 		###################
-		#print(category_data)
-		if category_data.get('parent_id') is not None and category_data.get('parent_id') > 1:
-			parent_name = self.getCategoryName(category_data.get('parent_id'))
-			if not category_data['category_name'].startswith(parent_name):
-				category_name = parent_name + ' ' + category_data['category_name']
-				category_name = self.decode_and_normalize(category_name)
-				category_data['category_name'] = category_name
-			else:
-				category_name = category_data['category_name']
-		else:
-			category_name = category_data['category_name']
+		parent_name = None
+		parent_id = self.categoryParentID(category_data)
+		if parent_id is not None:
+			parent_name = self.getCategoryName(parent_id)
+		category_name = self.storeCategoryName(categoryID, category_data, parent_name)
+		return category_name
+
+	#============================
+	#============================
+	@staticmethod
+	def categoryParentID(category_data):
+		""" parent category to prefix the name with, None for a top-level category """
+		parent_id = category_data.get('parent_id')
+		if parent_id is not None and parent_id > 1:
+			return parent_id
+		return None
+
+	#============================
+	#============================
+	def storeCategoryName(self, categoryID, category_data, parent_name=None):
+		""" build the full category name, prefixed by its parent's, and cache it """
+		category_name = category_data['category_name']
+		if parent_name is not None and not category_name.startswith(parent_name):
+			category_name = self.decode_and_normalize(parent_name + ' ' + category_name)
 		self.bricklink_category_cache[categoryID] = category_name
-		#print(category_name)
 		return category_name
 
 	#============================
@@ -195,7 +380,7 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 	#============================
 	def getSetData(self, setID, verbose=True):
 		""" get the set data from BrickLink using the string setID """
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		set_data = self.getSetDataDirect(setID, verbose)
 		set_data['set_id'] = setID
 		return set_data
@@ -204,7 +389,7 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 	#============================
 	def getSetDataDetails(self, setID, verbose=True):
 		""" get the set data from BrickLink using the string setID """
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		set_data = self.getSetDataDirect(setID, verbose)
 		price_data = self.getSetPriceData(setID)
 		set_data.update(price_data)
@@ -215,29 +400,62 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 	#============================
 	def getSetDataDirect(self, setID, verbose=True):
 		""" get the set data from BrickLink using a setID with hyphen, e.g. 71515-2 """
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		###################
-		set_data = self.bricklink_set_cache.get(setID)
-		if self._check_if_data_valid(set_data) is True:
-			if verbose is True:
-				print('SET {0} -- {1} ({2}) -- from cache'.format(
-					set_data.get('no'), set_data.get('name'), set_data.get('year_released'),))
-			# update connected data
-			set_data['category_name'] = self.getCategoryName(set_data['category_id'])
-			set_data['name'] = self.decode_and_normalize(set_data['name'])
-			self.bricklink_set_cache[setID] = set_data
-			return set_data
-		###################
-		set_data = self._bricklink_get('items/set/{0}'.format(setID))
-		set_data['name'] = self.decode_and_normalize(set_data['name'])
-		###################
-		if verbose is True:
-			print('SET {0} -- {1} ({2}) -- from BrickLink website'.format(
-				set_data.get('no'), set_data.get('name'), set_data.get('year_released'),))
+		set_data = self.cachedItemData('set', setID, verbose)
+		if set_data is None:
+			set_data = self._bricklink_get('items/set/{0}'.format(setID))
+			set_data = self.fetchedItemData('set', setID, set_data, verbose)
+		# update connected data
 		set_data['category_name'] = self.getCategoryName(set_data['category_id'])
-		self.bricklink_set_cache[setID] = set_data
+		set_data['name'] = self.decode_and_normalize(set_data['name'])
+		self.storeItemData('set', setID, set_data)
 		return set_data
 
+	#============================
+	#============================
+	def cachedItemData(self, item_type, item_id, verbose=True):
+		"""
+		Return the cached catalog entry of a set, minifig, or part.
+
+		Shared with the async client, like fetchedItemData() and storeItemData().
+
+		Args:
+			item_type: 'set', 'minifig', or 'part', see ITEM_CACHES.
+			item_id: BrickLink item number.
+			verbose: optional; print a line for a cache hit.
+
+		Returns:
+			dict: the entry, or None if it is missing or expired.
+		"""
+		cache_name, label = ITEM_CACHES[item_type]
+		key = str(item_id)
+		item_data = getattr(self, cache_name).get(key)
+		if self.check_if_data_valid(item_data, cache_name, key) is not True:
+			return None
+		if verbose is True:
+			print('{0} {1} -- {2} ({3}) -- from cache'.format(label,
+				item_data.get('no'), item_data.get('name')[:60], item_data.get('year_released'),))
+		return item_data
+
+	#============================
+	#============================
+	def fetchedItemData(self, item_type, item_id, item_data, verbose=True):
+		""" normalize the name of an entry fresh from the API and report it """
+		label = ITEM_CACHES[item_type][1]
+		item_data['name'] = self.decode_and_normalize(item_data['name'])
+		if verbose is True:
+			print('{0} {1} -- {2} ({3}) -- from BrickLink website'.format(label,
+				item_id, item_data.get('name')[:60], item_data.get('year_released'),))
+		return item_data
+
+	#============================
+	#============================
+	def storeItemData(self, item_type, item_id, item_data):
+		""" write a catalog entry to its cache """
+		cache_name = ITEM_CACHES[item_type][0]
+		getattr(self, cache_name)[str(item_id)] = item_data
+
 	#============================
 	#============================
 	def getSupersetFromMinifigID(self, minifigID, verbose=True):
@@ -275,7 +493,7 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 	#============================
 	def getPartsFromSet(self, setID, verbose=True):
 		""" get all the parts from a set from BrickLink using the string setID """
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		###################
 		subsets_tree = self._bricklink_get('items/set/{0}/subsets'.format(setID))
 		###################
@@ -290,7 +508,7 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 	#============================
 	def getSetBrickWeight(self, setID, verbose=True):
 		""" custom function to add up the weight of all the parts in a set """
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		set_data = self.getSetData(setID, verbose=False)
 		###################
 		string_weight = self.bricklink_set_brick_weight_cache.get(setID)
@@ -311,7 +529,6 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 					print(item['type'], item['name'])
 					continue
 				if item['type'] != 'PART':
-					self.save_cache()
 					print(item)
 					print(item['type'])
 					sys.exit(1)
@@ -332,14 +549,127 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 
 	#============================
 	#============================
-	def _lookUpPriceDataCache(self, item_id, color_id=None, verbose=True):
-		""" common function for looking price data from cache """
-		###################
+	@staticmethod
+	def _priceKey(item_id, color_id=None):
+		""" key shared by the price cache and the raw price guide cache """
 		key = str(item_id)
 		if color_id is not None:
 			key = '{0}_{1}'.format(item_id, color_id)
+		return key
+
+	#============================
+	#============================
+	def storePriceGuides(self, item_id, color_id, guide_list):
+		"""
+		Keep the four raw price guides of an item, one column per field.
+
+		Only the fields the price statistics read are kept, unit prices and
+		quantities as parallel lists, so any min_qty or median variant can be
+		recomputed from the cache without API calls.
+
+		Args:
+			item_id: set, part, or minifig ID.
+			color_id: color ID for parts, or None.
+			guide_list: four price guide replies in PRICE_GUIDES order.
+		"""
+		guides = {}
+		for (guide_type, new_or_used), details in zip(PRICE_GUIDES, guide_list):
+			rows = details.get('price_detail', [])
+			guides['{0}_{1}'.format(guide_type, new_or_used)] = {
+				'avg_price': details['avg_price'],
+				'total_quantity': details['total_quantity'],
+				'unit_price': [float(row['unit_price']) for row in rows],
+				'quantity': [int(row['quantity']) for row in rows],
+			}
+		key = self._priceKey(item_id, color_id)
+		self.bricklink_price_guide_cache[key] = {'time': int(time.time()), 'guides': guides}
+
+	#============================
+	#============================
+	def loadPriceGuides(self, item_id, color_id=None, allow_expired=False):
+		"""
+		Rebuild the four raw price guides of an item from the cache.
+
+		Args:
+			item_id: set, part, or minifig ID.
+			color_id: optional; color ID for parts.
+			allow_expired: optional; also return guides past expire_time.
+
+		Returns:
+			list: four price guides in PRICE_GUIDES order, or None.
+		"""
+		key = self._priceKey(item_id, color_id)
+		entry = self.bricklink_price_guide_cache.get(key)
+		if entry is None:
+			return None
+		if (allow_expired is False and
+				self.check_if_data_valid(entry, 'bricklink_price_guide_cache', key) is not True):
+			return None
+		guide_list = []
+		for guide_type, new_or_used in PRICE_GUIDES:
+			guide = entry['guides']['{0}_{1}'.format(guide_type, new_or_used)]
+			rows = [{'unit_price': unit_price, 'quantity': quantity}
+				for unit_price, quantity in zip(guide['unit_price'], guide['quantity'])]
+			guide_list.append({
+				'avg_price': guide['avg_price'],
+				'total_quantity': guide['total_quantity'],
+				'price_detail': rows,
+			})
+		return guide_list
+
+	#============================
+	#============================
+	def _getPriceGuides(self, item_id, color_id, fetch_details):
+		"""
+		Return the four price guides from the raw cache, or fetch and store them.
+
+		Args:
+			item_id: set, part, or minifig ID.
+			color_id: color ID for parts, or None.
+			fetch_details: function of (guide_type, new_or_used) that calls the API.
+
+		Returns:
+			list: four price guides in PRICE_GUIDES order.
+		"""
+		guide_list = self.loadPriceGuides(item_id, color_id)
+		if guide_list is not None:
+			return guide_list
+		guide_list = [fetch_details(guide_type, new_or_used) for guide_type, new_or_used in PRICE_GUIDES]
+		self.storePriceGuides(item_id, color_id, guide_list)
+		return guide_list
+
+	#============================
+	#============================
+	def recomputePriceData(self, item_id, color_id=None, min_qty=1, verbose=False):
+		"""
+		Recompute price data from the stored raw guides, with no API calls.
+
+		Expired guides are used too, this is meant for offline analysis,
+		for example a different min_qty for getWeightedAveragePrice().
+
+		Returns:
+			dict: price data as from getPartPriceData(), or None if the
+				item's guides were never stored.
+		"""
+		guide_list = self.loadPriceGuides(item_id, color_id, allow_expired=True)
+		if guide_list is None:
+			return None
+		item_type = None
+		key = self._priceKey(item_id, color_id)
+		if key in self.bricklink_price_cache:
+			item_type = self._priceItem(key)[0]
+		price_data = self.compileGuideList(item_id, item_type, guide_list, color_id=color_id,
+			min_qty=min_qty, verbose=verbose)
+		return price_data
+
+	#============================
+	#============================
+	def lookUpPriceDataCache(self, item_id, color_id=None, verbose=True):
+		""" common function for looking price data from cache """
+		###################
+		key = self._priceKey(item_id, color_id)
 		price_data = self.bricklink_price_cache.get(key)
-		if self._check_if_data_valid(price_data) is True:
+		if self.check_if_data_valid(price_data, 'bricklink_price_cache', key) is True:
 			if verbose is True:
 				print('PRICE {0} -- ${1:.2f} -- ${2:.2f} -- ${3:.2f} -- ${4:.2f} -- from cache'.format(
 					price_data.get('item_id'),
@@ -355,8 +685,30 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 
 	#============================
 	#============================
-	def _compilePriceData(self, item_id, new_price_sale_details, used_price_sale_details,
-			new_price_list_details, used_price_list_details, min_qty=1, color_id=None, verbose=True):
+	def compileGuideList(self, item_id, item_type, guide_list, color_id=None, min_qty=1, verbose=True):
+		"""
+		Compile four price guides in PRICE_GUIDES order into one price entry.
+
+		Shared with the async client, see compilePriceData() for the entry.
+		"""
+		used_price_sale_details, new_price_sale_details, used_price_list_details, new_price_list_details = guide_list
+		price_data = self.compilePriceData(item_id,
+			new_price_sale_details, used_price_sale_details,
+			new_price_list_details, used_price_list_details,
+			min_qty=min_qty, color_id=color_id, verbose=verbose, item_type=item_type)
+		return price_data
+
+	#============================
+	#============================
+	def compilePriceData(self, item_id, new_price_sale_details, used_price_sale_details,
+			new_price_list_details, used_price_list_details, min_qty=1, color_id=None, verbose=True,
+			item_type=None):
+		"""
+		Compile the four price guides of an item into one price entry.
+
+		item_type ('set', 'part', or 'minifig') and color_id are stored in the
+		entry, so refresh_oldest() knows which getter refetches it.
+		"""
 		###################
 		new_avg_sale_price 	= int(float(new_price_sale_details['avg_price'])*100)
 		new_sale_qty 		= int(new_price_sale_details['total_quantity'])
@@ -367,72 +719,20 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 		used_avg_list_price = int(float(used_price_list_details['avg_price'])*100)
 		used_list_qty 		= int(used_price_list_details['total_quantity'])
 		###################
-		# New Sales
-		minimum_prices_for_calc = 5
-		new_median_sale_price = -1
-		if new_sale_qty >= 1:
-			new_sale_prices = []
-			for item in new_price_sale_details['price_detail']:
-				if int(item['quantity']) < min_qty:
-					continue
-				for i in range(int(item['quantity'])):
-					new_sale_prices.append(int(float(item['unit_price'])*100))
-			if len(new_sale_prices) > minimum_prices_for_calc:
-				new_median_sale_price = int(statistics.median(new_sale_prices))
-			del new_sale_prices
-		###################
-		# Used Sales
-		used_median_sale_price = -1
-		if used_sale_qty >= 1:
-			used_sale_prices = []
-			for item in used_price_sale_details['price_detail']:
-				if int(item['quantity']) < min_qty:
-					continue
-				for i in range(int(item['quantity'])):
-					used_sale_prices.append(int(float(item['unit_price'])*100))
-			if len(used_sale_prices) > minimum_prices_for_calc:
-				used_median_sale_price = int(statistics.median(used_sale_prices))
-			del used_sale_prices
-		###################
-		# New Sales
-		new_median_list_price = -1
-		if new_list_qty >= 1:
-			new_list_prices = []
-			for item in new_price_list_details['price_detail']:
-				if int(item['quantity']) < min_qty:
-					continue
-				for i in range(int(item['quantity'])):
-					new_list_prices.append(int(float(item['unit_price'])*100))
-			if len(new_list_prices) > minimum_prices_for_calc:
-				new_median_list_price = int(statistics.median(new_list_prices))
-				new_list_prices2 = []
-				for listp in new_list_prices:
-					if listp <= new_median_list_price:
-						new_list_prices2.append(listp)
-				new_median_list_price = int(statistics.median(new_list_prices2))
-			del new_list_prices
-		###################
-		# Used Sales
-		used_median_list_price = -1
-		if used_list_qty >= 1:
-			used_list_prices = []
-			for item in used_price_list_details['price_detail']:
-				if int(item['quantity']) < min_qty:
-					continue
-				for i in range(int(item['quantity'])):
-					used_list_prices.append(int(float(item['unit_price'])*100))
-			if len(used_list_prices) > minimum_prices_for_calc:
-				used_median_list_price = int(statistics.median(used_list_prices))
-				used_list_prices2 = []
-				for listp in used_list_prices:
-					if listp <= used_median_list_price:
-						used_list_prices2.append(listp)
-				print(len(used_list_prices2), len(used_list_prices))
-				used_median_list_price = int(statistics.median(used_list_prices2))
-			del used_list_prices
+		# weighted medians over (price, quantity) rows, same values as
+		# statistics.median() on the quantity-expanded price lists
+		new_median_sale_price = libbrick.price_stats.median_price(new_price_sale_details, min_qty)
+		used_median_sale_price = libbrick.price_stats.median_price(used_price_sale_details, min_qty)
+		# asking prices are skewed by overpriced lots, take the median of the lower half
+		new_median_list_price = libbrick.price_stats.median_price(new_price_list_details, min_qty,
+			trim_above_median=True)
+		used_median_list_price = libbrick.price_stats.median_price(used_price_list_details, min_qty,
+			trim_above_median=True)
 		###################
 		price_data = {
 			'item_id':					item_id,
+			'item_type':				item_type,
+			'color_id':					color_id,
 			##=========
 			'new_avg_sale_price': 		new_avg_sale_price,
 			'new_median_sale_price': 	new_median_sale_price,
@@ -462,14 +762,10 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 			))
 			if color_id is not None:
 				print('color_id={0}'.format(color_id))
-		key = str(item_id)
-		if color_id is not None:
-			key = '{0}_{1}'.format(item_id, color_id)
+		key = self._priceKey(item_id, color_id)
 		if min_qty == 1:
 			self.bricklink_price_cache[key] = price_data
 		self.price_count += 1
-		if self.price_count % 10 == 0:
-			self.save_cache(single_cache_name='bricklink_price_cache')
 		return price_data
 
 	#============================
@@ -477,6 +773,17 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 	def getPriceDetails(self, item_id, type, guide_type='sold', new_or_used='U',
 			country_code='US', currency_code='USD', color_id=None):
 		""" get price details from BrickLink using the string """
+		url = self.priceDetailsUrl(item_id, type, guide_type, new_or_used,
+			country_code, currency_code, color_id)
+		price_details = self._bricklink_get(url)
+		return price_details
+
+	#============================
+	#============================
+	@staticmethod
+	def priceDetailsUrl(item_id, type, guide_type='sold', new_or_used='U',
+			country_code='US', currency_code='USD', color_id=None):
+		""" price guide API path, shared with the async client """
 		url = 'items/{0}/{1}/price'.format(type, item_id)
 		url += '?guide_type={0}'.format(guide_type)
 		url += '&new_or_used={0}'.format(new_or_used)
@@ -484,8 +791,7 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 		url += '&currency_code={0}'.format(currency_code)
 		if color_id is not None:
 			url += '&color_id={0}'.format(color_id)
-		price_details = self._bricklink_get(url)
-		return price_details
+		return url
 
 	#============================
 	#============================
@@ -493,7 +799,7 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 			country_code='US', currency_code='USD', verbose=True):
 		""" get price details from BrickLink using the string setID """
 		#https://www.bricklink.com/v3/api.page?page=get-price-guide
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		###################
 		price_details = self.getPriceDetails(setID, 'set', guide_type, new_or_used,
 				country_code, currency_code)
@@ -509,19 +815,17 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 	#============================
 	def getSetPriceData(self, setID, min_qty=1, verbose=False):
 		""" compile price data from BrickLink using the string setID """
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		###################
-		price_data = self._lookUpPriceDataCache(setID, verbose=verbose)
+		price_data = self.lookUpPriceDataCache(setID, verbose=verbose)
 		if min_qty == 1 and price_data is not None:
 			return price_data
 		###################
-		used_price_sale_details = self.getSetPriceDetails(setID, guide_type='sold', new_or_used='U', verbose=verbose)
-		new_price_sale_details 	= self.getSetPriceDetails(setID, guide_type='sold', new_or_used='N', verbose=verbose)
-		used_price_list_details = self.getSetPriceDetails(setID, guide_type='stock', new_or_used='U', verbose=verbose)
-		new_price_list_details 	= self.getSetPriceDetails(setID, guide_type='stock', new_or_used='N', verbose=verbose)
-		price_data = self._compilePriceData(setID,
-			new_price_sale_details, used_price_sale_details,
-			new_price_list_details, used_price_list_details, min_qty=min_qty)
+		# raw guides are kept, so min_qty variants need no API calls
+		guide_list = self._getPriceGuides(setID, None,
+			lambda guide_type, new_or_used: self.getSetPriceDetails(setID,
+				guide_type=guide_type, new_or_used=new_or_used, verbose=verbose))
+		price_data = self.compileGuideList(setID, 'set', guide_list, min_qty=min_qty)
 		return price_data
 
 	#============================
@@ -546,18 +850,14 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 	def getPartPriceData(self, partID, colorID=None, min_qty=1, verbose=False):
 		""" compile price data from BrickLink using the string partID """
 		###################
-		price_data = self._lookUpPriceDataCache(partID, color_id=colorID, verbose=verbose)
+		price_data = self.lookUpPriceDataCache(partID, color_id=colorID, verbose=verbose)
 		if min_qty == 1 and price_data is not None:
 			return price_data
 		###################
-		used_price_sale_details = self.getPartPriceDetails(partID, colorID, guide_type='sold', new_or_used='U', verbose=verbose)
-		new_price_sale_details 	= self.getPartPriceDetails(partID, colorID, guide_type='sold', new_or_used='N', verbose=verbose)
-		used_price_list_details = self.getPartPriceDetails(partID, colorID, guide_type='stock', new_or_used='U', verbose=verbose)
-		new_price_list_details 	= self.getPartPriceDetails(partID, colorID, guide_type='stock', new_or_used='N', verbose=verbose)
-		price_data = self._compilePriceData(partID,
-			new_price_sale_details, used_price_sale_details,
-			new_price_list_details, used_price_list_details,
-			color_id=colorID, min_qty=min_qty)
+		guide_list = self._getPriceGuides(partID, colorID,
+			lambda guide_type, new_or_used: self.getPartPriceDetails(partID, colorID,
+				guide_type=guide_type, new_or_used=new_or_used, verbose=verbose))
+		price_data = self.compileGuideList(partID, 'part', guide_list, color_id=colorID, min_qty=min_qty)
 		return price_data
 
 	#============================
@@ -580,25 +880,88 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 	#============================
 	def getMinifigPriceData(self, minifigID, min_qty=1, verbose=False):
 		""" compile price data from BrickLink using an string minifigID """
-		price_data = self._lookUpPriceDataCache(minifigID, verbose=verbose)
+		price_data = self.lookUpPriceDataCache(minifigID, verbose=verbose)
 		if min_qty == 1 and price_data is not None:
 			return price_data
-		used_price_sale_details = self.getMinifigPriceDetails(minifigID, guide_type='sold', new_or_used='U', verbose=verbose)
-		new_price_sale_details 	= self.getMinifigPriceDetails(minifigID, guide_type='sold', new_or_used='N', verbose=verbose)
-		used_price_list_details = self.getMinifigPriceDetails(minifigID, guide_type='stock', new_or_used='U', verbose=verbose)
-		new_price_list_details 	= self.getMinifigPriceDetails(minifigID, guide_type='stock', new_or_used='N', verbose=verbose)
-		price_data = self._compilePriceData(minifigID,
-			new_price_sale_details, used_price_sale_details,
-			new_price_list_details, used_price_list_details,
-			min_qty=min_qty,
-			)
+		guide_list = self._getPriceGuides(minifigID, None,
+			lambda guide_type, new_or_used: self.getMinifigPriceDetails(minifigID,
+				guide_type=guide_type, new_or_used=new_or_used, verbose=verbose))
+		price_data = self.compileGuideList(minifigID, 'minifig', guide_list, min_qty=min_qty)
 		return price_data
 
+	#============================
+	#============================
+	def prefetchPriceData(self, items, workers=4, verbose=False, value=None, api_budget=None):
+		"""
+		Warm bricklink_price_cache for many items in one pass.
+
+		Items already fresh in the cache are skipped. The four price guides
+		of every other item are fetched on a thread pool, paced by the
+		BrickLink rate limiter, then compiled as in getPartPriceData().
+		When the budget cannot cover every item, the most valuable items
+		are fetched and the rest are left for a later run.
+
+		Args:
+			items: list of (type, id, color) tuples, type is 'part', 'set',
+				or 'minifig', color is a color ID for parts or None.
+			workers: optional; most API calls in flight at once.
+			verbose: optional; print each compiled price.
+			value: optional; function of an item tuple, e.g. the set MSRP,
+				higher values are fetched first when the budget is short.
+			api_budget: optional; most API calls to spend, defaults to what
+				is left of the BrickLink daily quota.
+
+		Returns:
+			int: number of items fetched and cached.
+		"""
+		todo = []
+		seen_keys = set()
+		for item_type, item_id, color_id in items:
+			if item_type == 'set':
+				self.check_set_ID(item_id)
+			key = self._priceKey(item_id, color_id)
+			if key in seen_keys:
+				continue
+			seen_keys.add(key)
+			if self.lookUpPriceDataCache(item_id, color_id=color_id, verbose=False) is not None:
+				continue
+			todo.append((item_type, item_id, color_id))
+		if len(todo) == 0:
+			return 0
+		if api_budget is None:
+			api_budget = libbrick.rate_limiter.get_limiter(self.api_host).remaining()
+		todo, deferred = libbrick.rate_limiter.schedule_by_value(todo, api_budget,
+			cost=len(PRICE_GUIDES), value=value)
+		if len(deferred) > 0:
+			print(f"API budget of {api_budget} calls: deferring {len(deferred)} lower value items")
+		print(f"prefetching price guides for {len(todo)} of {len(seen_keys)} items")
+		with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+			item_futures = []
+			for item_type, item_id, color_id in todo:
+				futures = [pool.submit(self.getPriceDetails, item_id, item_type,
+					guide_type, new_or_used, color_id=color_id) for guide_type, new_or_used in PRICE_GUIDES]
+				item_futures.append(futures)
+			fetched = 0
+			for (item_type, item_id, color_id), futures in zip(todo, item_futures):
+				# a missing item only skips that item, other errors such as a
+				# spent daily quota are raised by result() below
+				errors = [future.exception() for future in futures]
+				if any(isinstance(error, LookupError) for error in errors):
+					print(f"no price guide for {item_type} {item_id}")
+					continue
+				guide_list = [future.result() for future in futures]
+				self.storePriceGuides(item_id, color_id, guide_list)
+				used_sale, new_sale, used_list, new_list = guide_list
+				self.compilePriceData(item_id, new_sale, used_sale, new_list, used_list,
+					color_id=color_id, verbose=verbose, item_type=item_type)
+				fetched += 1
+		return fetched
+
 	#============================
 	#============================
 	def getSetIDsFromSet(self, setID, verbose=True):
 		""" get list of set data dicts from BrickLink using the string setID """
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		###################
 		set_id_tree = self.bricklink_subset_cache.get(setID)
 		if set_id_tree is not None and isinstance(set_id_tree, list):
@@ -628,7 +991,7 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 	#============================
 	def getMinifigIDsFromSet(self, setID, verbose=True):
 		""" get list of minifig data dicts from BrickLink using the string setID """
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		###################
 		minifig_id_tree = self.bricklink_minifig_set_cache.get(setID)
 		if minifig_id_tree is not None and isinstance(minifig_id_tree, list):
@@ -658,45 +1021,26 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 	#============================
 	def getMinifigData(self, minifigID, verbose=True):
 		""" get individual minifig data from BrickLink using an string minifigID """
-
-		###################
-		minifig_data = self.bricklink_minifig_cache.get(str(minifigID))
-		if self._check_if_data_valid(minifig_data) is True:
-			if verbose is True:
-				print('MINIFIG {0} -- {1} ({2}) -- from cache'.format(
-					minifig_data.get('no'), minifig_data.get('name')[:60], minifig_data.get('year_released'),))
+		minifig_data = self.cachedItemData('minifig', minifigID, verbose)
+		if minifig_data is not None:
 			return minifig_data
 		###################
 		minifig_data = self._bricklink_get('items/minifig/{0}'.format(minifigID))
-		minifig_data['name'] = self.decode_and_normalize(minifig_data['name'])
-		###################
-		#print(minifig_data)
-		if verbose is True:
-			print('MINIFIG {0} -- {1} ({2}) -- from BrickLink website'.format(
-				minifigID, minifig_data.get('name')[:60], minifig_data.get('year_released'),))
-		self.bricklink_minifig_cache[str(minifigID)] = minifig_data
+		minifig_data = self.fetchedItemData('minifig', minifigID, minifig_data, verbose)
+		self.storeItemData('minifig', minifigID, minifig_data)
 		return minifig_data
 
 	#============================
 	#============================
 	def getPartData(self, partID, verbose=True):
-		""" get individual part data from BrickLink using an string minifigID """
-		###################
-		part_data = self.bricklink_part_cache.get(partID)
-		if self._check_if_data_valid(part_data) is True:
-			if verbose is True:
-				print('PART {0} -- {1} ({2}) -- from cache'.format(
-					part_data.get('no'), part_data.get('name'), part_data.get('year_released'),))
+		""" get individual part data from BrickLink using an string partID """
+		part_data = self.cachedItemData('part', partID, verbose)
+		if part_data is not None:
 			return part_data
 		###################
 		part_data = self._bricklink_get('items/part/{0}'.format(partID))
-		###################
-		#print(part_data)
-		if verbose is True:
-			print('PART {0} -- {1} ({2}) -- from BrickLink website'.format(
-				partID, part_data.get('name'),part_data.get('year_released'),))
-		part_data['name'] = self.decode_and_normalize(part_data['name'])
-		self.bricklink_part_cache[partID] = part_data
+		part_data = self.fetchedItemData('part', partID, part_data, verbose)
+		self.storeItemData('part', partID, part_data)
 		return part_data
 
 	#============================
@@ -738,23 +1082,35 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 		elementID = int(elementID)
 		###################
 		###################
-		map_list = self.bricklink_element_id_map_cache.get(elementID)
-		if map_list is not None and isinstance(map_list, list) and len(map_list) == 2:
-			partID, colorID = map_list
-			if verbose is True:
-				print('ELEMENT ID {0} -- part {1} color {2} -- from cache'.format(elementID, partID, colorID))
-			return [partID, colorID]
+		map_list = self.cachedElementMap(elementID, verbose)
+		if map_list is not None:
+			return map_list
 		try:
 			map_data = self._bricklink_get('item_mapping/{0}'.format(elementID))
 		except LookupError:
 			print("UNKNOWN Element ID")
 			return None
-		#print(map_data)
+		map_list = self.storeElementMap(elementID, map_data, verbose)
+		return map_list
+
+	#============================
+	#============================
+	def cachedElementMap(self, elementID, verbose=True):
+		""" cached [partID, colorID] of an integer elementID, or None """
+		map_list = self.bricklink_element_id_map_cache.get(elementID)
+		if map_list is None or not isinstance(map_list, list) or len(map_list) != 2:
+			return None
+		partID, colorID = map_list
+		if verbose is True:
+			print('ELEMENT ID {0} -- part {1} color {2} -- from cache'.format(elementID, partID, colorID))
+		return [partID, colorID]
+
+	#============================
+	#============================
+	def storeElementMap(self, elementID, map_data, verbose=True):
+		""" cache an item_mapping reply both ways and return [partID, colorID] """
 		partID = str(map_data[0]['item']['no'])
 		colorID = int(map_data[0]['color_id'])
-		#sys.exit(1)
-		###################
-		#print(part_data)
 		if verbose is True:
 			print('ELEMENT ID {0} -- part {1} color {2} -- from BrickLink website'.format(
 				elementID, partID, colorID))
@@ -773,20 +1129,18 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 			print(f"check {url}")
 		self.image_checks += 1
 		if self.image_checks % 20 == 0:
-			self.save_cache("bricklink_element_id_map_cache")
 			print(self.status_counts)
-		# Skip throttle for lego.com (large Akamai CDN); be polite to smaller CDNs.
-		if 'www.lego.com' not in url:
-			time.sleep(random.random())
-		user_agent = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36'
-		headers = {
-			'User-Agent': user_agent,
-			'Accept': 'image/webp,*/*',
-			'Accept-Encoding': 'gzip, deflate, br',
-			'Accept-Language': 'en-US,en;q=0.5',
-		}
+		# per-host limits: lego.com (large Akamai CDN) is loose, smaller CDNs are polite
+		libbrick.rate_limiter.wait_for_url(url)
+		# one pooled session, so repeat checks reuse the keep-alive TLS connection;
+		# prefetch and TUI threads share the wrapper, build it only once
+		with self.api_lock:
+			if self.http_session is None:
+				http_session = requests.Session()
+				http_session.headers.update(IMAGE_CHECK_HEADERS)
+				self.http_session = http_session
 		try:
-			response = requests.get(url, timeout=2, headers=headers)
+			response = self.http_session.get(url, timeout=2)
 		except requests.exceptions.ReadTimeout:
 			if verbose:
 				print("TIMEOUT")
@@ -831,13 +1185,8 @@ class BrickLink(wrapper_base.BaseWrapperClass):
 			# Print the cached elementID if verbose is enabled
 			if verbose:
 				print('ELEMENT ID {0} -- part {1} color {2} -- from cache'.format(elementID, partID, colorID))
-			# With a 99% chance, return the cached elementID without checking the image
-			if random.random() > 0.01:
-				return elementID
-			# For the remaining 1%, return the cached elementID only if its associated image exists
-			elif self.elementID_image_exists(elementID):
-				return elementID
-			#else find a new elementID below
+			# cached element IDs are trusted, no random live image recheck here
+			return elementID
 		try:
 			map_data = self._bricklink_get('item_mapping/PART/{0}?color_id={1}'.format(partID, colorID))
 		except LookupError:
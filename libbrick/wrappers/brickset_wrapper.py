@@ -13,6 +13,7 @@ import brickse
 
 # local repo modules
 import libbrick.path_utils
+import libbrick.rate_limiter
 import libbrick.wrappers.wrapper_base as wrapper_base
 
 class BrickSet(wrapper_base.BaseWrapperClass):
@@ -43,6 +44,7 @@ class BrickSet(wrapper_base.BaseWrapperClass):
 		#self.user_token = ''
 		brickse.init(self.api_key)
 		self.api_daily_limit_exceeded = False
+		self.api_host = 'brickset.com'
 
 		self.data_caches = {
 			'brickset_category_cache': 		'yml',
@@ -59,35 +61,57 @@ class BrickSet(wrapper_base.BaseWrapperClass):
 	#============================
 	#============================
 	def _get_set(self, set_number):
-		time.sleep(random.random())
-		self.api_calls += 1
-		response = brickse.lego.get_set(set_number=set_number, extended_data=False)
+		""" fetch one set, threads asking for the same set share the call """
+		set_data = self.single_flight(set_number,
+			lambda: self.call_with_retry(self.api_host, lambda: self._fetch_set(set_number)))
+		return set_data
+
+	#============================
+	#============================
+	def _fetch_set(self, set_number):
+		"""
+		One paced BrickSet call.
+
+		Returns:
+			dict: set data, or None once the daily API limit is used up.
+
+		Raises:
+			wrapper_base.NotFoundError: if the set number matches no set.
+			wrapper_base.ApiError: if it matches several sets, or for any other
+				error status, e.g. a bad API key.
+		"""
+		limiter = libbrick.rate_limiter.get_limiter(self.api_host)
+		try:
+			limiter.wait('getSets')
+		except libbrick.rate_limiter.QuotaExceededError as error:
+			# the ledger in CACHE/api_quota.json says today's calls are spent
+			print(error)
+			self.api_daily_limit_exceeded = True
+			return None
+		with self.api_lock:
+			self.api_calls += 1
+		try:
+			response = brickse.lego.get_set(set_number=set_number, extended_data=False)
+			data = json.loads(response.read())
+		except OSError as error:
+			wrapper_base.raise_for_urllib_error(error, f"set {set_number}")
 		sys.stderr.write('#')
-		data = json.loads(response.read())
 		if data['status'] != "success":
-			self.save_cache()
 			if data.get('message') == 'API limit exceeded':
+				# the limit is per day, waiting or retrying in this run cannot help;
+				# record it so other processes stop calling too
+				self.save_cache()
 				print('BrickSet API limit exceeded')
 				print("{0} api calls were made".format(self.api_calls))
-				for i in range(9):
-					time.sleep(random.random())
-					print(".")
+				limiter.quota.mark_exhausted()
 				self.api_daily_limit_exceeded = True
 				return None
-			print("STATUS ERROR", data['status'])
-			print(list(data.keys()))
-			import pprint
-			try:
-				pprint.pprint(data['sets'][0])
-			except KeyError:
-				pprint.pprint(data)
-			sys.exit(1)
-		if data['matches'] != 1:
-			print("MATCHES ERROR", data['matches'])
-			print(list(data.keys()))
-			import pprint
-			pprint.pprint(data['sets'][0])
-			sys.exit(1)
+			raise wrapper_base.ApiError(f"BrickSet status {data['status']}: {data.get('message')}")
+		if data['matches'] == 0:
+			raise wrapper_base.NotFoundError(f"BrickSet found no set for {set_number}")
+		if data['matches'] > 1:
+			# a full set number with suffix should name one set, more is a server problem
+			raise wrapper_base.ApiError(f"BrickSet found {data['matches']} sets for {set_number}")
 		set_data = data['sets'][0]
 		if self.debug is True:
 			print('SET {0} -- {1} ({2}) -- from BrickSet website'.format(
@@ -98,7 +122,7 @@ class BrickSet(wrapper_base.BaseWrapperClass):
 	#============================
 	#============================
 	def getSetData(self, setID, verbose=True):
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		set_data = self.getSetDataDirect(setID)
 		return set_data
 
@@ -106,10 +130,10 @@ class BrickSet(wrapper_base.BaseWrapperClass):
 	#============================
 	def getSetDataDirect(self, setID, verbose=True):
 		""" get the set data from BrickSet using a setID with hyphen, e.g. 71515-2 """
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		###################
 		set_data = self.brickset_set_cache.get(setID)
-		if self._check_if_data_valid(set_data) is True:
+		if self.check_if_data_valid(set_data) is True:
 			if verbose is True:
 				print('SET {0} -- {1} ({2}) -- from cache'.format(
 					set_data.get('number'), set_data.get('name'), set_data.get('year'),))
@@ -129,7 +153,7 @@ class BrickSet(wrapper_base.BaseWrapperClass):
 	#============================
 	#============================
 	def getSetMSRP(self, setID, region='US', verbose=True):
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		###################
 		msrp = self.brickset_msrp_cache.get(setID)
 		if msrp == 0 or msrp is None:
@@ -138,8 +162,6 @@ class BrickSet(wrapper_base.BaseWrapperClass):
 				if 'polybag' in set_data['name']:
 					msrp = 499
 					print("... polybag")
-					time.sleep(random.random())
-					time.sleep(random.random())
 					self.brickset_msrp_cache[setID] = msrp
 					return msrp
 				else:
@@ -147,9 +169,6 @@ class BrickSet(wrapper_base.BaseWrapperClass):
 		if msrp == 0 and random.random() < 0.01:
 			# 0 means it was not found, 10% chance to check again
 			print("... check for MSRP again")
-			time.sleep(random.random())
-			time.sleep(random.random())
-			pass
 		elif msrp is not None:
 			if verbose is True:
 				print('SET {0} -- MSRP ${1:.2f} -- from cache'.format(
@@ -183,7 +202,7 @@ class BrickSet(wrapper_base.BaseWrapperClass):
 	#============================
 	#============================
 	def getPartsFromSet(self, setID, verbose=True):
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		print("NOT IMPLEMENTED YET")
 		sys.exit(1)
 		#return subsets_tree
@@ -192,7 +211,7 @@ class BrickSet(wrapper_base.BaseWrapperClass):
 	#============================
 	def getSetPriceDetails(self, setID, new_or_used='U', country_code='US',
 			currency_code='USD', verbose=True):
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		print("NOT IMPLEMENTED YET")
 		sys.exit(1)
 		#return price_data
@@ -215,7 +234,7 @@ class BrickSet(wrapper_base.BaseWrapperClass):
 	#============================
 	#============================
 	def getMinifigsFromSet(self, setID, verbose=True):
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		print("NOT IMPLEMENTED YET")
 		sys.exit(1)
 		#return minifig_set_tree
@@ -0,0 +1,838 @@
+# Standard Library
+import os
+import re
+import json
+import time
+import fcntl
+import sqlite3
+import tempfile
+import threading
+import contextlib
+import collections.abc
+
+#============================
+#============================
+# one database file holds every sqlite-backed wrapper cache, one table each
+SQLITE_DB_NAME = 'wrapper_caches.sqlite3'
+
+# journaled file caches are rewritten once their journal passes this size
+JOURNAL_COMPACT_BYTES = 8 * 1024 * 1024
+
+# cache names become SQL table names, so only allow plain identifiers
+_TABLE_NAME_RE = re.compile(r'^[a-z][a-z0-9_]*$')
+
+# marks a key missing from the in-memory copy, None is a valid cached value
+_MISSING = object()
+
+#============================
+#============================
+def encode_key(key) -> str:
+	"""
+	Encode a cache key as JSON text so int and str keys stay distinct.
+
+	YAML caches use int keys (element IDs, category IDs) next to str keys,
+	so 1234 and '1234' must not collapse into the same row.
+	"""
+	key_text = json.dumps(key)
+	return key_text
+
+#============================
+def decode_key(key_text: str):
+	"""
+	Decode a key stored by encode_key().
+	"""
+	key = json.loads(key_text)
+	return key
+
+#============================
+#============================
+def entry_time(value):
+	"""
+	Return the 'time' stamp the wrappers store in dict entries, or None.
+	"""
+	if not isinstance(value, dict):
+		return None
+	stamp = value.get('time')
+	return stamp
+
+#============================
+def purge_entries(data: dict, max_entries: int = None, ttl: float = None,
+		now: float = None, last_used: dict = None) -> list:
+	"""
+	Drop expired entries, then the coldest ones past max_entries, in place.
+
+	An entry is expired when its 'time' stamp is more than ttl seconds old;
+	entries without a stamp (category names, element-ID pairs) never expire.
+	Coldness is the last time this process used the key, falling back to
+	the entry's 'time' stamp, so the least recently used entries go first.
+
+	Args:
+		data: cache dict to prune.
+		max_entries: optional; most entries to keep.
+		ttl: optional; age in seconds after which stamped entries are dropped.
+		now: optional; current time, defaults to time.time().
+		last_used: optional; dict of key to last-use time.
+
+	Returns:
+		list of removed keys.
+	"""
+	if now is None:
+		now = time.time()
+	if last_used is None:
+		last_used = {}
+	removed = []
+	if ttl is not None:
+		for key, value in list(data.items()):
+			stamp = entry_time(value)
+			if stamp is not None and now - stamp > ttl:
+				removed.append(key)
+		for key in removed:
+			del data[key]
+	if max_entries is not None and len(data) > max_entries:
+		def recency(key):
+			stamp = last_used.get(key)
+			if stamp is None:
+				stamp = entry_time(data[key])
+			if stamp is None:
+				stamp = 0
+			return stamp
+		coldest = sorted(data, key=recency)[:len(data) - max_entries]
+		for key in coldest:
+			del data[key]
+		removed.extend(coldest)
+	return removed
+
+#============================
+#============================
+class SqliteCacheStore(object):
+	"""
+	Embedded SQLite database with one key/value table per wrapper cache.
+
+	Each thread gets its own connection, so worker threads can share one
+	store; SQLite serializes their writes.
+	"""
+
+	#============================
+	#============================
+	def __init__(self, db_path: str):
+		"""
+		Open (or create) the database file.
+
+		Args:
+			db_path: path to the SQLite database file.
+		"""
+		self.db_path = db_path
+		self._local = threading.local()
+		self._connections = []
+		self._connections_lock = threading.Lock()
+		# open the calling thread's connection now, so a bad path fails here
+		self.connection
+
+	#============================
+	#============================
+	@property
+	def connection(self) -> sqlite3.Connection:
+		"""
+		Return this thread's connection, opening it on first use.
+		"""
+		connection = getattr(self._local, 'connection', None)
+		if connection is not None:
+			return connection
+		# wait up to 30 s for another process holding the write lock;
+		# check_same_thread=False only so close() can run from the main thread
+		connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+		# WAL keeps readers from blocking on a writer in another process
+		connection.execute('PRAGMA journal_mode=WAL')
+		connection.execute('PRAGMA synchronous=NORMAL')
+		self._local.connection = connection
+		with self._connections_lock:
+			self._connections.append(connection)
+		return connection
+
+	#============================
+	#============================
+	def _sql(self, template: str, cache_name: str) -> str:
+		"""
+		Fill the table name into an SQL template.
+
+		Table names cannot be bound as ? parameters, so the cache name is
+		validated against a plain-identifier pattern before substitution.
+		"""
+		if not _TABLE_NAME_RE.match(cache_name):
+			raise ValueError(f"invalid cache name for sqlite table: {cache_name}")
+		# table name is a validated identifier, values still use ? binding
+		statement = template.format(table=cache_name)  # nosec B608
+		return statement
+
+	#============================
+	#============================
+	def ensure_table(self, cache_name: str) -> bool:
+		"""
+		Create the table for a cache if it does not exist yet.
+
+		Returns:
+			True if the table was newly created, False if it already existed.
+		"""
+		template = 'CREATE TABLE "{table}" '
+		template += '(key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL)'
+		statement = self._sql(template, cache_name)
+		cursor = self.connection.execute(
+			"SELECT name FROM sqlite_master WHERE type='table' AND name=?", (cache_name,))
+		if cursor.fetchone() is not None:
+			self._add_last_used_column(cache_name)
+			return False
+		self.connection.execute(statement)
+		self.connection.commit()
+		return True
+
+	#============================
+	#============================
+	def _add_last_used_column(self, cache_name: str) -> None:
+		"""
+		Add the last_used column to a table created before LRU purging.
+		"""
+		cursor = self.connection.execute(self._sql('PRAGMA table_info("{table}")', cache_name))
+		column_names = [row[1] for row in cursor]
+		if 'last_used' in column_names:
+			return
+		self.connection.execute(self._sql('ALTER TABLE "{table}" ADD COLUMN last_used REAL', cache_name))
+		self.connection.commit()
+
+	#============================
+	#============================
+	def get_value(self, cache_name: str, key):
+		"""
+		Fetch one decoded value.
+
+		Raises:
+			KeyError: if the key is not stored.
+		"""
+		statement = self._sql('SELECT value FROM "{table}" WHERE key=?', cache_name)
+		cursor = self.connection.execute(statement, (encode_key(key),))
+		row = cursor.fetchone()
+		if row is None:
+			raise KeyError(key)
+		value = json.loads(row[0])
+		return value
+
+	#============================
+	#============================
+	def has_key(self, cache_name: str, key) -> bool:
+		"""
+		Check whether a key is stored without decoding its value.
+		"""
+		statement = self._sql('SELECT 1 FROM "{table}" WHERE key=?', cache_name)
+		cursor = self.connection.execute(statement, (encode_key(key),))
+		found = cursor.fetchone() is not None
+		return found
+
+	#============================
+	#============================
+	def upsert_values(self, cache_name: str, items: list) -> None:
+		"""
+		Insert or replace many (key, value) pairs in one transaction.
+		"""
+		template = 'INSERT INTO "{table}" (key, value) VALUES (?, ?) '
+		template += 'ON CONFLICT(key) DO UPDATE SET value=excluded.value'
+		statement = self._sql(template, cache_name)
+		rows = [(encode_key(key), json.dumps(value)) for key, value in items]
+		self.connection.executemany(statement, rows)
+		self.connection.commit()
+
+	#============================
+	#============================
+	def delete_keys(self, cache_name: str, keys: list) -> None:
+		"""
+		Delete many keys in one transaction.
+		"""
+		statement = self._sql('DELETE FROM "{table}" WHERE key=?', cache_name)
+		rows = [(encode_key(key),) for key in keys]
+		self.connection.executemany(statement, rows)
+		self.connection.commit()
+
+	#============================
+	#============================
+	def touch_keys(self, cache_name: str, used_times: dict) -> None:
+		"""
+		Record when keys were last used, for LRU purging.
+
+		Args:
+			cache_name: name of the cache table.
+			used_times: dict of key to last-use time.
+		"""
+		statement = self._sql('UPDATE "{table}" SET last_used=? WHERE key=?', cache_name)
+		rows = [(used_time, encode_key(key)) for key, used_time in used_times.items()]
+		self.connection.executemany(statement, rows)
+		self.connection.commit()
+
+	#============================
+	#============================
+	def purge(self, cache_name: str, max_entries: int = None, ttl: float = None,
+			now: float = None) -> int:
+		"""
+		Delete expired rows, then the coldest rows past max_entries.
+
+		Same rules as purge_entries(): the 'time' stamp inside the JSON value
+		decides expiry, and last_used (falling back to 'time') decides coldness.
+
+		Returns:
+			number of rows deleted.
+		"""
+		if now is None:
+			now = time.time()
+		removed = 0
+		if ttl is not None:
+			statement = self._sql(
+				'DELETE FROM "{table}" WHERE json_extract(value, \'$.time\') < ?', cache_name)
+			cursor = self.connection.execute(statement, (now - ttl,))
+			removed += cursor.rowcount
+		if max_entries is not None:
+			excess = self.count(cache_name) - max_entries
+			if excess > 0:
+				template = 'DELETE FROM "{table}" WHERE key IN (SELECT key FROM "{table}" '
+				template += 'ORDER BY COALESCE(last_used, json_extract(value, \'$.time\'), 0) LIMIT ?)'
+				cursor = self.connection.execute(self._sql(template, cache_name), (excess,))
+				removed += cursor.rowcount
+		self.connection.commit()
+		return removed
+
+	#============================
+	#============================
+	def oldest_entries(self, cache_name: str, limit: int, before: float) -> list:
+		"""
+		Return up to limit (time, key) pairs with the oldest 'time' stamps.
+
+		Args:
+			cache_name: name of the cache table.
+			limit: most pairs to return.
+			before: only entries stamped before this time.
+		"""
+		template = 'SELECT json_extract(value, \'$.time\') AS stamp, key FROM "{table}" '
+		template += 'WHERE stamp < ? ORDER BY stamp LIMIT ?'
+		cursor = self.connection.execute(self._sql(template, cache_name), (before, limit))
+		pairs = [(row[0], decode_key(row[1])) for row in cursor]
+		return pairs
+
+	#============================
+	#============================
+	def list_keys(self, cache_name: str) -> list:
+		"""
+		Return every decoded key stored for a cache.
+		"""
+		statement = self._sql('SELECT key FROM "{table}"', cache_name)
+		cursor = self.connection.execute(statement)
+		keys = [decode_key(row[0]) for row in cursor]
+		return keys
+
+	#============================
+	#============================
+	def count(self, cache_name: str) -> int:
+		"""
+		Return the number of stored entries for a cache.
+		"""
+		statement = self._sql('SELECT COUNT(*) FROM "{table}"', cache_name)
+		cursor = self.connection.execute(statement)
+		total = cursor.fetchone()[0]
+		return total
+
+	#============================
+	#============================
+	def close(self) -> None:
+		"""
+		Close every thread's database connection.
+		"""
+		with self._connections_lock:
+			for connection in self._connections:
+				connection.close()
+			self._connections = []
+		self._local = threading.local()
+
+
+#============================
+#============================
+class SqliteCacheDict(collections.abc.MutableMapping):
+	"""
+	Dict-like view of one SQLite cache table.
+
+	Values are read from disk on first access and kept in memory. Writes and
+	deletes go straight to the database, so SQLite's own write-ahead log is
+	the journal and a crash mid-run loses nothing.
+
+	With max_memory_entries set, the in-memory copy is an LRU that drops the
+	least recently used values, so a long-lived process stays bounded.
+	Use times are collected and saved by flush_usage() for LRU purging.
+	"""
+
+	#============================
+	#============================
+	def __init__(self, store: SqliteCacheStore, cache_name: str,
+			max_memory_entries: int = None):
+		self.store = store
+		self.cache_name = cache_name
+		self.max_memory_entries = max_memory_entries
+		self._values = collections.OrderedDict()
+		self._last_used = {}
+		# worker threads share the in-memory LRU
+		self._lock = threading.Lock()
+
+	#============================
+	#============================
+	def _remember(self, key, value) -> None:
+		"""
+		Keep a value in memory as most recently used, evicting the oldest.
+		"""
+		with self._lock:
+			self._values[key] = value
+			self._values.move_to_end(key)
+			self._last_used[key] = time.time()
+			if self.max_memory_entries is None:
+				return
+			while len(self._values) > self.max_memory_entries:
+				self._values.popitem(last=False)
+
+	#============================
+	#============================
+	def flush_usage(self) -> None:
+		"""
+		Write collected last-use times to the database.
+		"""
+		with self._lock:
+			used_times = self._last_used
+			self._last_used = {}
+		if len(used_times) == 0:
+			return
+		self.store.touch_keys(self.cache_name, used_times)
+
+	#============================
+	#============================
+	def forget(self) -> None:
+		"""
+		Drop the in-memory copy, for example after rows were purged on disk.
+		"""
+		with self._lock:
+			self._values.clear()
+
+	#============================
+	#============================
+	def __getitem__(self, key):
+		with self._lock:
+			value = self._values.get(key, _MISSING)
+		if value is _MISSING:
+			value = self.store.get_value(self.cache_name, key)
+		self._remember(key, value)
+		return value
+
+	#============================
+	#============================
+	def __setitem__(self, key, value):
+		self._remember(key, value)
+		self.store.upsert_values(self.cache_name, [(key, value)])
+
+	#============================
+	#============================
+	def update(self, other=(), **kwargs):
+		""" write many entries in one transaction, for bulk imports """
+		items = dict(other, **kwargs)
+		if len(items) == 0:
+			return
+		# the bulk values are not kept in memory, they load on first use
+		with self._lock:
+			for key in items:
+				self._values.pop(key, None)
+		self.store.upsert_values(self.cache_name, list(items.items()))
+
+	#============================
+	#============================
+	def __delitem__(self, key):
+		if key not in self:
+			raise KeyError(key)
+		with self._lock:
+			self._values.pop(key, None)
+			self._last_used.pop(key, None)
+		self.store.delete_keys(self.cache_name, [key])
+
+	#============================
+	#============================
+	def __contains__(self, key) -> bool:
+		if key in self._values:
+			return True
+		found = self.store.has_key(self.cache_name, key)
+		return found
+
+	#============================
+	#============================
+	def __iter__(self):
+		return iter(self.store.list_keys(self.cache_name))
+
+	#============================
+	#============================
+	def __len__(self) -> int:
+		return self.store.count(self.cache_name)
+
+
+#============================
+#============================
+def read_journal(journal_path: str, cache_data: dict) -> int:
+	"""
+	Replay an append-only JSONL journal onto a parsed cache dict.
+
+	Each line is {"key": <encoded key>, "value": <value>} for an upsert or
+	{"key": <encoded key>, "deleted": true} for a delete. A torn last line
+	from a killed process is ignored, and cut off by the next append.
+
+	Returns:
+		Number of journal entries applied.
+	"""
+	if not os.path.isfile(journal_path):
+		return 0
+	applied = 0
+	with open(journal_path, 'r') as f:
+		for line in f:
+			if not line.endswith('\n'):
+				# partial write from a crash, everything before it is intact
+				break
+			entry = json.loads(line)
+			key = decode_key(entry['key'])
+			if entry.get('deleted') is True:
+				cache_data.pop(key, None)
+			else:
+				cache_data[key] = entry['value']
+			applied += 1
+	return applied
+
+#============================
+#============================
+def drop_torn_journal_tail(journal_path: str) -> None:
+	"""
+	Cut a torn last line from a killed process off the journal.
+
+	Call under the exclusive lock before appending, otherwise the next
+	entry is glued onto the fragment and every later load fails to parse it.
+	"""
+	if not os.path.isfile(journal_path):
+		return
+	with open(journal_path, 'rb+') as f:
+		size = f.seek(0, os.SEEK_END)
+		if size == 0:
+			return
+		f.seek(size - 1)
+		if f.read(1) == b'\n':
+			return
+		# walk back to the newline that ends the last complete entry
+		end = size - 1
+		while end > 0:
+			start = max(0, end - 4096)
+			f.seek(start)
+			chunk = f.read(end - start)
+			newline = chunk.rfind(b'\n')
+			if newline >= 0:
+				f.truncate(start + newline + 1)
+				return
+			end = start
+		f.truncate(0)
+
+
+
+#============================
+#============================
+@contextlib.contextmanager
+def file_lock(lock_path: str, exclusive: bool = True):
+	"""
+	Hold an advisory fcntl lock on lock_path for the length of a with-block.
+
+	Follows the same pattern as the rembg lock in libbrick.image_cache. The
+	lock file itself is never deleted, so every process locks the same inode.
+	"""
+	with open(lock_path, 'a') as lock_f:
+		if exclusive is True:
+			fcntl.flock(lock_f, fcntl.LOCK_EX)
+		else:
+			fcntl.flock(lock_f, fcntl.LOCK_SH)
+		yield
+	# closing the lock file releases the lock
+
+#============================
+#============================
+def write_file_atomic(file_name: str, write_callback, binary: bool = False) -> None:
+	"""
+	Write a file through a temp file in the same folder, then rename it.
+
+	Readers in other processes see either the old file or the new one,
+	never a truncated half-written file.
+
+	Args:
+		file_name: final path of the file.
+		write_callback: callable taking an open file handle.
+		binary: Optional; open the temp file in binary mode.
+	"""
+	folder = os.path.dirname(os.path.abspath(file_name))
+	prefix = '.' + os.path.basename(file_name) + '.'
+	fd, temp_name = tempfile.mkstemp(dir=folder, prefix=prefix, suffix='.tmp')
+	mode = 'wb' if binary is True else 'w'
+	with os.fdopen(fd, mode) as f:
+		write_callback(f)
+		f.flush()
+		os.fsync(f.fileno())
+	# mkstemp creates 0600 files, keep the usual cache file permissions
+	os.chmod(temp_name, 0o644)
+	os.replace(temp_name, file_name)
+
+
+#============================
+#============================
+class LazyFileCacheDict(collections.abc.MutableMapping):
+	"""
+	Dict-like view of one whole-file JSON, YAML, or msgpack cache.
+
+	The file is parsed the first time any key is touched, so a script only
+	pays the parse cost for caches it actually uses.
+
+	When a journal path is given, every write or delete is appended to that
+	JSONL file right away. The main file is only rewritten by compact(),
+	which folds in the journal and empties it.
+
+	When a lock path is given, loads take a shared fcntl lock and journal
+	appends and compactions take an exclusive one, so several processes can
+	share one CACHE directory. All of them append to the same journal, and
+	compact() rebuilds the main file from disk, so entries written by other
+	processes are merged instead of overwritten.
+
+	When an overrides loader is given, its dict is read along with the main
+	file and wins every lookup. Overrides are never written back: writes go
+	to the main file, and compact() leaves the overrides file alone.
+
+	When a prune callable is given, it is applied to the machine-written
+	entries after every load and compaction, with this process's last-use
+	times so cold entries are dropped first.
+	"""
+
+	#============================
+	#============================
+	def __init__(self, cache_name: str, loader, journal_path: str = None,
+			lock_path: str = None, overrides_loader=None, prune=None):
+		"""
+		Args:
+			cache_name: name of the cache, used in messages.
+			loader: callable with no arguments returning the parsed main file.
+			journal_path: optional path of the append-only JSONL journal.
+			lock_path: optional path of the fcntl lock file.
+			overrides_loader: optional callable returning the manual overrides dict.
+			prune: optional callable taking (data, last_used) that removes
+				entries from data in place.
+		"""
+		self.cache_name = cache_name
+		self.journal_path = journal_path
+		self.lock_path = lock_path
+		self._loader = loader
+		self._overrides_loader = overrides_loader
+		self._prune = prune
+		self._last_used = {}
+		self._data = None
+		self._overrides = {}
+		# dict used for reads, a ChainMap when overrides exist
+		self._reads = None
+		# worker threads touching an unloaded cache parse it only once
+		self._load_lock = threading.Lock()
+
+	#============================
+	#============================
+	def _lock(self, exclusive: bool):
+		"""
+		Return the file lock context, or a no-op context without a lock path.
+		"""
+		if self.lock_path is None:
+			return contextlib.nullcontext()
+		return file_lock(self.lock_path, exclusive)
+
+	#============================
+	#============================
+	def _read_from_disk(self) -> dict:
+		"""
+		Parse the main file, replay the journal on top of it, and prune.
+		"""
+		data = self._loader()
+		if self.journal_path is not None:
+			read_journal(self.journal_path, data)
+		if self._prune is not None:
+			self._prune(data, self._last_used)
+		return data
+
+	#============================
+	#============================
+	def is_loaded(self) -> bool:
+		"""
+		True once the backing file has been parsed.
+		"""
+		loaded = self._data is not None
+		return loaded
+
+	#============================
+	#============================
+	def to_dict(self) -> dict:
+		"""
+		Return the underlying dict, loading it and replaying the journal if needed.
+
+		The returned dict holds machine-written entries only, without overrides.
+		"""
+		if self._data is not None:
+			return self._data
+		with self._load_lock:
+			if self._data is None:
+				# shared lock: a compaction cannot swap files between the two reads
+				with self._lock(exclusive=False):
+					data = self._read_from_disk()
+				if self._overrides_loader is not None:
+					self._overrides = self._overrides_loader()
+				self._set_data(data)
+		return self._data
+
+	#============================
+	#============================
+	def _set_data(self, data: dict) -> None:
+		"""
+		Replace the in-memory dict and rebuild the read view over it.
+		"""
+		# set the view first, other threads treat _data as the loaded flag
+		if len(self._overrides) > 0:
+			self._reads = collections.ChainMap(self._overrides, data)
+		else:
+			self._reads = data
+		self._data = data
+
+	#============================
+	#============================
+	def _read_view(self):
+		"""
+		Return the mapping used for lookups, overrides first.
+		"""
+		if self._data is None:
+			self.to_dict()
+		return self._reads
+
+	#============================
+	#============================
+	def is_override(self, key) -> bool:
+		"""
+		True when the key comes from the manual overrides file.
+		"""
+		self._read_view()
+		return key in self._overrides
+
+	#============================
+	#============================
+	def journal_size(self) -> int:
+		"""
+		Bytes in the journal on disk, including other processes' entries.
+		"""
+		if self.journal_path is None or not os.path.isfile(self.journal_path):
+			return 0
+		size = os.path.getsize(self.journal_path)
+		return size
+
+	#============================
+	#============================
+	def _append_journal(self, entry: dict) -> None:
+		"""
+		Append one entry to the journal and push it to the OS.
+
+		The journal is reopened per entry so a compaction in another process
+		that removes the file cannot leave this process writing to a deleted inode.
+		"""
+		self._append_journal_entries([entry])
+
+	#============================
+	#============================
+	def _append_journal_entries(self, entries: list) -> None:
+		"""
+		Append many entries to the journal under one lock and one write.
+		"""
+		if self.journal_path is None:
+			return
+		text = ''.join(json.dumps(entry) + '\n' for entry in entries)
+		with self._lock(exclusive=True):
+			drop_torn_journal_tail(self.journal_path)
+			with open(self.journal_path, 'a') as f:
+				f.write(text)
+
+	#============================
+	#============================
+	def compact(self, write_main_file) -> None:
+		"""
+		Fold the journal into the main file and empty the journal.
+
+		Under an exclusive lock, rebuild the cache from the main file plus
+		the shared journal, write it with write_main_file(dict), and remove
+		the journal. The rebuilt dict replaces the in-memory copy, which
+		picks up entries that other processes wrote since this one loaded.
+
+		Args:
+			write_main_file: callable taking the merged dict, expected to
+				write the main file atomically.
+		"""
+		with self._lock(exclusive=True):
+			data = self._read_from_disk()
+			write_main_file(data)
+			if self.journal_path is not None and os.path.isfile(self.journal_path):
+				os.remove(self.journal_path)
+		self._set_data(data)
+
+	#============================
+	#============================
+	def get(self, key, default=None):
+		# skip the MutableMapping try/except path, this is the hot lookup
+		value = self._read_view().get(key, default)
+		if self._prune is not None and value is not default:
+			self._last_used[key] = time.time()
+		return value
+
+	#============================
+	#============================
+	def __getitem__(self, key):
+		value = self._read_view()[key]
+		if self._prune is not None:
+			self._last_used[key] = time.time()
+		return value
+
+	#============================
+	#============================
+	def __setitem__(self, key, value):
+		self.to_dict()[key] = value
+		if self._prune is not None:
+			self._last_used[key] = time.time()
+		self._append_journal({'key': encode_key(key), 'value': value})
+
+	#============================
+	#============================
+	def update(self, other=(), **kwargs):
+		""" set many entries with one journal write, for bulk imports """
+		items = dict(other, **kwargs)
+		if len(items) == 0:
+			return
+		self.to_dict().update(items)
+		if self._prune is not None:
+			now = time.time()
+			for key in items:
+				self._last_used[key] = now
+		self._append_journal_entries([{'key': encode_key(key), 'value': value}
+			for key, value in items.items()])
+
+	#============================
+	#============================
+	def __delitem__(self, key):
+		del self.to_dict()[key]
+		self._append_journal({'key': encode_key(key), 'deleted': True})
+
+	#============================
+	#============================
+	def __contains__(self, key) -> bool:
+		return key in self._read_view()
+
+	#============================
+	#============================
+	def __iter__(self):
+		return iter(self._read_view())
+
+	#============================
+	#============================
+	def __len__(self) -> int:
+		return len(self._read_view())
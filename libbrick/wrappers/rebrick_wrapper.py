@@ -5,7 +5,6 @@ import os
 import sys
 import json
 import time
-import random
 
 # PIP3 modules
 import yaml
@@ -13,6 +12,7 @@ import rebrick
 
 # local repo modules
 import libbrick.path_utils
+import libbrick.rate_limiter
 import libbrick.wrappers.wrapper_base as wrapper_base
 
 class Rebrick(wrapper_base.BaseWrapperClass):
@@ -20,6 +20,7 @@ class Rebrick(wrapper_base.BaseWrapperClass):
 	#============================
 	def __init__(self):
 		self.debug = True
+		self.api_host = 'rebrickable.com'
 		key_file_name = 'rebrick_api_key.yml'
 		local_key_path = os.path.join(os.path.dirname(__file__), key_file_name)
 		git_root = libbrick.path_utils.get_git_root()
@@ -54,6 +55,29 @@ class Rebrick(wrapper_base.BaseWrapperClass):
 		self.api_calls = 0
 		self.start()
 
+	#============================
+	#============================
+	def _get_json(self, api_function, item_id):
+		""" one Rebrickable lookup, transient failures retried with backoff """
+		data = self.call_with_retry(self.api_host, lambda: self._request_json(api_function, item_id))
+		return data
+
+	#============================
+	#============================
+	def _request_json(self, api_function, item_id):
+		""" one paced Rebrickable call, decoded from JSON """
+		libbrick.rate_limiter.get_limiter(self.api_host).wait(api_function.__name__)
+		try:
+			response = api_function(item_id)
+			data = json.loads(response.read())
+		except OSError as error:
+			# urllib errors: 404 is NotFoundError, 429 and 5xx are retried
+			wrapper_base.raise_for_urllib_error(error, f"{api_function.__name__} {item_id}")
+		sys.stderr.write('#')
+		with self.api_lock:
+			self.api_calls += 1
+		return data
+
 	#============================
 	#============================
 	def getThemeName(self, themeID, verbose=True):
@@ -62,11 +86,7 @@ class Rebrick(wrapper_base.BaseWrapperClass):
 		if theme_name is not None:
 			return theme_name
 		###################
-		time.sleep(random.random())
-		response = rebrick.lego.get_theme(themeID)
-		sys.stderr.write('#')
-		self.api_calls += 1
-		theme_data = json.loads(response.read())
+		theme_data = self.single_flight(('theme', themeID), lambda: self._get_json(rebrick.lego.get_theme, themeID))
 		#print(theme_data)
 		if theme_data.get('parent_id') is not None:
 			parent_name = self.getThemeName(theme_data.get('parent_id'))
@@ -84,10 +104,10 @@ class Rebrick(wrapper_base.BaseWrapperClass):
 	#============================
 	#============================
 	def getSetData(self, setID, verbose=True):
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		###################
 		set_data = self.rebrick_set_cache.get(setID)
-		if self._check_if_data_valid(set_data) is True:
+		if self.check_if_data_valid(set_data) is True:
 			if verbose is True:
 				print('SET {0} -- {1} ({2}) -- from cache'.format(
 					set_data.get('set_num'), set_data.get('name'), set_data.get('year'),))
@@ -96,22 +116,16 @@ class Rebrick(wrapper_base.BaseWrapperClass):
 			self.rebrick_set_cache[setID] = set_data
 			return set_data
 		###################
-		time.sleep(random.random())
 		try:
-			response = rebrick.lego.get_set(setID)
-		except:
+			set_data = self.single_flight(('set', setID), lambda: self._get_json(rebrick.lego.get_set, setID))
+		except LookupError:
 			return None
-		sys.stderr.write('#')
-		self.api_calls += 1
-		set_data = json.loads(response.read())
 		set_data['theme_name'] = self.getThemeName(set_data['theme_id'])
 		print('SET {0} -- {1} ({2}) -- from Rebrick website'.format(
 			set_data.get('set_num'), set_data.get('name'), set_data.get('year'),))
 		set_data['time'] = int(time.time())
 		set_data['set_id'] = setID
 		self.rebrick_set_cache[setID] = set_data
-		if self.api_calls % 25 == 0:
-			self.save_cache()
 		return set_data
 
 	#============================
@@ -122,7 +136,7 @@ class Rebrick(wrapper_base.BaseWrapperClass):
 	#============================
 	#============================
 	def getPartsFromSet(self, setID, verbose=True):
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		print("NOT IMPLEMENTED YET")
 		sys.exit(1)
 		#return subsets_tree
@@ -131,7 +145,7 @@ class Rebrick(wrapper_base.BaseWrapperClass):
 	#============================
 	def getSetPriceDetails(self, setID, new_or_used='U', country_code='US',
 			currency_code='USD', verbose=True):
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		print("NOT IMPLEMENTED YET")
 		sys.exit(1)
 		#return price_data
@@ -154,7 +168,7 @@ class Rebrick(wrapper_base.BaseWrapperClass):
 	#============================
 	#============================
 	def getMinifigsFromSet(self, setID, verbose=True):
-		self._check_set_ID(setID)
+		self.check_set_ID(setID)
 		print("NOT IMPLEMENTED YET")
 		sys.exit(1)
 		#return minifig_set_tree
@@ -4,14 +4,22 @@ import sys
 import html
 import json
 import time
+import queue
 import random
+import functools
+import threading
 import unicodedata
+import urllib.error
+import concurrent.futures
 
 # PIP3 modules
 import yaml
+import msgpack
 
 # local repo modules
 import libbrick.path_utils
+import libbrick.rate_limiter
+import libbrick.wrappers.cache_store as cache_store
 
 
 # ANSI color codes used to subdue routine cache chatter on a TTY.
@@ -32,11 +40,231 @@ def _subdued(text: str) -> str:
 	return text
 
 
+#============================
+#============================
+class NotFoundError(LookupError):
+	"""
+	The API answered, and the item does not exist. Never retried.
+
+	A LookupError, so existing 'except LookupError' item checks still work.
+	"""
+	pass
+
+#============================
+#============================
+class ApiError(RuntimeError):
+	"""
+	The API call failed for a reason other than a missing item.
+	"""
+	pass
+
+#============================
+#============================
+class TransientError(ApiError):
+	"""
+	A failure worth retrying: network error, timeout, or 5xx reply.
+	"""
+	def __init__(self, message: str, retry_after: float = None):
+		super().__init__(message)
+		# seconds the server asked us to wait, from a Retry-After header
+		self.retry_after = retry_after
+
+#============================
+#============================
+class ThrottledError(TransientError):
+	"""
+	The server asked us to slow down (HTTP 429), retried after a wait.
+	"""
+	pass
+
+#============================
+#============================
+class CircuitOpenError(ApiError):
+	"""
+	Raised without calling the host, after it failed too many times in a row.
+	"""
+	pass
+
+#============================
+#============================
+def retry_after_seconds(headers) -> float:
+	"""
+	Read a Retry-After header given in seconds, None if missing or a date.
+	"""
+	if headers is None:
+		return None
+	value = headers.get('Retry-After')
+	if value is None or not str(value).strip().isdigit():
+		return None
+	return float(value)
+
+#============================
+#============================
+def raise_for_status(status: int, headers=None, what: str = '') -> None:
+	"""
+	Raise the error class for a failed HTTP status, return for 2xx and 3xx.
+
+	Args:
+		status: HTTP status code, or BrickLink's meta code.
+		headers: optional; reply headers, for Retry-After.
+		what: optional; URL or item, for the message.
+
+	Raises:
+		ThrottledError: for 429.
+		TransientError: for 408 and 5xx.
+		ApiError: for 401 and 403, bad credentials are not retried.
+		NotFoundError: for any other 4xx.
+	"""
+	if status is None or status < 400:
+		return
+	message = f"HTTP {status} for {what}"
+	if status == 429:
+		raise ThrottledError(message, retry_after_seconds(headers))
+	if status == 408 or status >= 500:
+		raise TransientError(message, retry_after_seconds(headers))
+	if status in (401, 403):
+		raise ApiError(message)
+	raise NotFoundError(message)
+
+#============================
+#============================
+def raise_for_urllib_error(error: OSError, what: str = '') -> None:
+	"""
+	Raise the error class for a urllib failure, as used by rebrick and brickse.
+
+	HTTP errors are sorted by status like raise_for_status(), connection
+	errors and timeouts become TransientError.
+	"""
+	if isinstance(error, urllib.error.HTTPError):
+		raise_for_status(error.code, error.headers, what)
+	raise TransientError(f"{what}: {error}")
+
+#============================
+#============================
+class RetryPolicy(object):
+	"""
+	Exponential backoff with full jitter, honoring Retry-After.
+	"""
+
+	#============================
+	#============================
+	def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+			sleep=time.sleep):
+		"""
+		Args:
+			max_attempts: optional; calls in all, including the first.
+			base_delay: optional; seconds before the first retry, doubled each time.
+			max_delay: optional; longest wait, also caps Retry-After.
+			sleep: optional; sleep function, replaced in tests.
+		"""
+		self.max_attempts = max_attempts
+		self.base_delay = base_delay
+		self.max_delay = max_delay
+		self.sleep = sleep
+
+	#============================
+	#============================
+	def delay(self, attempt: int, retry_after: float = None) -> float:
+		"""
+		Seconds to wait after failed attempt number attempt, counted from 0.
+		"""
+		if retry_after is not None:
+			return min(self.max_delay, retry_after)
+		# full jitter: a random wait up to the backoff, so workers do not retry in step
+		backoff = min(self.max_delay, self.base_delay * (2 ** attempt))
+		return random.uniform(0, backoff)
+
+#============================
+#============================
+class CircuitBreaker(object):
+	"""
+	Per-host breaker: opens after failure_threshold failures in a row.
+
+	While open, calls fail at once with CircuitOpenError. After
+	reset_timeout seconds one trial call is let through; success closes
+	the breaker, failure opens it again.
+	"""
+
+	#============================
+	#============================
+	def __init__(self, host: str, failure_threshold: int = 8, reset_timeout: float = 120.0,
+			clock=time.monotonic):
+		self.host = host
+		self.failure_threshold = failure_threshold
+		self.reset_timeout = reset_timeout
+		self._clock = clock
+		self._failures = 0
+		self._opened_at = None
+		self._lock = threading.Lock()
+
+	#============================
+	#============================
+	def before_call(self) -> None:
+		"""
+		Raise CircuitOpenError while the breaker is open.
+		"""
+		with self._lock:
+			if self._opened_at is None:
+				return
+			waited = self._clock() - self._opened_at
+			if waited < self.reset_timeout:
+				raise CircuitOpenError(
+					f"{self.host} failed {self._failures} times in a row, "
+					f"retrying in {self.reset_timeout - waited:.0f}s")
+			# half open: let this call through, push the next trial out
+			self._opened_at = self._clock()
+
+	#============================
+	#============================
+	def record_success(self) -> None:
+		with self._lock:
+			self._failures = 0
+			self._opened_at = None
+
+	#============================
+	#============================
+	def record_failure(self) -> None:
+		with self._lock:
+			self._failures += 1
+			if self._failures >= self.failure_threshold:
+				self._opened_at = self._clock()
+
+#============================
+#============================
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+#============================
+def get_circuit_breaker(host: str) -> CircuitBreaker:
+	"""
+	Return the process-wide circuit breaker for a host.
+	"""
+	with _breakers_lock:
+		if host not in _breakers:
+			_breakers[host] = CircuitBreaker(host)
+		breaker = _breakers[host]
+	return breaker
+
+#============================
+#============================
 class BaseWrapperClass(object):
 	"""
 	Base wrapper class to manage caching and API interactions.
 	"""
 
+	# optional per-cache limits, subclasses set e.g.
+	# {'my_cache': {'max_entries': 100000, 'ttl': 90 * 24 * 3600}}
+	# max_entries: keep at most this many entries, least recently used go first
+	# ttl: drop entries whose 'time' stamp is older than this many seconds
+	cache_limits = {}
+
+	# caches whose time-stamped entries refresh_oldest() may refetch,
+	# subclasses list them and implement _refresh_cache_entry()
+	refresh_caches = ()
+
+	# host whose rate limiter and daily quota the wrapper's API calls use
+	api_host = None
+
 	#============================
 	#============================
 	def __init__(self):
@@ -56,9 +284,17 @@ class BaseWrapperClass(object):
 		# JSON allows duplicate keys, which is invalid PYTHON and YAML
 		# JSON is preferred by web developers for APIs, many web programmers are not aware YAML exists
 
+		# MSGPACK is a binary JSON, several times faster to load for the big caches
+		# MSGPACK keeps int keys as ints, JSON turns them into strings
+		# MSGPACK files are not human readable, keep hand-edited caches in YAML
+
 		# When the CACHE file is BIG and contains lots of details... use JSON
 		# When the CACHE file is SIMPLE and might require EDITING... use YAML/YML
 
+		# When the CACHE is HUGE and updated a few keys at a time... use SQLITE
+		# SQLITE stores one table per cache in CACHE/wrapper_caches.sqlite3
+		# SQLITE reads entries on demand and saves only the changed keys
+
 		self.data_caches = {
 			'wrapper_test_json_cache': 'json',
 			'wrapper_test_yaml_cache': 'yml',
@@ -73,45 +309,264 @@ class BaseWrapperClass(object):
 		Start the wrapper with initial settings and load cache.
 		"""
 		self.expire_time = 14 * 24 * 3600 # 14 days, in seconds
-		self.data_refresh_cutoff = 0.0001 # 0.01% chance of refreshing data
+		# opt in with enable_stale_while_revalidate()
+		self.stale_while_revalidate = False
+		self._refresh_queue = None
+		self._refresh_thread = None
+		self._queued_refresh_keys = set()
+		# (cache_name, key) entries read as missing while refresh_oldest() refetches them
+		self._refresh_bypass = set()
+		# threads sharing this wrapper may serve the same stale entry at once
+		self._refresh_lock = threading.Lock()
 		self.api_calls = 0
 		self.api_log = []
+		# guards API client setup and call counters when worker threads share a wrapper
+		self.api_lock = threading.Lock()
+		# fetches in progress, keyed like the cache entry they fill
+		self._flights = {}
+		self._flights_lock = threading.Lock()
+		self.shared_fetches = 0
+		# retries for TransientError and ThrottledError, see call_with_retry()
+		self.retry_policy = RetryPolicy()
+		self.api_retries = 0
 		self.load_cache()
 
+	#============================
+	#============================
+	def _get_cache_path(self) -> str:
+		"""
+		Return the CACHE directory shared by all wrappers.
+		"""
+		cache_path = libbrick.path_utils.get_cache_dir()
+		return cache_path
+
+	#============================
+	#============================
+	def _read_cache_file(self, file_name: str, cache_format: str) -> dict:
+		"""
+		Parse one whole-file JSON, YAML, or msgpack cache.
+		"""
+		if cache_format == 'msgpack':
+			with open(file_name, 'rb') as f:
+				# strict_map_key=False allows the int keys used by some caches
+				cache_data = msgpack.unpackb(f.read(), raw=False, strict_map_key=False)
+			return cache_data
+		with open(file_name, 'r') as f:
+			if cache_format == 'json':
+				cache_data = json.load(f)
+			elif cache_format == 'yml':
+				cache_data = yaml.safe_load(f)
+			else:
+				raise ValueError(f"UNKNOWN CACHE FORMAT: {cache_format}")
+		# an empty YAML file parses to None
+		if cache_data is None:
+			cache_data = {}
+		return cache_data
+
+	#============================
+	#============================
+	def _find_legacy_cache_file(self, cache_path: str, cache_name: str, cache_format: str):
+		"""
+		Find an older cache file written in a different format.
+
+		Args:
+			cache_path: CACHE directory.
+			cache_name: name of the cache.
+			cache_format: the format the cache uses now.
+
+		Returns:
+			tuple of (file_name, legacy_format), or (None, None) if none exist.
+		"""
+		for legacy_format in ('json', 'yml', 'msgpack'):
+			if legacy_format == cache_format:
+				continue
+			legacy_file = os.path.join(cache_path, cache_name + '.' + legacy_format)
+			if os.path.isfile(legacy_file):
+				return legacy_file, legacy_format
+		return None, None
+
+	#============================
+	#============================
+	def _record_cache_timing(self, action: str, file_name: str, cache_format: str,
+			entries: int, t0: float) -> None:
+		"""
+		Print and keep the time one cache load, write, or migration took.
+
+		The timings collect in self.cache_timings and are summed by format
+		in close(), so JSON and msgpack load costs can be compared directly.
+		"""
+		usec = int((time.time() - t0) * 1e6)
+		self.cache_timings.append({
+			'action': action,
+			'file': file_name,
+			'format': cache_format,
+			'entries': entries,
+			'usec': usec,
+		})
+		preposition = 'to' if action == 'wrote' else 'from'
+		print(_subdued('.. {0} {1} entries {2} {3} in {4:,d} usec'.format(
+			action, entries, preposition, file_name, usec)))
+
+	#============================
+	#============================
+	def _open_sqlite_cache(self, cache_path: str, cache_name: str):
+		"""
+		Open a lazy SQLite-backed cache, importing a legacy file on first use.
+
+		The first time a cache is switched to 'sqlite' its table is empty, so
+		any existing <cache_name>.json, .yml, or .msgpack file is copied in.
+		The legacy file is left on disk untouched.
+		"""
+		if self.sqlite_store is None:
+			db_path = os.path.join(cache_path, cache_store.SQLITE_DB_NAME)
+			self.sqlite_store = cache_store.SqliteCacheStore(db_path)
+		created = self.sqlite_store.ensure_table(cache_name)
+		if created is True:
+			legacy_file, legacy_format = self._find_legacy_cache_file(cache_path, cache_name, 'sqlite')
+			if legacy_file is not None:
+				t0 = time.time()
+				legacy_data = self._read_cache_file(legacy_file, legacy_format)
+				self.sqlite_store.upsert_values(cache_name, list(legacy_data.items()))
+				self._record_cache_timing('migrated', legacy_file, legacy_format, len(legacy_data), t0)
+		max_memory_entries = None
+		if cache_name in self.cache_limits:
+			max_memory_entries = self.cache_limits[cache_name].get('max_entries')
+		cache_data = cache_store.SqliteCacheDict(self.sqlite_store, cache_name, max_memory_entries)
+		print(_subdued('.. opened sqlite table {0} with {1} entries'.format(
+			cache_name, self.sqlite_store.count(cache_name))))
+		return cache_data
+
+	#============================
+	#============================
+	def _load_cache_file(self, file_name: str, cache_format: str) -> dict:
+		"""
+		Parse a whole-file cache on first access, or start empty if missing.
+
+		When the file is missing but the same cache exists in another format,
+		for example a cache switched from 'json' to 'msgpack', the old file
+		is parsed and rewritten in the new format. The old file is left on disk.
+		"""
+		if not os.path.isfile(file_name):
+			cache_path = os.path.dirname(file_name)
+			cache_name = os.path.splitext(os.path.basename(file_name))[0]
+			legacy_file, legacy_format = self._find_legacy_cache_file(cache_path, cache_name, cache_format)
+			if legacy_file is None:
+				return {}
+			t0 = time.time()
+			cache_data = self._read_cache_file(legacy_file, legacy_format)
+			self._write_cache_file(file_name, cache_format, cache_data)
+			self._record_cache_timing('migrated', legacy_file, legacy_format, len(cache_data), t0)
+			return cache_data
+		try:
+			t0 = time.time()
+			cache_data = self._read_cache_file(file_name, cache_format)
+			self._record_cache_timing('loaded', file_name, cache_format, len(cache_data), t0)
+		except IOError:
+			cache_data = {}
+		return cache_data
+
+	#============================
+	#============================
+	def _load_overrides_file(self, file_name: str) -> dict:
+		"""
+		Parse the hand-edited YAML overrides for one cache, if present.
+		"""
+		if not os.path.isfile(file_name):
+			return {}
+		t0 = time.time()
+		overrides = self._read_cache_file(file_name, 'yml')
+		self._record_cache_timing('loaded', file_name, 'yml', len(overrides), t0)
+		return overrides
+
+	#============================
+	#============================
+	def _prune_cache_entries(self, cache_name: str, cache_data: dict, last_used: dict) -> None:
+		"""
+		Apply cache_limits to one file cache dict in place.
+		"""
+		limits = self.cache_limits[cache_name]
+		removed = cache_store.purge_entries(cache_data, limits.get('max_entries'),
+			limits.get('ttl'), last_used=last_used)
+		if len(removed) > 0:
+			print(_subdued('.. purged {0} entries from {1}'.format(len(removed), cache_name)))
+
+	#============================
+	#============================
+	def _purge_sqlite_cache(self, cache_name: str) -> None:
+		"""
+		Save last-use times and apply cache_limits to one sqlite cache.
+		"""
+		cache_data = getattr(self, cache_name)
+		cache_data.flush_usage()
+		limits = self.cache_limits[cache_name]
+		removed = self.sqlite_store.purge(cache_name, limits.get('max_entries'), limits.get('ttl'))
+		if removed > 0:
+			# purged rows may still sit in the in-memory copy
+			cache_data.forget()
+			print(_subdued('.. purged {0} entries from {1}'.format(removed, cache_name)))
+
+	#============================
+	#============================
+	def print_cache_timings(self) -> None:
+		"""
+		Print total cache load and write time grouped by action and format.
+		"""
+		totals = {}
+		for timing in self.cache_timings:
+			key = (timing['action'], timing['format'])
+			if key not in totals:
+				totals[key] = {'files': 0, 'entries': 0, 'usec': 0}
+			totals[key]['files'] += 1
+			totals[key]['entries'] += timing['entries']
+			totals[key]['usec'] += timing['usec']
+		for (action, cache_format), total in sorted(totals.items()):
+			print(_subdued('.. {0} {1}: {2} files, {3:,d} entries, {4:,d} usec'.format(
+				action, cache_format, total['files'], total['entries'], total['usec'])))
+
 	#============================
 	#============================
 	def load_cache(self):
 		"""
-		Load cache data from files.
+		Set up cache attributes without parsing any files.
+
+		Whole-file formats ('json', 'yml', 'msgpack') become LazyFileCacheDict objects
+		that parse their file the first time a key is touched, then replay
+		the <cache_name>.journal.jsonl file left by earlier runs.
+		A hand-edited <cache_name>_overrides.yml file, if present, is read
+		at the same time and takes precedence over the machine-written
+		entries; the wrappers never write to it.
+		Caches listed in cache_limits are purged here and in save_cache().
+		The 'sqlite' format opens a table in CACHE/wrapper_caches.sqlite3
+		and reads entries on demand.
 		"""
 		print(_subdued('==== LOAD CACHE ===='))
-		git_root = libbrick.path_utils.get_git_root()
-		if git_root is None:
-			cache_path = os.path.join(os.path.dirname(__file__), "CACHE")
-		else:
-			cache_path = os.path.join(git_root, "CACHE")
+		cache_path = self._get_cache_path()
+		os.makedirs(cache_path, exist_ok=True)
+		self.sqlite_store = None
+		self.cache_timings = []
 		for cache_name, cache_format in self.data_caches.items():
 			if cache_format == 'yaml':
 				cache_format = 'yml'
 
+			if cache_format == 'sqlite':
+				cache_data = self._open_sqlite_cache(cache_path, cache_name)
+				setattr(self, cache_name, cache_data)
+				if cache_name in self.cache_limits:
+					self._purge_sqlite_cache(cache_name)
+				continue
+
 			file_basename = cache_name + '.' + cache_format
 			file_name = os.path.join(cache_path, file_basename)
-			if os.path.isfile(file_name):
-				try:
-					t0 = time.time()
-					if cache_format == 'json':
-						cache_data = json.load(open(file_name, 'r'))
-					elif cache_format == 'yml':
-						cache_data = yaml.safe_load(open(file_name, 'r'))
-					else:
-						print("UNKNOWN CACHE FORMAT: ", cache_format)
-						sys.exit(1)
-					print(_subdued('.. loaded {0} entries from {1} in {2:,d} usec'.format(
-						len(cache_data), file_name, int((time.time() - t0) * 1e6))))
-				except IOError:
-					cache_data = {}
-			else:
-				cache_data = {}
+			journal_path = os.path.join(cache_path, cache_name + '.journal.jsonl')
+			lock_path = os.path.join(cache_path, cache_name + '.lock')
+			overrides_path = os.path.join(cache_path, cache_name + '_overrides.yml')
+			loader = functools.partial(self._load_cache_file, file_name, cache_format)
+			overrides_loader = functools.partial(self._load_overrides_file, overrides_path)
+			prune = None
+			if cache_name in self.cache_limits:
+				prune = functools.partial(self._prune_cache_entries, cache_name)
+			cache_data = cache_store.LazyFileCacheDict(cache_name, loader, journal_path,
+				lock_path, overrides_loader, prune)
 			setattr(self, cache_name, cache_data)
 		print(_subdued('==== END CACHE ===='))
 
@@ -119,28 +574,62 @@ class BaseWrapperClass(object):
 	#============================
 	def close(self):
 		"""
-		Close the wrapper and save cache data.
+		Close the wrapper, compacting every journaled cache into its main file.
 		"""
-		self.save_cache()
+		self._stop_background_refresh()
+		self.save_cache(compact=True)
+		if self.sqlite_store is not None:
+			self.sqlite_store.close()
+			self.sqlite_store = None
+		self.print_cache_timings()
 		#self.api_log.sort()
 		#print(self.api_log)
 		print("{0} api calls were made".format(self.api_calls))
+		if self.api_retries > 0:
+			print("{0} api calls were retried".format(self.api_retries))
+		if self.shared_fetches > 0:
+			print("{0} lookups shared an api call already in flight".format(self.shared_fetches))
+
+	#============================
+	#============================
+	def _write_cache_file(self, file_name: str, cache_format: str, cache_data: dict) -> None:
+		"""
+		Rewrite one whole-file JSON, YAML, or msgpack cache via temp file plus rename.
+		"""
+		if cache_format == 'msgpack':
+			packed = msgpack.packb(cache_data, use_bin_type=True)
+			cache_store.write_file_atomic(file_name, lambda f: f.write(packed), binary=True)
+			return
+		if cache_format == 'json':
+			dump_function = json.dump
+		elif cache_format == 'yml':
+			dump_function = yaml.dump
+		else:
+			raise ValueError(f"UNKNOWN CACHE FORMAT: {cache_format}")
+		write_callback = functools.partial(dump_function, cache_data)
+		cache_store.write_file_atomic(file_name, write_callback)
 
 	#============================
 	#============================
-	def save_cache(self, single_cache_name: str = None):
+	def save_cache(self, single_cache_name: str = None, compact: bool = False):
 		"""
-		Save cache data to files.
+		Checkpoint cache data to disk.
+
+		Every change is already on disk: SQLite caches write through, and file
+		caches append each change to their journal. This call only rewrites
+		(compacts) a JSON/YAML/msgpack file when its journal has passed
+		cache_store.JOURNAL_COMPACT_BYTES, or when compact is True.
+		Compaction holds the cache's fcntl lock, merges in entries journaled
+		by other processes, and replaces the file atomically.
+		Caches listed in cache_limits are purged: sqlite tables on every
+		call, file caches whenever they are compacted.
 
 		Args:
 			single_cache_name: Optional; name of a single cache to save.
+			compact: Optional; rewrite every file cache with a non-empty journal.
 		"""
 		print(_subdued('==== SAVE CACHE ===='))
-		git_root = libbrick.path_utils.get_git_root()
-		if git_root is None:
-			cache_path = os.path.join(os.path.dirname(__file__), "CACHE")
-		else:
-			cache_path = os.path.join(git_root, "CACHE")
+		cache_path = self._get_cache_path()
 		if not os.path.isdir(cache_path):
 			os.mkdir(cache_path)
 		for cache_name, cache_format in self.data_caches.items():
@@ -149,20 +638,24 @@ class BaseWrapperClass(object):
 				continue
 			if cache_format == 'yaml':
 				cache_format = 'yml'
+			if cache_format == 'sqlite':
+				if cache_name in self.cache_limits:
+					self._purge_sqlite_cache(cache_name)
+				continue
+			cache_data = getattr(self, cache_name)
+			# a cache that was never touched cannot have changed
+			if not cache_data.is_loaded():
+				continue
+			journal_size = cache_data.journal_size()
+			if journal_size == 0:
+				continue
+			if compact is False and journal_size < cache_store.JOURNAL_COMPACT_BYTES:
+				continue
 			t0 = time.time()
 			file_name = os.path.join(cache_path, cache_name + '.' + cache_format)
-			cache_data = getattr(self, cache_name)
-			if len(cache_data) > 0:
-				with open(file_name, 'w') as f:
-					if cache_format == 'json':
-						json.dump(cache_data, f)
-					elif cache_format == 'yml':
-						yaml.dump(cache_data, f)
-					else:
-						print("UNKNOWN CACHE FORMAT: ", cache_format)
-						sys.exit(1)
-				print(_subdued('.. wrote {0} entries to {1} in {2:,d} usec'.format(
-					len(cache_data), file_name, int((time.time() - t0) * 1e6))))
+			write_main_file = functools.partial(self._write_cache_file, file_name, cache_format)
+			cache_data.compact(write_main_file)
+			self._record_cache_timing('wrote', file_name, cache_format, len(cache_data.to_dict()), t0)
 		print(_subdued('==== END CACHE ===='))
 
 	#============================
@@ -192,7 +685,7 @@ class BaseWrapperClass(object):
 
 	#============================
 	#============================
-	def _check_set_ID(self, setID: str) -> bool:
+	def check_set_ID(self, setID: str) -> bool:
 		"""
 		Check if a set ID is valid.
 
@@ -217,18 +710,28 @@ class BaseWrapperClass(object):
 
 	#============================
 	#============================
-	def _check_if_data_valid(self, cache_data_dict: dict) -> bool:
+	def check_if_data_valid(self, cache_data_dict: dict, cache_name: str = None,
+			key=None) -> bool:
 		"""
 		Check if cache data is valid and not expired.
 
+		In stale-while-revalidate mode, an expired entry counts as valid when
+		the caller names its cache and key, and the key is queued for a
+		background refresh.
+
 		Args:
 			cache_data_dict: Dictionary containing cache data.
+			cache_name: Optional; cache holding the entry, for background refresh.
+			key: Optional; key of the entry, for background refresh.
 
 		Returns:
 			True if data is valid, otherwise False.
 		"""
 		if cache_data_dict is None:
 			return False
+		# refresh_oldest() is refetching this entry, the getter must not return it
+		if cache_name is not None and (cache_name, key) in self._refresh_bypass:
+			return False
 		###################
 		if not isinstance(cache_data_dict, dict):
 			print(cache_data_dict)
@@ -240,17 +743,290 @@ class BaseWrapperClass(object):
 			return False
 		###################
 		if time.time() - int(cache_data_dict.get('time')) > self.expire_time:
+			if self.stale_while_revalidate is True and cache_name in self.refresh_caches:
+				print('... cache expired, using stale data while it refreshes')
+				self._queue_background_refresh(cache_name, key)
+				return True
 			print('... cache expired')
 			return False
 		###################
-		if random.random() < self.data_refresh_cutoff:
-			print('... random data refresh')
-			# reset data to None, 0.01% of the time
-			# keeps the data fresh
-			return False
-		###################
+		# no random refresh here, refresh_oldest() renews old entries offline
 		return True
 
+	#============================
+	#============================
+	def plan_refresh(self, count: int, min_age: float = 0, cache_names: list = None) -> list:
+		"""
+		Pick the oldest time-stamped cache entries to refetch.
+
+		Args:
+			count: most entries to return.
+			min_age: optional; skip entries fetched less than this many seconds ago.
+			cache_names: optional; caches to consider, defaults to refresh_caches.
+
+		Returns:
+			list of (time, cache_name, key) tuples, oldest first.
+		"""
+		if cache_names is None:
+			cache_names = self.refresh_caches
+		for cache_name in cache_names:
+			if cache_name not in self.refresh_caches:
+				raise ValueError(f"no refresh defined for cache {cache_name}")
+		before = time.time() - min_age
+		plan = []
+		for cache_name in cache_names:
+			cache_data = getattr(self, cache_name)
+			if self.data_caches[cache_name] == 'sqlite':
+				for stamp, key in self.sqlite_store.oldest_entries(cache_name, count, before):
+					plan.append((stamp, cache_name, key))
+				continue
+			for key, value in cache_data.to_dict().items():
+				stamp = cache_store.entry_time(value)
+				if stamp is not None and stamp < before:
+					plan.append((stamp, cache_name, key))
+		plan.sort(key=lambda item: item[0])
+		return plan[:count]
+
+	#============================
+	#============================
+	def refresh_oldest(self, count: int, api_budget: int, min_age: float = 0,
+			cache_names: list = None) -> int:
+		"""
+		Refetch the oldest cache entries without exceeding an API call budget.
+
+		Meant for an offline or scheduled run (refresh_bricklink_cache.py),
+		so foreground lookups never stop to refresh fresh-enough data.
+		No new entry is started once api_budget calls have been made; one
+		entry can cost several calls, so the last one may finish a little past it.
+
+		Args:
+			count: most entries to refresh.
+			api_budget: most API calls to spend.
+			min_age: optional; skip entries fetched less than this many seconds ago.
+			cache_names: optional; caches to consider, defaults to refresh_caches.
+
+		Returns:
+			number of entries refreshed.
+		"""
+		plan = self.plan_refresh(count, min_age, cache_names)
+		# never plan past what is left of the daily quota, foreground runs need some too
+		if self.api_host is not None:
+			remaining = libbrick.rate_limiter.get_limiter(self.api_host).remaining()
+			if remaining is not None and remaining < api_budget:
+				print(f"only {remaining} API calls left in the daily quota")
+				api_budget = remaining
+		start_calls = self.api_calls
+		refreshed = 0
+		for stamp, cache_name, key in plan:
+			if self.api_calls - start_calls >= api_budget:
+				print(f"API budget of {api_budget} calls reached, stopping")
+				break
+			age_days = (time.time() - stamp) / 86400.
+			print(f"REFRESH {cache_name} {key} -- {age_days:.1f} days old")
+			# the getter skips the cached copy and overwrites it only on success,
+			# so a failed refetch keeps the old data
+			self._refresh_bypass.add((cache_name, key))
+			try:
+				self._refresh_cache_entry(cache_name, key)
+			except (LookupError, ApiError) as error:
+				print(f"refresh failed for {cache_name} {key}, keeping cached data: {error}")
+				continue
+			finally:
+				self._refresh_bypass.discard((cache_name, key))
+			refreshed += 1
+		return refreshed
+
+	#============================
+	#============================
+	def enable_stale_while_revalidate(self) -> None:
+		"""
+		Serve expired entries right away and refetch them in the background.
+
+		The refresh runs in one daemon thread that owns a second wrapper of
+		the same class, so it has its own API client and SQLite connection
+		and shares nothing with this one but the CACHE files. Refreshed
+		values are written to disk for the next run; this run keeps using
+		the stale copy. Keys still queued at close() are dropped and will
+		be queued again the next time they are served stale.
+		"""
+		self.stale_while_revalidate = True
+
+	#============================
+	#============================
+	def _queue_background_refresh(self, cache_name: str, key) -> None:
+		"""
+		Queue one expired entry for the background refresh thread.
+		"""
+		with self._refresh_lock:
+			if (cache_name, key) in self._queued_refresh_keys:
+				return
+			self._queued_refresh_keys.add((cache_name, key))
+			if self._refresh_thread is None:
+				self._refresh_queue = queue.Queue()
+				self._refresh_thread = threading.Thread(target=self._background_refresh_worker,
+					name=f"{type(self).__name__}-refresh", daemon=True)
+				self._refresh_thread.start()
+			self._refresh_queue.put((cache_name, key))
+
+	#============================
+	#============================
+	def _background_refresh_worker(self) -> None:
+		"""
+		Refetch queued entries with a separate wrapper until told to stop.
+		"""
+		refresher = type(self)()
+		while True:
+			item = self._refresh_queue.get()
+			if item is None:
+				break
+			cache_name, key = item
+			# refresher is not in stale mode, so the expired entry is refetched
+			# one failed entry must not end the thread and drop the rest of the queue
+			try:
+				refresher._refresh_cache_entry(cache_name, key)
+			except (LookupError, ApiError, libbrick.rate_limiter.QuotaExceededError) as error:
+				print(f"background refresh failed for {cache_name} {key}: {error}")
+		refresher.close()
+
+	#============================
+	#============================
+	def _stop_background_refresh(self, drop_pending: bool = True) -> None:
+		"""
+		Stop the refresh thread after the entry in progress.
+
+		Args:
+			drop_pending: Optional; discard queued entries instead of
+				refreshing them before the thread stops.
+		"""
+		if self._refresh_thread is None:
+			return
+		dropped = 0
+		while drop_pending is True and not self._refresh_queue.empty():
+			self._refresh_queue.get_nowait()
+			dropped += 1
+		if dropped > 0:
+			print(f"{dropped} stale entries left for a later refresh")
+		self._refresh_queue.put(None)
+		self._refresh_thread.join()
+		self._refresh_thread = None
+
+	#============================
+	#============================
+	def _refresh_cache_entry(self, cache_name: str, key) -> None:
+		"""
+		Refetch one cache entry through the normal getter.
+
+		Wrappers that list caches in refresh_caches override this for each
+		of them; any other cache name is a ValueError.
+		"""
+		raise ValueError(f"no refresh defined for cache {cache_name}")
+
+	#============================
+	#============================
+	def call_with_retry(self, host: str, call):
+		"""
+		Run one API call, retrying transient failures with backoff.
+
+		NotFoundError (any LookupError) is returned to the caller at once,
+		TransientError and ThrottledError are retried up to
+		retry_policy.max_attempts times, waiting for Retry-After when the
+		server sends it. Failures count toward the host's circuit breaker.
+
+		Args:
+			host: API host name, one circuit breaker per host.
+			call: function with no arguments that makes the request.
+
+		Returns:
+			the value returned by call().
+
+		Raises:
+			CircuitOpenError: if the host failed too many times in a row.
+		"""
+		breaker = get_circuit_breaker(host)
+		attempt = 0
+		while True:
+			breaker.before_call()
+			try:
+				result = call()
+			except LookupError:
+				# the host answered, it is healthy
+				breaker.record_success()
+				raise
+			except TransientError as error:
+				attempt += 1
+				delay = self.retry_delay(host, error, attempt)
+				if delay is None:
+					raise
+				self.retry_policy.sleep(delay)
+				continue
+			breaker.record_success()
+			return result
+
+	#============================
+	#============================
+	def retry_delay(self, host: str, error: TransientError, attempt: int) -> float:
+		"""
+		Count a transient failure and decide whether to try again.
+
+		The retry policy shared by call_with_retry() and the async client.
+
+		Args:
+			host: API host name, one circuit breaker per host.
+			error: the TransientError of the failed attempt.
+			attempt: attempts made so far, the failed one included.
+
+		Returns:
+			seconds to wait before the next attempt, or None to give up.
+		"""
+		get_circuit_breaker(host).record_failure()
+		if attempt >= self.retry_policy.max_attempts:
+			return None
+		delay = self.retry_policy.delay(attempt - 1, error.retry_after)
+		with self.api_lock:
+			self.api_retries += 1
+		print(f"{host}: {error}, retry {attempt} in {delay:.1f}s")
+		return delay
+
+	#============================
+	#============================
+	def single_flight(self, key, fetch):
+		"""
+		Run fetch() once for all threads asking for the same key at the same time.
+
+		The first caller runs the fetch, callers that arrive while it is in
+		flight wait and get the same result, or the same exception. Once the
+		fetch finishes the key is forgotten, later callers read the cache.
+
+		Args:
+			key: hashable key, such as (cache_name, cache_key) or an API path.
+			fetch: function with no arguments that makes the network call.
+
+		Returns:
+			the value returned by fetch().
+		"""
+		with self._flights_lock:
+			future = self._flights.get(key)
+			leader = future is None
+			if leader:
+				future = concurrent.futures.Future()
+				self._flights[key] = future
+			else:
+				self.shared_fetches += 1
+		if not leader:
+			# re-raises the leader's exception, e.g. LookupError for a missing item
+			return future.result()
+		try:
+			result = fetch()
+		except BaseException as error:
+			future.set_exception(error)
+			raise
+		else:
+			future.set_result(result)
+		finally:
+			with self._flights_lock:
+				del self._flights[key]
+		return result
+
 	def decode_and_normalize(self, html_string: str) -> str:
 		"""
 		Decodes HTML escape sequences in the input string to UTF-8 and normalizes it to ISO-8859-1.
@@ -3,8 +3,6 @@
 import os
 import sys
 import html
-import time
-import random
 
 import libbrick.common
 import libbrick.path_utils
@@ -41,7 +39,6 @@ if __name__ == '__main__':
 		try:
 			category_name = BLwrap.getCategoryNameFromMinifigID(minifigID)
 		except LookupError:
-			time.sleep(random.random())
 			category_name = None
 		minifig_data['category_name'] = category_name
 		minifig_data['set_id'] = setID
@@ -95,6 +95,25 @@ def collect_data_for_element(elementID: int, BLW, args) -> dict:
 
 	return data
 
+#=====================
+def prefetch_prices(elementIDs: list, BLW, workers: int) -> None:
+	"""
+	Warm the BrickLink price cache for all elements before the row loop.
+
+	Args:
+		elementIDs (list): List of element IDs.
+		BLW: BrickLink wrapper instance.
+		workers (int): Most price guide calls in flight at once.
+	"""
+	items = []
+	for elementID in elementIDs:
+		map_list = BLW.elementIDtoPartIDandColorID(elementID, verbose=False)
+		if map_list is None or len(map_list) != 2:
+			continue
+		partID, colorID = map_list
+		items.append(('part', partID, colorID))
+	BLW.prefetchPriceData(items, workers=workers)
+
 #=====================
 def parse_args() -> argparse.Namespace:
 	"""
@@ -114,6 +133,9 @@ def parse_args() -> argparse.Namespace:
 	parser.add_argument('-L', '--limit-parts', dest='limit_parts', metavar='N',
 		type=int, default=None,
 		help='only process the first N elements then exit')
+	parser.add_argument('-w', '--workers', dest='workers', metavar='N',
+		type=int, default=4,
+		help='prefetch price guides N calls at a time before writing rows (default: 4)')
 	# Add TUI/CLI mode flags
 	libbrick.tui.add_tui_args(parser)
 	args = parser.parse_args()
@@ -286,6 +308,9 @@ def main():
 		elementIDs = elementIDs[:args.limit_parts]
 		print(f"Limiting to {len(elementIDs)} elements")
 
+	# Fetch all missing price guides up front, rows then come from the cache
+	prefetch_prices(elementIDs, BLW, args.workers)
+
 	# Prepare the CSV file for data writing
 	timestamp = libbrick.common.make_timestamp()
 	output_dir = libbrick.path_utils.get_output_dir(subdir='print_out')
@@ -7,6 +7,8 @@ import sys
 import time
 import random
 import argparse
+import threading
+import concurrent.futures
 
 # local repo modules
 import libbrick.common
@@ -162,6 +164,9 @@ def parse_args() -> argparse.Namespace:
 	parser.add_argument('-L', '--limit-parts', dest='limit_parts', metavar='N',
 		type=int, default=None,
 		help='only process the first N parts then exit')
+	parser.add_argument('-w', '--workers', dest='workers', metavar='N',
+		type=int, default=1,
+		help='look up N parts at a time, rows stay in input order (default: 1)')
 	# Add TUI/CLI mode flags
 	libbrick.tui.add_tui_args(parser)
 	args = parser.parse_args()
@@ -178,16 +183,18 @@ if libbrick.tui.TEXTUAL_AVAILABLE:
 			BLW, setID: str, set_data: dict, csvfile: str,
 		) -> None:
 			title = f"Parts in Set {setID} - {set_data.get('name', '')}"
-			super().__init__(tasks, title=title)
+			super().__init__(tasks, title=title, workers=args.workers)
 			self.args = args
 			self.BLW = BLW
 			self.setID = setID
 			self.set_data = set_data
 			self.csvfile = csvfile
-			self.allkeys = None
+			# task dicts are unhashable, map their id() to the input position
+			self.task_index = {id(task): idx for idx, task in enumerate(tasks)}
 			self.csv_file_handle = None
-			self.csv_writer = None
+			self.ordered_writer = None
 			self.total_value = 0.0
+			self.total_lock = threading.Lock()
 
 		def get_extra_metrics(self) -> str:
 			"""Return the running lot-value total for the metrics panel."""
@@ -216,7 +223,8 @@ if libbrick.tui.TEXTUAL_AVAILABLE:
 		def on_mount(self) -> None:
 			"""Open CSV file and start tasks."""
 			self.csv_file_handle = open(self.csvfile, 'w', newline='')
-			self.csv_writer = csv.writer(self.csv_file_handle, delimiter='\t')
+			csv_writer = csv.writer(self.csv_file_handle, delimiter='\t')
+			self.ordered_writer = libbrick.price_export.OrderedRowWriter(csv_writer)
 			super().on_mount()
 
 		def process_task(self, task) -> tuple:
@@ -227,12 +235,8 @@ if libbrick.tui.TEXTUAL_AVAILABLE:
 			"""
 			data = collect_data_for_part(task, self.BLW, self.args)
 			data = libbrick.price_export.clean_data_for_export(data)
-			# Initialize column headers on first task
-			if self.allkeys is None:
-				self.allkeys = libbrick.price_export.build_column_order(data)
-				self.csv_writer.writerow(self.allkeys)
-			# Write data row to CSV
-			libbrick.price_export.write_csv_row(self.csv_writer, data, self.allkeys)
+			# Write data row to CSV once every earlier part is written
+			self.ordered_writer.put(self.task_index[id(task)], data)
 			# Build summary and column update values
 			item_id = data.get('no', '???')
 			color_name = str(data.get('color_name', ''))[:20]
@@ -243,7 +247,8 @@ if libbrick.tui.TEXTUAL_AVAILABLE:
 			lot_text = f"${lot_value:.2f}" if isinstance(lot_value, (int, float)) else str(lot_value)
 			# Accumulate running total for the metrics panel
 			if isinstance(lot_value, (int, float)):
-				self.total_value += float(lot_value)
+				with self.total_lock:
+					self.total_value += float(lot_value)
 			# Return column updates dict for the base class to apply
 			column_updates = {
 				"item_id": str(item_id),
@@ -263,10 +268,25 @@ if libbrick.tui.TEXTUAL_AVAILABLE:
 			self.BLW.close()
 
 
+#=====================
+def collect_timed(part_dict, BLW, args) -> tuple:
+	"""
+	Collect and clean data for one part, returning it with the seconds taken.
+	"""
+	task_start = time.time()
+	data = collect_data_for_part(part_dict, BLW, args)
+	data = libbrick.price_export.clean_data_for_export(data)
+	task_duration = time.time() - task_start
+	return data, task_duration
+
 #=====================
 def run_cli(parts_tree: list, args, BLW, csvfile: str) -> None:
 	"""
-	Run the plain CLI sequential processing mode.
+	Run the plain CLI processing mode.
+
+	With args.workers > 1, parts are looked up on a bounded thread pool that
+	shares BLW, its caches, and the BrickLink rate limiter; rows are still
+	written in input order.
 
 	Args:
 		parts_tree (list): List of part dictionaries.
@@ -277,32 +297,37 @@ def run_cli(parts_tree: list, args, BLW, csvfile: str) -> None:
 	start_time = time.time()
 	durations = []
 	total_value = 0.0
-	with open(csvfile, 'w', newline='') as file:
-		writer = csv.writer(file, delimiter='\t')
-		allkeys = None
-		count = 0
-		total_parts = len(parts_tree)
-		for part_dict in parts_tree:
-			count += 1
-			remaining = total_parts - count
-			print(f"\n   PART {count} of {total_parts} ({remaining} remaining)")
-			task_start = time.time()
-			data = collect_data_for_part(part_dict, BLW, args)
-			data = libbrick.price_export.clean_data_for_export(data)
-			# Setting the columns order and writing headers
-			if allkeys is None:
-				allkeys = libbrick.price_export.build_column_order(data)
-				writer.writerow(allkeys)
-			# Process and write data to CSV
-			libbrick.price_export.write_csv_row(writer, data, allkeys)
-			task_duration = time.time() - task_start
-			durations.append(task_duration)
-			lot_value = data.get('lot value', 0)
-			if isinstance(lot_value, (int, float)):
-				total_value += float(lot_value)
-			# Per-part summary line: time and rolling totals
-			print(f"   ({task_duration:.1f}s)  Running total: ${total_value:,.2f}")
-	BLW.close()
+	workers = max(1, args.workers)
+	pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+	try:
+		with open(csvfile, 'w', newline='') as file:
+			writer = csv.writer(file, delimiter='\t')
+			allkeys = None
+			count = 0
+			total_parts = len(parts_tree)
+			# map() runs up to `workers` parts at once but yields results in input order
+			results = pool.map(collect_timed, parts_tree,
+				[BLW] * total_parts, [args] * total_parts)
+			for data, task_duration in results:
+				count += 1
+				remaining = total_parts - count
+				print(f"\n   PART {count} of {total_parts} ({remaining} remaining)")
+				# Setting the columns order and writing headers
+				if allkeys is None:
+					allkeys = libbrick.price_export.build_column_order(data)
+					writer.writerow(allkeys)
+				# Process and write data to CSV
+				libbrick.price_export.write_csv_row(writer, data, allkeys)
+				durations.append(task_duration)
+				lot_value = data.get('lot value', 0)
+				if isinstance(lot_value, (int, float)):
+					total_value += float(lot_value)
+				# Per-part summary line: time and rolling totals
+				print(f"   ({task_duration:.1f}s)  Running total: ${total_value:,.2f}")
+	finally:
+		# on an error, drop the parts still queued instead of looking them all up
+		pool.shutdown(cancel_futures=True)
+		BLW.close()
 	# Final summary: total elapsed, average per part, total lot value
 	elapsed = time.time() - start_time
 	slow = [d for d in durations if d >= 1.0]
@@ -6,10 +6,12 @@ import sys
 import math
 import time
 import argparse
+import functools
 
 # Local Repo Modules
 import libbrick.common
 import libbrick.path_utils
+import libbrick.rate_limiter
 import libbrick.wrappers.rebrick_wrapper as rebrick_wrapper
 import libbrick.wrappers.brickset_wrapper as brickset_wrapper
 import libbrick.wrappers.bricklink_wrapper as bricklink_wrapper
@@ -157,9 +159,28 @@ def parse_arguments() -> argparse.Namespace:
 		help='A single setID (string, e.g., "10240-1").',
 		type=str
 	)
+	parser.add_argument(
+		'-S', '--stale-ok',
+		dest='stale_ok',
+		help='Use expired BrickLink cache entries now and refresh them in the background.',
+		action='store_true'
+	)
 
 	return parser.parse_args()
 
+#============================
+#============================
+def cached_msrp_value(bsw, item: tuple) -> int:
+	"""
+	Cached Brickset MSRP of a ('set', setID, None) item, 0 if unknown.
+
+	Used to fetch the most valuable sets first when the API quota is short.
+	"""
+	msrp = bsw.brickset_msrp_cache.get(item[1])
+	if msrp is None:
+		return 0
+	return msrp
+
 #============================
 #============================
 def is_power_of_two_or_special(item_count: int) -> bool:
@@ -188,6 +209,8 @@ if __name__ == '__main__':
 	rbw = rebrick_wrapper.Rebrick()
 	bsw = brickset_wrapper.BrickSet()
 	blw = bricklink_wrapper.BrickLink()
+	if args.stale_ok is True:
+		blw.enable_stale_while_revalidate()
 
 	# Initialize the setIDs list
 	setIDs = []
@@ -243,8 +266,14 @@ if __name__ == '__main__':
 	#============================
 	#============================
 
+	# warm the BrickLink price cache first; when the daily API quota cannot
+	# cover every set, the sets with the highest cached MSRP go first
+	blw.prefetchPriceData([('set', setID, None) for setID in setIDs],
+		value=functools.partial(cached_msrp_value, bsw))
+
 	item_count = 0
 	data_tree = []
+	quota_skipped = []
 
 	#============================
 	# Process each itemID in the setIDs list
@@ -253,7 +282,14 @@ if __name__ == '__main__':
 		print(f"--- itemID: {itemID}")
 		item_count += 1
 		sys.stderr.write(".")
-		data = getAllData(itemID, rbw, bsw, blw)
+		try:
+			data = getAllData(itemID, rbw, bsw, blw)
+		except libbrick.rate_limiter.QuotaExceededError as error:
+			# sets deferred by the prefetch still need API calls; skip
+			# them so the sets gathered so far are still written
+			print(f"skipping {itemID}: {error}")
+			quota_skipped.append(itemID)
+			continue
 		if data is None:
 			continue
 
@@ -284,5 +320,8 @@ if __name__ == '__main__':
 	#============================
 
 	sys.stderr.write("\n")
+	if len(quota_skipped) > 0:
+		print(f"API quota spent: skipped {len(quota_skipped)} sets, run again later for: "
+			+ ', '.join(quota_skipped))
 	print(("Wrote %d lines to %s"%(len(data_tree), csvfile)))
 	print(("open %s"%(csvfile)))
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+# Standard Library
+import argparse
+
+# local repo modules
+import libbrick.wrappers.bricklink_wrapper as bricklink_wrapper
+
+#============================
+#============================
+def parse_args() -> argparse.Namespace:
+	"""
+	Parse command-line arguments.
+	"""
+	parser = argparse.ArgumentParser(
+		description='Refetch the oldest BrickLink cache entries within an API call budget')
+	parser.add_argument('-n', '--count', dest='count', metavar='N', type=int, default=100,
+		help='most cache entries to refresh (default: 100)')
+	parser.add_argument('-b', '--budget', dest='api_budget', metavar='N', type=int, default=400,
+		help='most BrickLink API calls to spend (default: 400)')
+	parser.add_argument('-a', '--min-age-days', dest='min_age_days', metavar='DAYS',
+		type=float, default=7,
+		help='skip entries fetched fewer than DAYS days ago (default: 7)')
+	parser.add_argument('-c', '--cache', dest='cache_names', action='append', default=None,
+		choices=('bricklink_price_cache', 'bricklink_part_cache',
+			'bricklink_set_cache', 'bricklink_minifig_cache'),
+		help='only refresh this cache, may be repeated (default: all)')
+	args = parser.parse_args()
+	return args
+
+#============================
+#============================
+def main():
+	"""
+	Refresh the oldest entries, then compact the caches.
+	"""
+	args = parse_args()
+	BLwrap = bricklink_wrapper.BrickLink()
+	min_age = args.min_age_days * 24 * 3600
+	refreshed = BLwrap.refresh_oldest(args.count, args.api_budget, min_age, args.cache_names)
+	BLwrap.close()
+	print(f"Refreshed {refreshed} cache entries")
+
+#============================
+#============================
+if __name__ == '__main__':
+	main()
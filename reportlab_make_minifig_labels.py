@@ -4,8 +4,6 @@
 import argparse
 import os
 import re
-import time
-import random
 
 # PIP3 modules
 import reportlab.lib.pagesizes
@@ -227,6 +225,9 @@ def build_pdf(minifig_info_tree: list[dict], output_dir: str, output_pdf: str,
 	"""
 	Build label records and render minifig labels PDF.
 	"""
+	# download and process every missing image first, as a pipeline
+	libbrick.image_cache.process_images([(minifig_dict.get("image_url"), "minifig",
+		minifig_dict.get("minifig_id")) for minifig_dict in minifig_info_tree])
 	labels = []
 	image_paths = []
 	for minifig_dict in minifig_info_tree:
@@ -261,13 +262,11 @@ def gather_minifig_data(minifig_id_pairs: list[tuple[str, str]]) -> list[dict]:
 		try:
 			category_name = blw.getCategoryNameFromMinifigID(minifig_id)
 		except LookupError:
-			time.sleep(random.random())
 			category_name = None
 
 		try:
 			superset_ids = blw.getSupersetFromMinifigID(minifig_id)
 		except LookupError:
-			time.sleep(random.random())
 			superset_ids = None
 
 		superset_count = None
@@ -46,6 +46,10 @@ def parse_args() -> argparse.Namespace:
 		"-C", "--no-calibration-page", dest="calibration_page",
 		action="store_false", help="Disable calibration page."
 	)
+	parser.add_argument(
+		"-S", "--stale-ok", dest="stale_ok", action="store_true",
+		help="Use expired BrickLink cache entries now and refresh them in the background."
+	)
 	parser.set_defaults(
 		draw_outlines=False,
 		calibration_page=False,
@@ -199,6 +203,9 @@ def build_pdf(set_data_tree: list[dict], msrp_cache: dict, output_dir: str, outp
 	"""
 	Build all label records and render the PDF.
 	"""
+	# download and process every missing image first, as a pipeline
+	libbrick.image_cache.process_images([(set_dict.get("set_img_url"), "set",
+		set_dict.get("set_id")) for set_dict in set_data_tree])
 	labels = []
 	image_paths = []
 	for set_dict in set_data_tree:
@@ -234,6 +241,8 @@ def main() -> None:
 		raise ValueError("No valid set IDs found")
 
 	blw = bricklink_wrapper.BrickLink()
+	if args.stale_ok is True:
+		blw.enable_stale_while_revalidate()
 	rbw = rebrick_wrapper.Rebrick()
 	msrp_cache = libbrick.msrp_loader.load_msrp_cache()
 
@@ -3,8 +3,6 @@
 import os
 import re
 import sys
-import time
-import random
 
 import libbrick.common
 import libbrick.image_cache
@@ -117,7 +115,9 @@ def download_minifig_image(minifig_dict: dict, minifig_id: str,
 	"""
 	image_url = minifig_dict.get('image_url')
 	return libbrick.image_cache.get_cached_image(
-		image_url, 'minifig', minifig_id, relpath_from=output_dir
+		image_url, 'minifig', minifig_id, relpath_from=output_dir,
+		# the \includegraphics box of legocell
+		box_in=(0.45, 0.65)
 	)
 
 #============================
@@ -244,13 +244,11 @@ def main() -> None:
 			# Fetch category name from BrickLink
 			category_name = BLW.getCategoryNameFromMinifigID(minifigID)
 		except LookupError:
-			time.sleep(random.random())
 			category_name = None
 
 		try:
 			superset_ids = BLW.getSupersetFromMinifigID(minifigID)
 		except LookupError:
-			time.sleep(random.random())
 			superset_ids = None
 
 		if superset_ids is None:
@@ -295,6 +293,10 @@ def main() -> None:
 	outfile = os.path.join(output_dir, f"labels-{filename_root}.tex")
 	pdffile = os.path.join(output_dir, f"labels-{filename_root}.pdf")
 
+	# Download and process every missing image first, as a pipeline
+	libbrick.image_cache.process_images([(minifig_dict.get('image_url'), 'minifig',
+		minifig_dict.get('minifig_id')) for minifig_dict in minifig_info_tree])
+
 	# Write the LaTeX labels to the output file
 	with open(outfile, 'w') as f:
 		f.write(latex_header)
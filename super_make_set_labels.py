@@ -72,7 +72,9 @@ def makeLabel(set_dict: dict, msrp_cache: dict, output_dir: str = None) -> str:
 	print(f'Processing Set {lego_id}')
 	image_url = set_dict.get('set_img_url')
 	filename = libbrick.image_cache.get_cached_image(
-		image_url, 'set', set_id, relpath_from=output_dir
+		image_url, 'set', set_id, relpath_from=output_dir,
+		# the \includegraphics box of legocell
+		box_in=(1.45, 1.95)
 	)
 
 	set_name = set_dict.get('name').replace('#', '').replace(' & ', ' and ')
@@ -139,6 +141,9 @@ def main():
 	output_dir = libbrick.path_utils.get_output_dir(subdir='super_make')
 	outfile = os.path.join(output_dir, f"labels-{filename_root}.tex")
 	pdffile = os.path.join(output_dir, f"labels-{filename_root}.pdf")
+	# download and process every missing image first, as a pipeline
+	libbrick.image_cache.process_images([(set_dict.get('set_img_url'), 'set',
+		set_dict.get('set_id')) for set_dict in set_data_tree])
 	with open(outfile, 'w') as f:
 		f.write(latex_header)
 		count = 0
@@ -0,0 +1,207 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import libbrick.path_utils
+import libbrick.rate_limiter
+import libbrick.wrappers.wrapper_base as wrapper_base
+import libbrick.wrappers.bricklink_wrapper as bricklink_wrapper
+import libbrick.wrappers.async_bricklink_wrapper as async_bricklink_wrapper
+
+
+#============================================
+def _price_guide(avg_price: str) -> dict:
+	"""
+	Build one price guide payload with ten sales at avg_price.
+	"""
+	detail = [{'quantity': 1, 'unit_price': avg_price} for _ in range(10)]
+	guide = {'avg_price': avg_price, 'total_quantity': 10, 'price_detail': detail}
+	return guide
+
+
+#============================================
+def _make_async_wrapper(monkeypatch, tmp_path, handler):
+	"""
+	AsyncBrickLink over a mock transport, with caches in tmp_path.
+	"""
+	monkeypatch.setenv(libbrick.path_utils.CACHE_DIR_ENV_VAR, str(tmp_path))
+	limiter = libbrick.rate_limiter.RateLimiter('api.bricklink.com', 1000.0, 100)
+	monkeypatch.setitem(libbrick.rate_limiter._limiters, 'api.bricklink.com', limiter)
+	blw = bricklink_wrapper.BrickLink()
+	blw.api_data = {'consumer_key': 'ck', 'consumer_secret': 'cs',
+		'token_value': 'tv', 'token_secret': 'ts'}
+	transport = httpx.MockTransport(handler)
+	ABL = async_bricklink_wrapper.AsyncBrickLink(blw, transport=transport)
+	return ABL
+
+
+#============================================
+def test_async_price_data_is_signed_concurrent_and_cached(monkeypatch, tmp_path):
+	"""
+	The four price guides go out signed on one client and land in the shared cache.
+	"""
+	seen = []
+	def handler(request):
+		seen.append(request)
+		guide = _price_guide('1.50' if 'new_or_used=N' in str(request.url) else '0.50')
+		return httpx.Response(200, json={'meta': {'code': 200}, 'data': guide})
+	ABL = _make_async_wrapper(monkeypatch, tmp_path, handler)
+
+	async def run():
+		price_data = await ABL.getPartPriceData('3001', 5)
+		# the second lookup is served from the cache shared with the sync wrapper
+		cached = await ABL.getPartPriceData('3001', 5)
+		await ABL.close()
+		return price_data, cached
+	price_data, cached = asyncio.run(run())
+
+	assert len(seen) == 4
+	assert all(request.headers['Authorization'].startswith('OAuth ') for request in seen)
+	assert all('color_id=5' in str(request.url) for request in seen)
+	assert price_data['new_median_sale_price'] == 150
+	assert price_data['used_median_sale_price'] == 50
+	assert cached['new_median_sale_price'] == 150
+	assert ABL.blw.bricklink_price_cache.get('3001_5')['used_median_list_price'] == 50
+	assert ABL.blw.api_calls == 4
+	ABL.blw.close()
+
+
+#============================================
+def test_async_set_data_resolves_category_and_reports_missing_items(monkeypatch, tmp_path):
+	"""
+	Set lookups fill the category name, an empty reply raises LookupError.
+	"""
+	def handler(request):
+		path = request.url.path
+		if path.endswith('/items/set/75151-1'):
+			data = {'no': '75151-1', 'name': 'Clone Turbo Tank', 'category_id': 65,
+				'year_released': 2016}
+		elif path.endswith('/categories/65'):
+			data = {'category_id': 65, 'category_name': 'Star Wars', 'parent_id': 0}
+		else:
+			return httpx.Response(404, json={'meta': {'code': 404}, 'data': {}})
+		return httpx.Response(200, json={'meta': {'code': 200}, 'data': data})
+	ABL = _make_async_wrapper(monkeypatch, tmp_path, handler)
+
+	async def run():
+		set_data = await ABL.getSetData('75151-1', verbose=False)
+		with pytest.raises(LookupError):
+			await ABL.getPartData('no-such-part', verbose=False)
+		await ABL.close()
+		return set_data
+	set_data = asyncio.run(run())
+
+	assert set_data['category_name'] == 'Star Wars'
+	assert set_data['set_id'] == '75151-1'
+	ABL.blw.close()
+
+
+#============================================
+def test_async_lookups_for_one_item_share_a_call(monkeypatch, tmp_path):
+	"""
+	Concurrent coroutines asking for the same part make one API call.
+	"""
+	seen = []
+	def handler(request):
+		seen.append(request)
+		data = {'no': '3001', 'name': 'Brick 2 x 4', 'year_released': 1958}
+		return httpx.Response(200, json={'meta': {'code': 200}, 'data': data})
+	ABL = _make_async_wrapper(monkeypatch, tmp_path, handler)
+
+	async def run():
+		results = await asyncio.gather(*[ABL.getPartData('3001', verbose=False) for _ in range(5)])
+		await ABL.close()
+		return results
+	results = asyncio.run(run())
+
+	assert len(seen) == 1
+	assert all(part_data['name'] == 'Brick 2 x 4' for part_data in results)
+	assert ABL.blw.shared_fetches == 4
+	ABL.blw.close()
+
+
+#============================================
+def test_async_client_retries_with_the_wrapper_policy(monkeypatch, tmp_path):
+	"""
+	A transient 503 is retried under the sync wrapper's policy and counted there.
+	"""
+	seen = []
+	def handler(request):
+		seen.append(request)
+		if len(seen) == 1:
+			return httpx.Response(503, json={'meta': {'code': 503}, 'data': {}})
+		data = {'no': '3001', 'name': 'Brick 2 x 4', 'year_released': 1958}
+		return httpx.Response(200, json={'meta': {'code': 200}, 'data': data})
+	ABL = _make_async_wrapper(monkeypatch, tmp_path, handler)
+	ABL.blw.retry_policy = wrapper_base.RetryPolicy(max_attempts=3, base_delay=0.0)
+
+	async def run():
+		part_data = await ABL.getPartData('3001', verbose=False)
+		await ABL.close()
+		return part_data
+	part_data = asyncio.run(run())
+
+	assert part_data['name'] == 'Brick 2 x 4'
+	assert ABL.blw.api_retries == 1
+	ABL.blw.close()
+
+
+#============================================
+def test_async_request_is_signed_after_the_rate_limit_wait(monkeypatch, tmp_path):
+	"""
+	The OAuth nonce and timestamp are made after the limiter lets the call go.
+	"""
+	def handler(request):
+		data = {'no': '3001', 'name': 'Brick 2 x 4', 'year_released': 1958}
+		return httpx.Response(200, json={'meta': {'code': 200}, 'data': data})
+	ABL = _make_async_wrapper(monkeypatch, tmp_path, handler)
+	events = []
+	limiter = libbrick.rate_limiter.get_limiter('api.bricklink.com')
+	original_wait = limiter.wait_async
+	async def recording_wait(endpoint=None):
+		events.append('wait')
+		return await original_wait(endpoint)
+	monkeypatch.setattr(limiter, 'wait_async', recording_wait)
+	original_sign = ABL._sign
+	def recording_sign(url):
+		events.append('sign')
+		return original_sign(url)
+	monkeypatch.setattr(ABL, '_sign', recording_sign)
+
+	async def run():
+		await ABL.getPartData('3001', verbose=False)
+		await ABL.close()
+	asyncio.run(run())
+
+	assert events == ['wait', 'sign']
+	ABL.blw.close()
+
+
+#============================================
+def test_async_cache_reads_and_writes_run_off_the_event_loop(monkeypatch, tmp_path):
+	"""
+	The blocking cache helpers shared with BrickLink run in worker threads.
+	"""
+	def handler(request):
+		data = {'no': '3001', 'name': 'Brick 2 x 4', 'year_released': 1958}
+		return httpx.Response(200, json={'meta': {'code': 200}, 'data': data})
+	ABL = _make_async_wrapper(monkeypatch, tmp_path, handler)
+	threads = []
+	for name in ('cachedItemData', 'storeItemData'):
+		original = getattr(ABL.blw, name)
+		def recording(*args, original=original):
+			threads.append(threading.get_ident())
+			return original(*args)
+		monkeypatch.setattr(ABL.blw, name, recording)
+
+	async def run():
+		await ABL.getPartData('3001', verbose=False)
+		await ABL.close()
+		return threading.get_ident()
+	loop_thread = asyncio.run(run())
+
+	assert len(threads) == 2
+	assert loop_thread not in threads
+	ABL.blw.close()
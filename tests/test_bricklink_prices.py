@@ -0,0 +1,188 @@
+import threading
+
+import libbrick.path_utils
+import libbrick.rate_limiter
+import libbrick.wrappers.bricklink_wrapper as bricklink_wrapper
+
+
+#============================================
+def _price_guide(avg_price: str) -> dict:
+	"""
+	Build one price guide payload with ten sales at avg_price.
+	"""
+	detail = [{'quantity': 1, 'unit_price': avg_price} for _ in range(10)]
+	guide = {'avg_price': avg_price, 'total_quantity': 10, 'price_detail': detail}
+	return guide
+
+
+#============================================
+def _use_fast_limiter(monkeypatch, tmp_path, daily_limit: int = 5000):
+	"""
+	Swap in a fast BrickLink limiter whose quota ledger lives in tmp_path.
+	"""
+	quota_path = str(tmp_path / 'api_quota.json')
+	limiter = libbrick.rate_limiter.RateLimiter('api.bricklink.com', 1000.0, 100,
+		daily_limit, quota_path)
+	monkeypatch.setitem(libbrick.rate_limiter._limiters, 'api.bricklink.com', limiter)
+	return limiter
+
+
+#============================================
+def test_prefetch_price_data_skips_cached_and_missing_items(monkeypatch, tmp_path):
+	"""
+	Only uncached items are fetched, four guides each, and a missing item is skipped.
+	"""
+	monkeypatch.setenv(libbrick.path_utils.CACHE_DIR_ENV_VAR, str(tmp_path))
+	_use_fast_limiter(monkeypatch, tmp_path)
+	BLW = bricklink_wrapper.BrickLink()
+	urls = []
+	urls_lock = threading.Lock()
+	def fake_fetch(url):
+		with urls_lock:
+			urls.append(url)
+		if url.startswith('items/part/9999/'):
+			raise LookupError
+		return _price_guide('2.00')
+	monkeypatch.setattr(BLW, '_bricklink_fetch', fake_fetch)
+	cached = BLW.compilePriceData('3001', _price_guide('1.00'), _price_guide('1.00'),
+		_price_guide('1.00'), _price_guide('1.00'), color_id=5, verbose=False)
+	items = [
+		('part', '3001', 5),
+		('part', '3001', 11),
+		('part', '3001', 11),
+		('set', '75151-1', None),
+		('part', '9999', 1),
+	]
+	fetched = BLW.prefetchPriceData(items, workers=3)
+	assert fetched == 2
+	assert len(urls) == 12
+	assert not any('color_id=5' in url for url in urls)
+	assert BLW.bricklink_price_cache['3001_11']['new_median_sale_price'] == 200
+	assert BLW.bricklink_price_cache['75151-1']['used_median_list_price'] == 200
+	assert BLW.bricklink_price_cache['3001_5'] == cached
+	assert '9999_1' not in BLW.bricklink_price_cache
+	BLW.close()
+
+
+#============================================
+def test_prefetch_price_data_spends_a_short_budget_on_high_value_items(monkeypatch, tmp_path):
+	"""
+	With quota left for two items, the two highest MSRP sets are fetched.
+	"""
+	monkeypatch.setenv(libbrick.path_utils.CACHE_DIR_ENV_VAR, str(tmp_path))
+	_use_fast_limiter(monkeypatch, tmp_path, daily_limit=10)
+	BLW = bricklink_wrapper.BrickLink()
+	urls = []
+	urls_lock = threading.Lock()
+	def fake_fetch(url):
+		with urls_lock:
+			urls.append(url)
+		return _price_guide('2.00')
+	monkeypatch.setattr(BLW, '_bricklink_fetch', fake_fetch)
+	msrp = {'10001-1': 1999, '10002-1': 79999, '10003-1': 4999}
+	items = [('set', setID, None) for setID in msrp]
+	fetched = BLW.prefetchPriceData(items, value=lambda item: msrp[item[1]])
+	assert fetched == 2
+	assert len(urls) == 8
+	assert '10002-1' in BLW.bricklink_price_cache
+	assert '10003-1' in BLW.bricklink_price_cache
+	assert '10001-1' not in BLW.bricklink_price_cache
+	BLW.close()
+
+
+#============================================
+def test_raw_price_guides_serve_min_qty_variants_offline(monkeypatch, tmp_path):
+	"""
+	After one fetch, other min_qty values and expired recomputes make no API calls.
+	"""
+	monkeypatch.setenv(libbrick.path_utils.CACHE_DIR_ENV_VAR, str(tmp_path))
+	BLW = bricklink_wrapper.BrickLink()
+	urls = []
+	def fake_fetch(url):
+		urls.append(url)
+		# ten single units at 1.00 and one lot of five at 3.00
+		guide = _price_guide('1.00')
+		guide['price_detail'].append({'quantity': 5, 'unit_price': '3.0000'})
+		guide['total_quantity'] = 15
+		return guide
+	monkeypatch.setattr(BLW, '_bricklink_fetch', fake_fetch)
+	price_data = BLW.getPartPriceData('3001', 5)
+	assert len(urls) == 4
+	assert price_data['new_median_sale_price'] == 100
+	# only the lot of five is left with min_qty=3, still no new calls
+	bulk_data = BLW.getPartPriceData('3001', 5, min_qty=3)
+	assert len(urls) == 4
+	assert bulk_data['new_median_sale_price'] == -1
+	stored = BLW.bricklink_price_guide_cache['3001_5']['guides']['sold_N']
+	assert stored['quantity'][-1] == 5 and stored['unit_price'][-1] == 3.0
+	# expired guides are refetched by lookups but still usable offline
+	entry = BLW.bricklink_price_guide_cache['3001_5']
+	entry['time'] = 0
+	BLW.bricklink_price_guide_cache['3001_5'] = entry
+	assert BLW.recomputePriceData('3001', 5)['used_median_sale_price'] == 100
+	assert BLW.recomputePriceData('3002', 5) is None
+	assert len(urls) == 4
+	BLW.close()
+
+
+#============================================
+def test_refresh_oldest_uses_stored_item_type_and_keeps_data_on_failure(monkeypatch, tmp_path):
+	"""
+	Price entries are refetched by their stored type; a failed refetch keeps the old entry.
+	"""
+	monkeypatch.setenv(libbrick.path_utils.CACHE_DIR_ENV_VAR, str(tmp_path))
+	_use_fast_limiter(monkeypatch, tmp_path)
+	BLW = bricklink_wrapper.BrickLink()
+	urls = []
+	def fake_fetch(url):
+		urls.append(url)
+		if url.startswith('items/set/'):
+			raise LookupError(url)
+		return _price_guide('2.00')
+	monkeypatch.setattr(BLW, '_bricklink_fetch', fake_fetch)
+	guides = [_price_guide('1.00')] * 4
+	# a minifig ID without '-' or a cached minifig entry looked like a part before
+	for item_type, item_id in (('minifig', 'col001'), ('set', '10001-1')):
+		BLW.storePriceGuides(item_id, None, guides)
+		BLW.compilePriceData(item_id, *guides, verbose=False, item_type=item_type)
+		entry = BLW.bricklink_price_cache[item_id]
+		entry['time'] = 100
+		BLW.bricklink_price_cache[item_id] = entry
+	assert BLW.refresh_oldest(10, api_budget=100, cache_names=['bricklink_price_cache']) == 1
+	assert all(url.startswith(('items/minifig/col001/', 'items/set/10001-1/')) for url in urls)
+	assert BLW.bricklink_price_cache['col001']['new_median_sale_price'] == 200
+	assert BLW.bricklink_price_cache['10001-1']['new_median_sale_price'] == 100
+	BLW.close()
+
+
+#============================================
+def test_image_checks_from_many_threads_share_one_session(monkeypatch, tmp_path):
+	"""
+	Threads checking images at the same time build one HTTP session, not one each.
+	"""
+	monkeypatch.setenv(libbrick.path_utils.CACHE_DIR_ENV_VAR, str(tmp_path))
+	limiter = libbrick.rate_limiter.RateLimiter('img.example.com', 1000.0, 100)
+	monkeypatch.setitem(libbrick.rate_limiter._limiters, 'img.example.com', limiter)
+	sessions = []
+	# a second session build can only pass the barrier if both threads build at once
+	barrier = threading.Barrier(2)
+	class FakeSession(object):
+		def __init__(self):
+			sessions.append(self)
+			self.headers = {}
+			try:
+				barrier.wait(timeout=0.2)
+			except threading.BrokenBarrierError:
+				pass
+		def get(self, url, timeout):
+			return type('FakeResponse', (), {'status_code': 200})()
+	monkeypatch.setattr(bricklink_wrapper.requests, 'Session', FakeSession)
+	BLW = bricklink_wrapper.BrickLink()
+	threads = [threading.Thread(target=BLW.image_exists, args=(f"https://img.example.com/{i}.jpg", False))
+		for i in range(2)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert len(sessions) == 1
+	BLW.close()
@@ -0,0 +1,49 @@
+import io
+import json
+
+import pytest
+
+import libbrick.path_utils
+import libbrick.rate_limiter
+import libbrick.wrappers.wrapper_base as wrapper_base
+import libbrick.wrappers.brickset_wrapper as brickset_wrapper
+
+
+#============================================
+def _make_brickset(monkeypatch, tmp_path, matches: int):
+	"""
+	BrickSet wrapper whose get_set call answers with matches sets.
+	"""
+	(tmp_path / 'brickset_api_private.yml').write_text('web_services_key_2: test-key\n')
+	monkeypatch.setattr(libbrick.path_utils, 'get_git_root', lambda: str(tmp_path))
+	monkeypatch.setenv(libbrick.path_utils.CACHE_DIR_ENV_VAR, str(tmp_path))
+	limiter = libbrick.rate_limiter.RateLimiter('brickset.com', 1000.0, 100)
+	monkeypatch.setitem(libbrick.rate_limiter._limiters, 'brickset.com', limiter)
+	sets = [{'number': '75151', 'numberVariant': 1, 'name': 'Clone Turbo Tank', 'year': 2016}]
+	reply = {'status': 'success', 'matches': matches, 'sets': sets * matches}
+	def fake_get_set(set_number, extended_data=False):
+		return io.BytesIO(json.dumps(reply).encode('utf-8'))
+	monkeypatch.setattr(brickset_wrapper.brickse.lego, 'get_set', fake_get_set)
+	bsw = brickset_wrapper.BrickSet()
+	return bsw
+
+
+#============================================
+def test_set_lookup_with_no_match_is_not_found(monkeypatch, tmp_path):
+	"""
+	Zero matches means the set does not exist.
+	"""
+	bsw = _make_brickset(monkeypatch, tmp_path, 0)
+	with pytest.raises(wrapper_base.NotFoundError):
+		bsw.getSetDataDirect('75151-1', verbose=False)
+
+
+#============================================
+def test_set_lookup_with_several_matches_is_an_api_error(monkeypatch, tmp_path):
+	"""
+	Several matches for a full set number is a server error, not a missing set.
+	"""
+	bsw = _make_brickset(monkeypatch, tmp_path, 2)
+	with pytest.raises(wrapper_base.ApiError) as error:
+		bsw.getSetDataDirect('75151-1', verbose=False)
+	assert not isinstance(error.value, LookupError)
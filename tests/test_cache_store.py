@@ -0,0 +1,399 @@
+import os
+import json
+import time
+import threading
+import concurrent.futures
+
+import pytest
+
+import libbrick.path_utils
+import libbrick.wrappers.cache_store as cache_store
+import libbrick.wrappers.wrapper_base as wrapper_base
+
+
+#============================================
+class _SqliteWrapper(wrapper_base.BaseWrapperClass):
+	"""
+	Minimal wrapper with one sqlite-backed cache.
+	"""
+	def __init__(self):
+		self.data_caches = {'test_sqlite_cache': 'sqlite'}
+		self.start()
+
+
+#============================================
+class _FileWrapper(wrapper_base.BaseWrapperClass):
+	"""
+	Minimal wrapper with one JSON and one YAML cache.
+	"""
+	def __init__(self):
+		self.data_caches = {'test_json_cache': 'json', 'test_yml_cache': 'yml'}
+		self.start()
+
+
+#============================================
+def test_sqlite_cache_keeps_int_and_str_keys_apart(tmp_path):
+	"""
+	Int and str keys are stored as separate rows and survive a reopen.
+	"""
+	db_path = os.path.join(str(tmp_path), cache_store.SQLITE_DB_NAME)
+	store = cache_store.SqliteCacheStore(db_path)
+	store.ensure_table('test_cache')
+	cache = cache_store.SqliteCacheDict(store, 'test_cache')
+	cache[1234] = ['3001', 5]
+	cache['1234'] = 'text'
+	store.close()
+	store = cache_store.SqliteCacheStore(db_path)
+	cache = cache_store.SqliteCacheDict(store, 'test_cache')
+	assert cache[1234] == ['3001', 5]
+	assert cache.get('1234') == 'text'
+
+
+#============================================
+def test_sqlite_cache_writes_through_without_close(tmp_path):
+	"""
+	A value set on one connection is visible to a second one right away.
+	"""
+	db_path = os.path.join(str(tmp_path), cache_store.SQLITE_DB_NAME)
+	store = cache_store.SqliteCacheStore(db_path)
+	store.ensure_table('test_cache')
+	cache = cache_store.SqliteCacheDict(store, 'test_cache')
+	cache['3001_5'] = {'time': 1}
+	other = cache_store.SqliteCacheDict(cache_store.SqliteCacheStore(db_path), 'test_cache')
+	assert other['3001_5'] == {'time': 1}
+
+
+#============================================
+def test_wrapper_migrates_legacy_json_into_sqlite(monkeypatch, tmp_path):
+	"""
+	Switching a cache to sqlite imports the old JSON file on first load.
+	"""
+	cache_dir = os.path.join(str(tmp_path), "CACHE")
+	os.mkdir(cache_dir)
+	with open(os.path.join(cache_dir, "test_sqlite_cache.json"), "w") as f:
+		json.dump({"3001_5": {"time": 1}}, f)
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	wrapper = _SqliteWrapper()
+	wrapper.test_sqlite_cache["3002_5"] = {"time": 2}
+	wrapper.close()
+	wrapper = _SqliteWrapper()
+	assert sorted(wrapper.test_sqlite_cache.keys()) == ["3001_5", "3002_5"]
+	wrapper.close()
+
+
+#============================================
+def test_file_caches_parse_only_when_touched(monkeypatch, tmp_path):
+	"""
+	Only the cache that is used gets parsed, and untouched caches are not rewritten.
+	"""
+	cache_dir = os.path.join(str(tmp_path), "CACHE")
+	os.mkdir(cache_dir)
+	with open(os.path.join(cache_dir, "test_json_cache.json"), "w") as f:
+		json.dump({"a": 1}, f)
+	with open(os.path.join(cache_dir, "test_yml_cache.yml"), "w") as f:
+		f.write("b: 2\n")
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	parsed = []
+	original_read = wrapper_base.BaseWrapperClass._read_cache_file
+	def counting_read(self, file_name, cache_format):
+		parsed.append(cache_format)
+		return original_read(self, file_name, cache_format)
+	monkeypatch.setattr(wrapper_base.BaseWrapperClass, "_read_cache_file", counting_read)
+	wrapper = _FileWrapper()
+	assert wrapper.test_json_cache.get("a") == 1
+	wrapper.close()
+	assert parsed == ["json"]
+
+
+#============================================
+def test_journal_survives_a_crash_and_compacts_on_close(monkeypatch, tmp_path):
+	"""
+	Writes reach the journal immediately and are folded into the file at close().
+	"""
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	crashed = _FileWrapper()
+	crashed.test_yml_cache[6012345] = ["3001", 5]
+	# no close(): the journal alone must carry the entry
+	wrapper = _FileWrapper()
+	assert wrapper.test_yml_cache[6012345] == ["3001", 5]
+	wrapper.close()
+	journal_path = os.path.join(str(tmp_path), "CACHE", "test_yml_cache.journal.jsonl")
+	assert not os.path.exists(journal_path)
+	assert _FileWrapper().test_yml_cache[6012345] == ["3001", 5]
+
+
+#============================================
+def test_torn_journal_line_is_dropped_before_the_next_append(monkeypatch, tmp_path):
+	"""
+	A half-written last line does not corrupt entries appended after it.
+	"""
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	crashed = _FileWrapper()
+	crashed.test_json_cache["75192-1"] = {"time": 1}
+	journal_path = os.path.join(str(tmp_path), "CACHE", "test_json_cache.journal.jsonl")
+	with open(journal_path, "a") as f:
+		f.write('{"key": "10294-1", "val')
+	second = _FileWrapper()
+	second.test_json_cache["10497-1"] = {"time": 3}
+	reloaded = _FileWrapper().test_json_cache
+	assert sorted(reloaded.keys()) == ["10497-1", "75192-1"]
+	second.close()
+
+
+#============================================
+def test_two_writers_sharing_a_cache_keep_both_entries(monkeypatch, tmp_path):
+	"""
+	Two wrappers writing the same cache file both keep their entries.
+	"""
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	first = _FileWrapper()
+	second = _FileWrapper()
+	first.test_json_cache["75192-1"] = {"time": 1}
+	second.test_json_cache["10294-1"] = {"time": 2}
+	first.close()
+	second.close()
+	merged = _FileWrapper().test_json_cache
+	assert sorted(merged.keys()) == ["10294-1", "75192-1"]
+
+
+#============================================
+class _MsgpackWrapper(wrapper_base.BaseWrapperClass):
+	"""
+	Minimal wrapper with one msgpack cache.
+	"""
+	def __init__(self):
+		self.data_caches = {'test_json_cache': 'msgpack'}
+		self.start()
+
+
+#============================================
+def test_msgpack_cache_migrates_legacy_json_and_records_timings(monkeypatch, tmp_path):
+	"""
+	Switching a JSON cache to msgpack converts the file on first load.
+	"""
+	cache_dir = os.path.join(str(tmp_path), "CACHE")
+	os.mkdir(cache_dir)
+	with open(os.path.join(cache_dir, "test_json_cache.json"), "w") as f:
+		json.dump({"75192-1": {"time": 1}}, f)
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	wrapper = _MsgpackWrapper()
+	assert wrapper.test_json_cache["75192-1"] == {"time": 1}
+	assert os.path.isfile(os.path.join(cache_dir, "test_json_cache.msgpack"))
+	assert wrapper.cache_timings[0]['action'] == 'migrated'
+	wrapper.test_json_cache[6012345] = ["3001", 5]
+	wrapper.close()
+	wrapper = _MsgpackWrapper()
+	# msgpack keeps int keys as ints
+	assert wrapper.test_json_cache[6012345] == ["3001", 5]
+	assert wrapper.cache_timings[0]['format'] == 'msgpack'
+
+
+#============================================
+def test_yaml_overrides_win_and_are_not_rewritten(monkeypatch, tmp_path):
+	"""
+	Entries in <cache_name>_overrides.yml take precedence and survive compaction.
+	"""
+	cache_dir = os.path.join(str(tmp_path), "CACHE")
+	os.mkdir(cache_dir)
+	overrides_path = os.path.join(cache_dir, "test_json_cache_overrides.yml")
+	with open(overrides_path, "w") as f:
+		f.write("'3001,5': 300105\n")
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	wrapper = _MsgpackWrapper()
+	wrapper.test_json_cache["3001,5"] = 999999
+	wrapper.test_json_cache["3002,5"] = 300205
+	assert wrapper.test_json_cache["3001,5"] == 300105
+	assert wrapper.test_json_cache.is_override("3001,5")
+	assert sorted(wrapper.test_json_cache.keys()) == ["3001,5", "3002,5"]
+	wrapper.close()
+	with open(overrides_path, "r") as f:
+		assert f.read() == "'3001,5': 300105\n"
+	assert _MsgpackWrapper().test_json_cache.get("3001,5") == 300105
+
+
+#============================================
+def test_purge_entries_drops_expired_then_coldest():
+	"""
+	TTL removes stale stamped entries, then LRU trims down to max_entries.
+	"""
+	data = {
+		'old': {'time': 100},
+		'warm': {'time': 900},
+		'cold': {'time': 800},
+		'name': 'Brick',
+	}
+	removed = cache_store.purge_entries(data, max_entries=2, ttl=500, now=1000,
+		last_used={'name': 950})
+	assert sorted(removed) == ['cold', 'old']
+	assert sorted(data.keys()) == ['name', 'warm']
+
+
+#============================================
+def test_sqlite_purge_keeps_recently_used_rows(tmp_path):
+	"""
+	Rows read in this run survive a max_entries purge, and the memory copy is bounded.
+	"""
+	db_path = os.path.join(str(tmp_path), cache_store.SQLITE_DB_NAME)
+	store = cache_store.SqliteCacheStore(db_path)
+	store.ensure_table('test_cache')
+	store.upsert_values('test_cache', [(n, {'time': n}) for n in range(1, 6)])
+	cache = cache_store.SqliteCacheDict(store, 'test_cache', max_memory_entries=2)
+	for key in (1, 2, 3):
+		assert cache[key] == {'time': key}
+	assert list(cache._values.keys()) == [2, 3]
+	cache.flush_usage()
+	assert store.purge('test_cache', max_entries=3, ttl=None) == 2
+	assert sorted(store.list_keys('test_cache')) == [1, 2, 3]
+	assert store.purge('test_cache', ttl=10, now=12.5) == 2
+	assert sorted(store.list_keys('test_cache')) == [3]
+
+
+#============================================
+class _RefreshWrapper(wrapper_base.BaseWrapperClass):
+	"""
+	Minimal wrapper that records refreshes instead of calling an API.
+	"""
+	def __init__(self):
+		self.data_caches = {'test_sqlite_cache': 'sqlite', 'test_json_cache': 'json'}
+		self.refresh_caches = ('test_sqlite_cache', 'test_json_cache')
+		self.refreshed = []
+		self.start()
+
+	def _refresh_cache_entry(self, cache_name, key):
+		self.api_calls += 2
+		self.refreshed.append(key)
+		getattr(self, cache_name)[key] = {'time': 2000000000}
+
+
+#============================================
+def test_refresh_oldest_walks_oldest_first_within_budget(monkeypatch, tmp_path):
+	"""
+	The planner refreshes the oldest stamped entries and stops at the API budget.
+	"""
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	wrapper = _RefreshWrapper()
+	wrapper.test_sqlite_cache['p3'] = {'time': 300}
+	wrapper.test_sqlite_cache['p1'] = {'time': 100}
+	wrapper.test_json_cache['s2'] = {'time': 200}
+	wrapper.test_json_cache['s4'] = {'time': 400}
+	wrapper.test_json_cache['name'] = 'no stamp'
+	plan = wrapper.plan_refresh(3)
+	assert [key for stamp, cache_name, key in plan] == ['p1', 's2', 'p3']
+	assert wrapper.refresh_oldest(10, api_budget=3) == 2
+	assert wrapper.refreshed == ['p1', 's2']
+	assert wrapper.test_json_cache['s2'] == {'time': 2000000000}
+	wrapper.close()
+
+
+#============================================
+def test_refresh_oldest_rejects_a_cache_without_refresh(monkeypatch, tmp_path):
+	"""
+	Only caches listed in refresh_caches can be planned.
+	"""
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	wrapper = _SqliteWrapper()
+	with pytest.raises(ValueError):
+		wrapper.refresh_oldest(10, api_budget=10, cache_names=['test_sqlite_cache'])
+	wrapper.close()
+
+
+#============================================
+def test_stale_while_revalidate_serves_stale_and_refreshes_in_background(monkeypatch, tmp_path):
+	"""
+	An expired entry is used at once and rewritten by the background refresher.
+	"""
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	wrapper = _RefreshWrapper()
+	wrapper.test_sqlite_cache['p1'] = {'time': 100}
+	wrapper.enable_stale_while_revalidate()
+	stale = wrapper.test_sqlite_cache['p1']
+	assert wrapper.check_if_data_valid(stale, 'test_sqlite_cache', 'p1') is True
+	# an entry without a cache name is not refreshable and stays invalid
+	assert wrapper.check_if_data_valid(stale) is False
+	# let the queued refresh finish, close() alone would drop it
+	wrapper._stop_background_refresh(drop_pending=False)
+	wrapper.close()
+	assert _RefreshWrapper().test_sqlite_cache['p1'] == {'time': 2000000000}
+
+
+#============================================
+class _FlakyRefreshWrapper(_RefreshWrapper):
+	"""
+	Refresh wrapper whose API fails for one key.
+	"""
+	def _refresh_cache_entry(self, cache_name, key):
+		if key == 'p1':
+			raise wrapper_base.TransientError("HTTP 503")
+		super()._refresh_cache_entry(cache_name, key)
+
+
+#============================================
+def test_background_refresh_survives_a_failed_entry(monkeypatch, tmp_path):
+	"""
+	An API error on one queued entry does not stop the refresh of the next.
+	"""
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	wrapper = _FlakyRefreshWrapper()
+	wrapper.test_sqlite_cache['p1'] = {'time': 100}
+	wrapper.test_sqlite_cache['p2'] = {'time': 100}
+	wrapper.enable_stale_while_revalidate()
+	for key in ('p1', 'p2'):
+		wrapper.check_if_data_valid(wrapper.test_sqlite_cache[key], 'test_sqlite_cache', key)
+	wrapper._stop_background_refresh(drop_pending=False)
+	wrapper.close()
+	assert _RefreshWrapper().test_sqlite_cache['p2'] == {'time': 2000000000}
+
+
+#============================================
+def test_sqlite_cache_is_shared_by_worker_threads(tmp_path):
+	"""
+	Worker threads read and write one SqliteCacheDict through their own connections.
+	"""
+	db_path = os.path.join(str(tmp_path), cache_store.SQLITE_DB_NAME)
+	store = cache_store.SqliteCacheStore(db_path)
+	store.ensure_table('test_cache')
+	cache = cache_store.SqliteCacheDict(store, 'test_cache', max_memory_entries=8)
+	def write_and_read(n):
+		cache[f"3001_{n}"] = {'time': n}
+		return cache[f"3001_{n}"]['time']
+	with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+		results = list(pool.map(write_and_read, range(40)))
+	assert results == list(range(40))
+	assert len(cache) == 40
+	store.close()
+
+
+#============================================
+def test_single_flight_shares_one_fetch_between_threads(monkeypatch, tmp_path):
+	"""
+	Threads asking for the same key while it is in flight get the leader's result.
+	"""
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	wrapper = _SqliteWrapper()
+	started = threading.Event()
+	release = threading.Event()
+	calls = []
+	def fetch():
+		calls.append(1)
+		started.set()
+		release.wait(5)
+		return {'no': '3001'}
+	def follower():
+		started.wait(5)
+		return wrapper.single_flight('items/part/3001', fetch)
+	with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+		leader = pool.submit(wrapper.single_flight, 'items/part/3001', fetch)
+		followers = [pool.submit(follower) for _ in range(3)]
+		# let the followers reach the wait before the fetch finishes
+		while wrapper.shared_fetches < 3:
+			time.sleep(0.01)
+		release.set()
+		results = [leader.result()] + [future.result() for future in followers]
+	assert len(calls) == 1
+	assert all(result is results[0] for result in results)
+	# the key is forgotten once done, so a new fetch runs and its error is raised
+	def missing_part():
+		raise LookupError
+	with pytest.raises(LookupError):
+		wrapper.single_flight('items/part/3001', missing_part)
+	wrapper.close()
@@ -0,0 +1,172 @@
+import gzip
+import time
+import types
+
+import PIL.Image
+
+import libbrick.image_cache
+import libbrick.catalog_import
+import libbrick.path_utils
+import libbrick.wrappers.bricklink_wrapper as bricklink_wrapper
+import super_make_minifig_labels
+
+CATEGORIES_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<CATALOG>
+<ITEM><CATEGORY>5</CATEGORY><CATEGORYNAME>Brick</CATEGORYNAME></ITEM>
+<ITEM><CATEGORY>65</CATEGORY><CATEGORYNAME>Star Wars</CATEGORYNAME></ITEM>
+<ITEM><CATEGORY>66</CATEGORY><CATEGORYNAME>Star Wars / Star Wars Episode 3</CATEGORYNAME></ITEM>
+<ITEM><CATEGORY>67</CATEGORY><CATEGORYNAME>Town / City</CATEGORYNAME></ITEM>
+</CATALOG>
+"""
+
+COLORS_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<CATALOG>
+<ITEM><COLOR>1</COLOR><COLORNAME>White</COLORNAME><COLORRGB>FFFFFF</COLORRGB><COLORTYPE>Solid</COLORTYPE></ITEM>
+<ITEM><COLOR>5</COLOR><COLORNAME>Red</COLORNAME><COLORRGB>B30006</COLORRGB><COLORTYPE>Solid</COLORTYPE></ITEM>
+</CATALOG>
+"""
+
+# the bare ampersand is how BrickLink downloads really look
+ITEMS_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<CATALOG>
+<ITEM><ITEMTYPE>S</ITEMTYPE><ITEMID>75151-1</ITEMID><ITEMNAME>Clone Turbo Tank</ITEMNAME>
+<CATEGORY>66</CATEGORY><ITEMYEAR>2016</ITEMYEAR><ITEMWEIGHT>1452.2</ITEMWEIGHT></ITEM>
+<ITEM><ITEMTYPE>P</ITEMTYPE><ITEMID>3001</ITEMID><ITEMNAME>Brick 2 x 4</ITEMNAME>
+<CATEGORY>5</CATEGORY><ITEMYEAR>1958</ITEMYEAR><ITEMWEIGHT>2.32</ITEMWEIGHT>
+<ITEMDIMX>2</ITEMDIMX><ITEMDIMY>4</ITEMDIMY><ITEMDIMZ>1</ITEMDIMZ></ITEM>
+<ITEM><ITEMTYPE>P</ITEMTYPE><ITEMID>3002</ITEMID><ITEMNAME>Brick 2 x 3</ITEMNAME>
+<CATEGORY>5</CATEGORY><ITEMYEAR>1954</ITEMYEAR><ITEMWEIGHT>1.76</ITEMWEIGHT></ITEM>
+<ITEM><ITEMTYPE>M</ITEMTYPE><ITEMID>sw0001a</ITEMID><ITEMNAME>Battle Droid Tan & Black</ITEMNAME>
+<CATEGORY>65</CATEGORY><ITEMYEAR>1999</ITEMYEAR></ITEM>
+<ITEM><ITEMTYPE>G</ITEMTYPE><ITEMID>852</ITEMID><ITEMNAME>Key Chain</ITEMNAME><CATEGORY>5</CATEGORY></ITEM>
+</CATALOG>
+"""
+
+CODES_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<CODES>
+<ITEM><ITEMTYPE>P</ITEMTYPE><ITEMID>3001</ITEMID><COLOR>Red</COLOR><CODENAME>300121</CODENAME></ITEM>
+<ITEM><ITEMTYPE>P</ITEMTYPE><ITEMID>3001</ITEMID><COLOR>Red</COLOR><CODENAME>4181134</CODENAME></ITEM>
+<ITEM><ITEMTYPE>P</ITEMTYPE><ITEMID>3001</ITEMID><COLOR>White</COLOR><CODENAME>300101</CODENAME></ITEM>
+<ITEM><ITEMTYPE>P</ITEMTYPE><ITEMID>3001</ITEMID><COLOR>Chrome Gold</COLOR><CODENAME>999999</CODENAME></ITEM>
+</CODES>
+"""
+
+
+#============================================
+def _write(tmp_path, name: str, text: str) -> str:
+	"""
+	Write a fixture file into tmp_path and return its path.
+	"""
+	file_path = tmp_path / name
+	if name.endswith('.gz'):
+		with gzip.open(file_path, 'wt') as f:
+			f.write(text)
+	else:
+		file_path.write_text(text)
+	return str(file_path)
+
+
+#============================================
+def test_bricklink_catalog_serves_getters_offline(monkeypatch, tmp_path):
+	"""
+	After importing the four catalog files, lookups make no API calls.
+	"""
+	monkeypatch.setenv(libbrick.path_utils.CACHE_DIR_ENV_VAR, str(tmp_path))
+	BLW = bricklink_wrapper.BrickLink()
+	def no_api(url):
+		raise AssertionError(f"unexpected API call {url}")
+	monkeypatch.setattr(BLW, '_bricklink_fetch', no_api)
+	# an API entry already cached is richer than the catalog, keep it
+	BLW.bricklink_part_cache['3001'] = {'no': '3001', 'name': 'Brick 2 x 4', 'type': 'PART',
+		'category_id': 5, 'image_url': '//img.bricklink.com/PL/3001.jpg', 'time': int(time.time())}
+	files = [
+		_write(tmp_path, 'codes.xml', CODES_XML),
+		_write(tmp_path, 'items.xml', ITEMS_XML),
+		_write(tmp_path, 'colors.xml', COLORS_XML),
+		_write(tmp_path, 'categories.xml', CATEGORIES_XML),
+	]
+	kinds = {file_path: libbrick.catalog_import.detect_catalog_kind(file_path) for file_path in files}
+	assert sorted(kinds.values()) == ['bricklink_categories', 'bricklink_codes',
+		'bricklink_colors', 'bricklink_items']
+	counts = {}
+	for kind in libbrick.catalog_import.CATALOG_KINDS:
+		for file_path in files:
+			if kinds[file_path] == kind:
+				counts |= libbrick.catalog_import.IMPORTERS[kind](BLW, file_path)
+	assert counts['bricklink_set_cache'] == 1
+	assert counts['bricklink_minifig_cache'] == 1
+	assert counts['bricklink_part_cache'] == 1
+	assert counts['bricklink_category_cache'] == 4
+	# two element IDs and two part,color keys; the unknown color is skipped
+	assert counts['bricklink_element_id_map_cache'] == 5
+
+	set_data = BLW.getSetData('75151-1', verbose=False)
+	assert set_data['category_name'] == 'Star Wars Episode 3'
+	assert set_data['year_released'] == 2016
+	assert BLW.getCategoryName(67) == 'Town City'
+	assert BLW.getMinifigData('sw0001a', verbose=False)['name'] == 'Battle Droid Tan & Black'
+	assert BLW.getPartData('3001', verbose=False)['image_url'] == '//img.bricklink.com/PL/3001.jpg'
+	assert BLW.getPartData('3002', verbose=False)['weight'] == '1.76'
+	assert BLW.getColorNameFromColorID(5) == 'Red'
+	assert BLW.getColorDataFromColorID(1)['color_code'] == '#FFFFFF'
+	assert BLW.elementIDtoPartIDandColorID(300121, verbose=False) == ['3001', 5]
+	assert BLW.partIDandColorIDtoElementID('3001', 5, verbose=False) == 4181134
+	BLW.close()
+
+
+#============================================
+def test_rebrickable_csv_fills_sets_themes_and_parts(tmp_path):
+	"""
+	Rebrickable downloads, gzipped or not, land in the rebrick caches.
+	"""
+	themes = _write(tmp_path, 'themes.csv.gz',
+		'id,name,parent_id\n158,Star Wars,\n171,Star Wars Episode 3,158\n1,Technic,\n')
+	sets = _write(tmp_path, 'sets.csv',
+		'set_num,name,year,theme_id,num_parts,img_url\n'
+		+ '75151-1,Clone Turbo Tank,2016,171,903,https://cdn.rebrickable.com/75151-1.jpg\n')
+	parts = _write(tmp_path, 'parts.csv',
+		'part_num,name,part_cat_id,part_material\n3001,Brick 2 x 4,11,Plastic\n')
+	minifigs = _write(tmp_path, 'minifigs.csv',
+		'fig_num,name,num_parts,img_url\nfig-000001,Toy Story Figure,4,\n')
+	rbw = types.SimpleNamespace(rebrick_theme_cache={}, rebrick_set_cache={},
+		rebrick_part_cache={}, rebrick_minifig_cache={})
+	for file_path in (themes, sets, parts, minifigs):
+		kind = libbrick.catalog_import.detect_catalog_kind(file_path)
+		libbrick.catalog_import.IMPORTERS[kind](rbw, file_path)
+	assert rbw.rebrick_theme_cache == {158: 'Star Wars', 171: 'Star Wars Episode 3', 1: 'Technic'}
+	set_data = rbw.rebrick_set_cache['75151-1']
+	assert set_data['theme_id'] == 171
+	assert set_data['num_parts'] == 903
+	assert set_data['set_img_url'].endswith('75151-1.jpg')
+	assert rbw.rebrick_part_cache['3001']['part_cat_id'] == 11
+	assert rbw.rebrick_minifig_cache['fig-000001']['num_parts'] == 4
+
+
+#============================================
+def test_imported_minifig_runs_through_the_label_image_path(monkeypatch, tmp_path):
+	"""
+	A minifig known only from the catalog download still gets its label image.
+	"""
+	monkeypatch.setenv(libbrick.path_utils.CACHE_DIR_ENV_VAR, str(tmp_path))
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	BLW = bricklink_wrapper.BrickLink()
+	def no_api(url):
+		raise AssertionError(f"unexpected API call {url}")
+	monkeypatch.setattr(BLW, '_bricklink_fetch', no_api)
+	libbrick.catalog_import.import_bricklink_items(BLW, _write(tmp_path, 'items.xml', ITEMS_XML))
+	minifig_data = BLW.getMinifigData('sw0001a', verbose=False)
+	BLW.close()
+	downloaded = []
+	def fake_download(image_url, filename, session=None):
+		downloaded.append(image_url)
+		PIL.Image.new('RGB', (8, 8), (0, 0, 255)).save(filename, format='PNG')
+		return filename
+	def fake_process(raw_filename, processed_filename):
+		PIL.Image.open(raw_filename).save(processed_filename)
+		return processed_filename
+	monkeypatch.setattr(libbrick.image_cache, "download_image", fake_download)
+	monkeypatch.setattr(libbrick.image_cache, "process_image", fake_process)
+	filename = super_make_minifig_labels.download_minifig_image(minifig_data, 'sw0001a',
+		output_dir=str(tmp_path))
+	assert downloaded == ['//img.bricklink.com/ItemImage/MN/0/sw0001a.png']
+	assert filename.endswith('minifig_sw0001a.png')
@@ -1,4 +1,10 @@
+import io
 import os
+import json
+import shutil
+
+import pytest
+import PIL.Image
 
 import libbrick.image_cache
 import libbrick.path_utils
@@ -40,3 +46,336 @@ def test_get_cached_image_paths(monkeypatch, tmp_path):
 	monkeypatch.setattr(libbrick.image_cache, "process_image", fake_process)
 	result = libbrick.image_cache.get_cached_image("https://example.com/x.jpg", "set", "123")
 	assert result == os.path.join("images", "processed", "set_123.png")
+
+#============================
+
+class FakeRembgProcess(object):
+	"""
+	Stands in for the rembg worker process; each request is answered at once.
+	"""
+
+	def __init__(self):
+		self.replies = [json.dumps({'ready': True}) + '\n']
+		self.exited = False
+		self.returncode = None
+		# the worker talks over its own stdin and stdout
+		self.stdin = self
+		self.stdout = self
+
+	def write(self, text):
+		if self.exited:
+			return
+		request = json.loads(text)
+		if request['input'].endswith('bad.png'):
+			self.replies.append(json.dumps({'error': 'cannot identify image file'}) + '\n')
+			return
+		shutil.copyfile(request['input'], request['output'])
+		self.replies.append(json.dumps({'output': request['output']}) + '\n')
+
+	def flush(self):
+		pass
+
+	def readline(self):
+		if len(self.replies) == 0:
+			return ''
+		return self.replies.pop(0)
+
+	def idle_exit(self):
+		# exited but not yet reaped, so poll() still reports it running
+		self.exited = True
+
+	def close(self):
+		self.exited = True
+
+	def poll(self):
+		return self.returncode
+
+	def wait(self, timeout=None):
+		self.returncode = 0
+		return self.returncode
+
+	def kill(self):
+		self.exited = True
+
+def test_rembg_worker_is_reused_and_restarted_after_idle(monkeypatch, tmp_path):
+	"""
+	One worker process serves many images, and a new one starts after it idles out.
+	"""
+	processes = []
+	def fake_popen(command, **kwargs):
+		process = FakeRembgProcess()
+		processes.append(process)
+		return process
+	monkeypatch.setattr(libbrick.image_cache.subprocess, "Popen", fake_popen)
+	monkeypatch.setattr(libbrick.image_cache.select, "select", lambda r, w, x, timeout: (r, [], []))
+	worker = libbrick.image_cache.RembgWorker('isnet-general-use', str(tmp_path / ".rembg.lock"))
+	for i in range(3):
+		raw_path = tmp_path / f"raw_{i}.png"
+		PIL.Image.new('RGBA', (4, 4), (255, 0, 0, 255)).save(raw_path)
+		worker.remove_background(str(raw_path), str(tmp_path / f"processed_{i}.png"))
+	assert len(processes) == 1
+	processes[0].idle_exit()
+	worker.remove_background(str(tmp_path / "raw_0.png"), str(tmp_path / "again.png"))
+	assert len(processes) == 2
+	assert os.path.isfile(tmp_path / "again.png")
+	with pytest.raises(RuntimeError):
+		worker.remove_background(str(tmp_path / "bad.png"), str(tmp_path / "bad_out.png"))
+	assert worker.images == 5
+	worker.close()
+
+#============================
+
+def test_rembg_worker_that_hangs_on_start_is_stopped(monkeypatch, tmp_path):
+	"""
+	A worker that never reports ready is killed instead of blocking the caller.
+	"""
+	processes = []
+	def fake_popen(command, **kwargs):
+		process = FakeRembgProcess()
+		process.replies = []
+		processes.append(process)
+		return process
+	monkeypatch.setattr(libbrick.image_cache.subprocess, "Popen", fake_popen)
+	monkeypatch.setattr(libbrick.image_cache.select, "select", lambda r, w, x, timeout: ([], [], []))
+	worker = libbrick.image_cache.RembgWorker('isnet-general-use', str(tmp_path / ".rembg.lock"))
+	with pytest.raises(RuntimeError):
+		worker._start(timeout=0.1)
+	assert worker.process is None
+	assert processes[0].exited is True
+
+#============================
+
+class FakeStreamedResponse(object):
+	"""
+	Context manager part of a streamed requests.Response.
+	"""
+	closed = False
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.closed = True
+
+def test_download_image_closes_the_response_on_error(monkeypatch, tmp_path):
+	"""
+	A failed fetch still releases its pooled connection.
+	"""
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	response = FakeStreamedResponse()
+	response.status_code = 404
+	class FakeSession:
+		def get(self, url, stream, timeout, headers):
+			return response
+	filename, _ = libbrick.image_cache.cached_image_paths("set", "1-1")
+	with pytest.raises(FileNotFoundError):
+		libbrick.image_cache.download_image("https://localhost/x.jpg", filename, FakeSession())
+	assert response.closed is True
+
+#============================
+
+def test_download_image_leaves_no_partial_file(monkeypatch, tmp_path):
+	"""
+	The image appears under its name only once fully written.
+	"""
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	class FakeResponse(FakeStreamedResponse):
+		status_code = 200
+		headers = {}
+		raw = io.BytesIO(b"jpeg bytes")
+	class FakeSession:
+		def get(self, url, stream, timeout, headers):
+			return FakeResponse()
+	filename, _ = libbrick.image_cache.cached_image_paths("set", "1-1")
+	libbrick.image_cache.download_image("https://localhost/x.jpg", filename, FakeSession())
+	with open(filename, "rb") as f:
+		assert f.read() == b"jpeg bytes"
+	assert os.listdir(os.path.dirname(filename)) == ["set_1-1.jpg"]
+
+#============================
+
+def test_process_images_error_in_rembg_stage_does_not_hang(monkeypatch, tmp_path):
+	"""
+	An unexpected rembg error reaches the caller while downloads wait on a full queue.
+	"""
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	monkeypatch.setattr(libbrick.image_cache, "ensure_image_tools_installed", lambda: None)
+	def fake_download(image_url, filename, session=None):
+		PIL.Image.new('RGB', (4, 4), (0, 0, 255)).save(filename, format='PNG')
+		return filename
+	def failing_rembg(raw_filename, processed_filename, model):
+		raise ValueError("model file is corrupt")
+	monkeypatch.setattr(libbrick.image_cache, "download_image", fake_download)
+	monkeypatch.setattr(libbrick.image_cache, "remove_background", failing_rembg)
+	items = [(f"https://example.com/{i}.jpg", "minifig", f"fig{i}") for i in range(12)]
+	with pytest.raises(ValueError):
+		libbrick.image_cache.process_images(items, download_workers=4, trim_workers=1,
+			queue_size=1)
+
+#============================
+
+def _image_bytes(color: tuple) -> bytes:
+	"""
+	A small PNG file of one color.
+	"""
+	buffer = io.BytesIO()
+	PIL.Image.new('RGB', (8, 8), color).save(buffer, format='PNG')
+	return buffer.getvalue()
+
+def test_download_image_revalidates_with_conditional_get(monkeypatch, tmp_path):
+	"""
+	A stale image is checked with If-None-Match, and only a changed one is reprocessed.
+	"""
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	answers = [(200, _image_bytes((255, 0, 0)), '"v1"'), (304, b"", '"v1"'),
+		(200, _image_bytes((0, 0, 255)), '"v2"')]
+	sent_headers = []
+	responses = []
+	class FakeResponse(FakeStreamedResponse):
+		def __init__(self, status_code, body, etag):
+			self.status_code = status_code
+			self.raw = io.BytesIO(body)
+			self.headers = {'ETag': etag}
+	class FakeSession:
+		def get(self, url, stream, timeout, headers):
+			sent_headers.append(headers)
+			responses.append(FakeResponse(*answers.pop(0)))
+			return responses[-1]
+	raw_path, processed_path = libbrick.image_cache.cached_image_paths("minifig", "sw0001a")
+	# a download cut short by a killed run is not a valid cached image
+	with open(raw_path, "wb") as f:
+		f.write(_image_bytes((255, 0, 0))[:20])
+	url = "https://localhost/sw0001a.png"
+	libbrick.image_cache.download_image(url, raw_path, FakeSession())
+	assert sent_headers == [{}]
+	libbrick.image_cache.download_image(url, raw_path, FakeSession())
+	assert len(sent_headers) == 1
+	index = libbrick.image_cache._index_for(raw_path)
+	def age_entry():
+		entry = index.sources["minifig_sw0001a.jpg"]
+		entry['time'] -= libbrick.image_cache.IMAGE_REVALIDATE_SECONDS + 1
+		index.sources["minifig_sw0001a.jpg"] = entry
+	with open(processed_path, "wb") as f:
+		f.write(_image_bytes((1, 2, 3)))
+	libbrick.image_cache.record_processed_image(raw_path, processed_path)
+	assert libbrick.image_cache.processed_image_is_current(raw_path, processed_path)
+	age_entry()
+	assert libbrick.image_cache.image_needs_download(url, raw_path, processed_path)
+	libbrick.image_cache.download_image(url, raw_path, FakeSession())
+	assert sent_headers[1] == {'If-None-Match': '"v1"'}
+	assert libbrick.image_cache.processed_image_is_current(raw_path, processed_path)
+	age_entry()
+	libbrick.image_cache.download_image(url, raw_path, FakeSession())
+	assert index.sources["minifig_sw0001a.jpg"]['etag'] == '"v2"'
+	assert not libbrick.image_cache.processed_image_is_current(raw_path, processed_path)
+	# the 304 answer and the downloads all give their connection back
+	assert all(response.closed for response in responses)
+
+#============================
+
+def test_identical_raw_images_are_processed_once(monkeypatch, tmp_path):
+	"""
+	A second minifig with the same raw image links the first processed copy.
+	"""
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	monkeypatch.setattr(libbrick.image_cache, "ensure_image_tools_installed", lambda: None)
+	monkeypatch.setattr(libbrick.image_cache, "get_rembg_worker", lambda model, lock_path: None)
+	rembg_calls = []
+	def fake_rembg(raw_filename, output_filename, model, lock_path):
+		rembg_calls.append(raw_filename)
+		with PIL.Image.open(raw_filename) as image:
+			image.convert('RGBA').save(output_filename)
+	monkeypatch.setattr(libbrick.image_cache, "_run_rembg_command", fake_rembg)
+	paths = []
+	for item_id in ("sw0001a", "sw0001b"):
+		raw_path, processed_path = libbrick.image_cache.cached_image_paths("minifig", item_id)
+		with open(raw_path, "wb") as f:
+			f.write(_image_bytes((0, 128, 0)))
+		libbrick.image_cache.process_image(raw_path, processed_path)
+		paths.append((raw_path, processed_path))
+	assert len(rembg_calls) == 1
+	assert os.path.samefile(paths[0][0], paths[1][0])
+	assert os.path.samefile(paths[0][1], paths[1][1])
+	# other processing settings make the stored image stale
+	assert libbrick.image_cache.processed_image_is_current(*paths[0])
+	assert not libbrick.image_cache.processed_image_is_current(*paths[0], model='u2net')
+
+#============================
+
+def test_process_images_pipeline_trims_every_image(monkeypatch, tmp_path):
+	"""
+	Images flow through download, one-at-a-time rembg, and trim processes.
+	"""
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: str(tmp_path))
+	monkeypatch.setattr(libbrick.image_cache, "ensure_image_tools_installed", lambda: None)
+	def fake_download(image_url, filename, session=None):
+		if image_url.endswith("missing.jpg"):
+			raise FileNotFoundError("image fetch HTTP 404")
+		# an opaque square inside a transparent border
+		image = PIL.Image.new('RGBA', (40, 40), (0, 0, 0, 0))
+		image.paste((0, 0, 255, 255), (10, 10, 30, 30))
+		image.save(filename, format='PNG')
+		return filename
+	active = []
+	overlaps = []
+	def fake_rembg(raw_filename, output_filename, model, lock_path):
+		active.append(raw_filename)
+		overlaps.append(len(active))
+		if raw_filename.endswith("broken.jpg"):
+			# rembg output that the trim process cannot read
+			with open(output_filename, "wb") as f:
+				f.write(b"not an image")
+		else:
+			with PIL.Image.open(raw_filename) as image:
+				image.save(output_filename)
+		active.remove(raw_filename)
+	monkeypatch.setattr(libbrick.image_cache, "download_image", fake_download)
+	monkeypatch.setattr(libbrick.image_cache, "get_rembg_worker", lambda model, lock_path: None)
+	monkeypatch.setattr(libbrick.image_cache, "_run_rembg_command", fake_rembg)
+	items = [(f"https://example.com/{i}.jpg", "minifig", f"fig{i}") for i in range(6)]
+	items.append(("https://example.com/missing.jpg", "minifig", "gone"))
+	items.append(("https://example.com/broken.jpg", "minifig", "broken"))
+	results = libbrick.image_cache.process_images(items, download_workers=3, trim_workers=2,
+		queue_size=2)
+	assert results[("minifig", "gone")] is None
+	# one bad trim is left out, the rest of the batch still finishes
+	assert results[("minifig", "broken")] is None
+	assert max(overlaps) == 1
+	for i in range(6):
+		processed_path = results[("minifig", f"fig{i}")]
+		with PIL.Image.open(processed_path) as image:
+			# trimmed to the square, then 10 percent cropped toward the label shape
+			assert image.size == (18, 20)
+	processed_dir = os.path.dirname(results[("minifig", "fig0")])
+	assert sorted(os.listdir(processed_dir)) == [f"minifig_fig{i}.png" for i in range(6)]
+
+#============================
+
+def test_get_image_rendition_resamples_to_the_label_slot(tmp_path):
+	"""
+	Large images get a slot-sized rendition, made once; small ones are used as is.
+	"""
+	processed_dir = tmp_path / "images" / "processed"
+	processed_dir.mkdir(parents=True)
+	cutout_path = processed_dir / "minifig_sw0001a.png"
+	cutout = PIL.Image.new('RGBA', (1200, 1600), (0, 0, 0, 0))
+	cutout.paste((200, 30, 30, 255), (100, 100, 1100, 1500))
+	cutout.save(cutout_path)
+	# a 1.45 x 1.95 inch slot at 300 dpi
+	rendition = libbrick.image_cache.get_image_rendition(str(cutout_path), 104.4, 140.4)
+	assert os.path.dirname(rendition) == str(tmp_path / "images" / "renditions")
+	with PIL.Image.open(rendition) as image:
+		assert image.size == (435, 580)
+		assert image.mode == 'P'
+		assert 'transparency' in image.info
+	mtime = os.path.getmtime(rendition)
+	assert libbrick.image_cache.get_image_rendition(str(cutout_path), 104.4, 140.4) == rendition
+	assert os.path.getmtime(rendition) == mtime
+
+	photo_path = processed_dir / "set_75151-1.png"
+	PIL.Image.new('RGB', (2000, 1000), (30, 30, 200)).save(photo_path)
+	assert libbrick.image_cache.get_image_rendition(str(photo_path), 72.0, 72.0).endswith('_300x150.jpg')
+
+	small_path = processed_dir / "minifig_tiny.png"
+	PIL.Image.new('RGBA', (80, 120), (0, 0, 0, 255)).save(small_path)
+	assert libbrick.image_cache.get_image_rendition(str(small_path), 104.4, 140.4) == str(small_path)
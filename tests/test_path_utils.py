@@ -1,3 +1,4 @@
+import os
 import subprocess
 
 import libbrick.path_utils
@@ -32,3 +33,38 @@ def test_get_git_root_failure(monkeypatch, tmp_path):
 		fake_check_output,
 	)
 	assert libbrick.path_utils.get_git_root(str(tmp_path)) is None
+
+#============================
+
+def test_get_git_root_runs_git_once_per_directory(monkeypatch, tmp_path):
+	"""
+	Repeated lookups for one directory fork git only once.
+	"""
+	calls = []
+	def fake_check_output(cmd, cwd=None, universal_newlines=None):
+		calls.append(cwd)
+		return str(tmp_path) + "\n"
+	monkeypatch.setattr(
+		libbrick.path_utils.subprocess,
+		"check_output",
+		fake_check_output,
+	)
+	libbrick.path_utils.clear_path_cache()
+	for _ in range(3):
+		assert libbrick.path_utils.get_git_root(str(tmp_path)) == str(tmp_path)
+	assert calls == [str(tmp_path)]
+	libbrick.path_utils.clear_path_cache()
+
+#============================
+
+def test_get_cache_dir_env_override(monkeypatch, tmp_path):
+	"""
+	LIBBRICK_CACHE_DIR wins over the git root.
+	"""
+	cache_dir = os.path.join(str(tmp_path), "shared_cache")
+	monkeypatch.setenv(libbrick.path_utils.CACHE_DIR_ENV_VAR, cache_dir)
+	monkeypatch.setattr(libbrick.path_utils, "get_git_root", lambda: "/nonexistent")
+	assert libbrick.path_utils.get_cache_dir(create=True) == cache_dir
+	assert os.path.isdir(cache_dir)
+	monkeypatch.delenv(libbrick.path_utils.CACHE_DIR_ENV_VAR)
+	assert libbrick.path_utils.get_cache_dir() == os.path.join("/nonexistent", "CACHE")
@@ -157,3 +157,18 @@ def test_pick_valid_image_url_skips_empty_strings():
 	urls = ['', None, 'https://url1.jpg']
 	result = libbrick.price_export.pick_valid_image_url(checker, urls)
 	assert result == 'https://url1.jpg'
+
+
+#============================================
+def test_ordered_row_writer_writes_in_input_order():
+	"""OrderedRowWriter writes rows put out of order in index order with one header."""
+	rows = []
+	class _ListWriter:
+		def writerow(self, row):
+			rows.append(row)
+	ordered = libbrick.price_export.OrderedRowWriter(_ListWriter())
+	assert ordered.put(1, {'name': 'b'}) == 0
+	assert ordered.put(2, {'name': 'c'}) == 0
+	assert ordered.put(0, {'name': 'a'}) == 3
+	assert rows[0] == ordered.allkeys
+	assert [row[ordered.allkeys.index('name')] for row in rows[1:]] == ['a', 'b', 'c']
@@ -0,0 +1,62 @@
+import csv
+import time
+import argparse
+
+import pytest
+
+import price_out_parts_in_set
+
+
+#============================================
+class _FakeBrickLink:
+	"""
+	Stand-in wrapper that only needs close().
+	"""
+	def __init__(self):
+		self.closed = False
+
+	def close(self):
+		self.closed = True
+
+
+#============================================
+def test_run_cli_with_workers_keeps_input_order(monkeypatch, tmp_path):
+	"""
+	Parts that finish out of order are still written in input order.
+	"""
+	def fake_collect(part_dict, BLW, args):
+		# later parts finish first
+		time.sleep(0.05 * (4 - part_dict['index']))
+		return {'item_id': part_dict['index'], 'lot value': 1.0}
+	monkeypatch.setattr(price_out_parts_in_set, "collect_data_for_part", fake_collect)
+	parts_tree = [{'index': n} for n in range(4)]
+	args = argparse.Namespace(workers=4, debug=False)
+	csvfile = str(tmp_path / "parts.csv")
+	BLW = _FakeBrickLink()
+	price_out_parts_in_set.run_cli(parts_tree, args, BLW, csvfile)
+	with open(csvfile, newline='') as f:
+		rows = list(csv.reader(f, delimiter='\t'))
+	item_column = rows[0].index('item_id')
+	assert [row[item_column] for row in rows[1:]] == ['0', '1', '2', '3']
+	assert BLW.closed is True
+
+
+#============================================
+def test_run_cli_error_cancels_queued_parts(monkeypatch, tmp_path):
+	"""
+	A failing part stops the run without looking up the parts still queued.
+	"""
+	looked_up = []
+	def fake_collect(part_dict, BLW, args):
+		looked_up.append(part_dict['index'])
+		if part_dict['index'] == 0:
+			raise RuntimeError("quota exceeded")
+		return {'item_id': part_dict['index'], 'lot value': 1.0}
+	monkeypatch.setattr(price_out_parts_in_set, "collect_data_for_part", fake_collect)
+	parts_tree = [{'index': n} for n in range(200)]
+	args = argparse.Namespace(workers=1, debug=False)
+	BLW = _FakeBrickLink()
+	with pytest.raises(RuntimeError):
+		price_out_parts_in_set.run_cli(parts_tree, args, BLW, str(tmp_path / "parts.csv"))
+	assert len(looked_up) < len(parts_tree)
+	assert BLW.closed is True
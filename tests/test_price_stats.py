@@ -0,0 +1,61 @@
+import random
+import statistics
+
+import libbrick.price_stats
+
+
+#============================================
+def _expanded_median_price(price_details: dict, min_qty: int, trim_above_median: bool) -> int:
+	"""
+	The quantity-expanding median compilePriceData used before.
+	"""
+	if int(price_details['total_quantity']) < 1:
+		return -1
+	prices = []
+	for item in price_details['price_detail']:
+		if int(item['quantity']) < min_qty:
+			continue
+		for i in range(int(item['quantity'])):
+			prices.append(int(float(item['unit_price'])*100))
+	if len(prices) <= 5:
+		return -1
+	median = int(statistics.median(prices))
+	if trim_above_median is True:
+		median = int(statistics.median([price for price in prices if price <= median]))
+	return median
+
+
+#============================================
+def test_weighted_median_matches_expanded_median():
+	"""
+	Odd and even totals give what statistics.median gives on the expanded list.
+	"""
+	assert libbrick.price_stats.weighted_median([(5, 1), (1, 2), (9, 1)]) == 3.0
+	assert libbrick.price_stats.weighted_median([(5, 1), (1, 2), (9, 2)]) == 5
+	assert libbrick.price_stats.weighted_median([(7, 0), (4, 3)]) == 4
+	random.seed(7)
+	for _ in range(200):
+		pairs = [(random.randint(1, 60), random.randint(0, 6)) for _ in range(random.randint(1, 9))]
+		if sum(quantity for value, quantity in pairs) == 0:
+			continue
+		expanded = [value for value, quantity in pairs for _ in range(quantity)]
+		assert libbrick.price_stats.weighted_median(pairs) == statistics.median(expanded)
+
+
+#============================================
+def test_median_price_is_identical_to_the_expanding_code():
+	"""
+	Random price guides give the same cents, trimmed or not, for any min_qty.
+	"""
+	random.seed(11)
+	for _ in range(300):
+		price_detail = [{'quantity': random.randint(1, 12),
+			'unit_price': '{0:.4f}'.format(random.uniform(0.01, 3.0))}
+			for _ in range(random.randint(0, 8))]
+		price_details = {'total_quantity': sum(item['quantity'] for item in price_detail),
+			'price_detail': price_detail}
+		for min_qty in (1, 3):
+			for trim in (False, True):
+				expected = _expanded_median_price(price_details, min_qty, trim)
+				result = libbrick.price_stats.median_price(price_details, min_qty, trim)
+				assert result == expected
@@ -0,0 +1,126 @@
+import os
+import json
+import asyncio
+
+import pytest
+
+import libbrick.rate_limiter
+
+
+#============================================
+def test_token_bucket_allows_burst_then_paces():
+	"""
+	The first capacity calls are free, later calls wait one interval each.
+	"""
+	now = [0.0]
+	slept = []
+	def fake_sleep(seconds):
+		slept.append(seconds)
+		now[0] += seconds
+	bucket = libbrick.rate_limiter.TokenBucket(2.0, 3, clock=lambda: now[0], sleep=fake_sleep)
+	for _ in range(3):
+		assert bucket.acquire() == 0.0
+	assert bucket.acquire() == pytest.approx(0.5)
+	assert bucket.acquire() == pytest.approx(0.5)
+	# an idle pause refills the bucket
+	now[0] += 10.0
+	assert bucket.acquire() == 0.0
+	assert slept == [pytest.approx(0.5), pytest.approx(0.5)]
+
+
+#============================================
+def test_daily_quota_is_persisted_and_enforced(tmp_path):
+	"""
+	Counts survive a new DailyQuota object and the limit raises, not LookupError.
+	"""
+	quota_path = os.path.join(str(tmp_path), libbrick.rate_limiter.QUOTA_FILE_NAME)
+	quota = libbrick.rate_limiter.DailyQuota('api.example.com', 2, quota_path, flush_every=1)
+	assert quota.record('price') == 1
+	other = libbrick.rate_limiter.DailyQuota('api.example.com', 2, quota_path, flush_every=1)
+	assert other.record('items') == 2
+	assert other.used() == 2
+	assert other.remaining() == 0
+	assert other.used_by_endpoint() == {'price': 1, 'items': 1}
+	with pytest.raises(libbrick.rate_limiter.QuotaExceededError):
+		other.record()
+
+
+#============================================
+def test_daily_quota_window_rolls_over_24_hours(tmp_path):
+	"""
+	Calls drop out of the window 24 hours later, not at midnight.
+	"""
+	quota_path = os.path.join(str(tmp_path), libbrick.rate_limiter.QUOTA_FILE_NAME)
+	now = [1000 * 3600.0]
+	quota = libbrick.rate_limiter.DailyQuota('api.example.com', 3, quota_path, clock=lambda: now[0])
+	quota.record('price')
+	now[0] += 12 * 3600
+	quota.record('price')
+	quota.record('colors')
+	with pytest.raises(libbrick.rate_limiter.QuotaExceededError):
+		quota.record()
+	# the first call is now 24 hours old and out of the window
+	now[0] += 12 * 3600
+	assert quota.remaining() == 1
+	assert quota.record() == 3
+	# a server-side refusal fills the window for every process
+	other = libbrick.rate_limiter.DailyQuota('api.example.com', 5, quota_path, clock=lambda: now[0])
+	other.mark_exhausted()
+	assert other.remaining() == 0
+
+
+#============================================
+def test_daily_quota_batches_file_writes(tmp_path):
+	"""
+	Calls stay in memory until flush_every of them, or a flush, write the file.
+	"""
+	quota_path = os.path.join(str(tmp_path), libbrick.rate_limiter.QUOTA_FILE_NAME)
+	quota = libbrick.rate_limiter.DailyQuota('api.example.com', 10, quota_path, flush_every=3)
+	quota.record('price')
+	quota.record('price')
+	assert not os.path.exists(quota_path)
+	assert quota.used_by_endpoint() == {'price': 2}
+	quota.record('items')
+	other = libbrick.rate_limiter.DailyQuota('api.example.com', 10, quota_path)
+	assert other.used_by_endpoint() == {'price': 2, 'items': 1}
+	quota.record('items')
+	quota.flush()
+	assert other.used() == 4
+
+
+#============================================
+def test_wait_async_counts_the_call(tmp_path):
+	"""
+	The async wait records the call against the quota like wait() does.
+	"""
+	quota_path = os.path.join(str(tmp_path), libbrick.rate_limiter.QUOTA_FILE_NAME)
+	limiter = libbrick.rate_limiter.RateLimiter('api.example.com', 100.0, 5, 10, quota_path)
+	assert asyncio.run(limiter.wait_async('price')) == 0.0
+	assert limiter.remaining() == 9
+
+
+#============================================
+def test_daily_quota_ignores_the_old_per_date_format(tmp_path):
+	"""
+	A count saved in the once-a-day format does not block calls.
+	"""
+	quota_path = os.path.join(str(tmp_path), libbrick.rate_limiter.QUOTA_FILE_NAME)
+	with open(quota_path, 'w') as f:
+		json.dump({'api.example.com': {'date': '2000-01-01', 'count': 5}}, f)
+	quota = libbrick.rate_limiter.DailyQuota('api.example.com', 5, quota_path)
+	assert quota.used() == 0
+	assert quota.record() == 1
+
+
+#============================================
+def test_schedule_by_value_keeps_order_unless_the_budget_is_short():
+	"""
+	All items in order when they fit, otherwise the most valuable first.
+	"""
+	items = ['a', 'b', 'c', 'd']
+	value = {'a': 10, 'b': 90, 'c': 50, 'd': 90}.get
+	assert libbrick.rate_limiter.schedule_by_value(items, 16, cost=4, value=value) == (items, [])
+	assert libbrick.rate_limiter.schedule_by_value(items, None, cost=4) == (items, [])
+	scheduled, deferred = libbrick.rate_limiter.schedule_by_value(items, 9, cost=4, value=value)
+	assert scheduled == ['b', 'd']
+	assert deferred == ['c', 'a']
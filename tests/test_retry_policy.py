@@ -0,0 +1,80 @@
+import pytest
+
+import libbrick.path_utils
+import libbrick.wrappers.wrapper_base as wrapper_base
+
+
+#============================================
+class _NoCacheWrapper(wrapper_base.BaseWrapperClass):
+	"""
+	Wrapper with no caches, only the API call helpers.
+	"""
+	def __init__(self):
+		self.data_caches = {}
+		self.start()
+
+
+#============================================
+def test_raise_for_status_sorts_failures():
+	"""
+	429 is throttled with Retry-After, 5xx transient, 404 not found, 401 not retried.
+	"""
+	wrapper_base.raise_for_status(200)
+	with pytest.raises(wrapper_base.ThrottledError) as error:
+		wrapper_base.raise_for_status(429, {'Retry-After': '7'}, 'colors')
+	assert error.value.retry_after == 7.0
+	with pytest.raises(wrapper_base.TransientError):
+		wrapper_base.raise_for_status(503)
+	with pytest.raises(LookupError):
+		wrapper_base.raise_for_status(404)
+	with pytest.raises(wrapper_base.ApiError) as error:
+		wrapper_base.raise_for_status(401)
+	assert not isinstance(error.value, wrapper_base.TransientError)
+
+
+#============================================
+def test_call_with_retry_backs_off_then_succeeds(monkeypatch, tmp_path):
+	"""
+	Transient failures are retried, Retry-After wins over the jittered backoff.
+	"""
+	monkeypatch.setenv(libbrick.path_utils.CACHE_DIR_ENV_VAR, str(tmp_path))
+	wrapper = _NoCacheWrapper()
+	slept = []
+	wrapper.retry_policy = wrapper_base.RetryPolicy(max_attempts=4, base_delay=0.5, sleep=slept.append)
+	failures = [wrapper_base.TransientError('reset'), wrapper_base.ThrottledError('slow down', 3)]
+	def call():
+		if failures:
+			raise failures.pop(0)
+		return 'ok'
+	assert wrapper.call_with_retry('retry.example.com', call) == 'ok'
+	assert 0 <= slept[0] <= 0.5
+	assert slept[1] == 3
+	assert wrapper.api_retries == 2
+	# not-found answers are returned at once
+	def missing():
+		raise wrapper_base.NotFoundError('no such part')
+	with pytest.raises(LookupError):
+		wrapper.call_with_retry('retry.example.com', missing)
+	assert len(slept) == 2
+
+
+#============================================
+def test_circuit_breaker_opens_and_lets_a_trial_through():
+	"""
+	After the threshold the host fails fast, until one trial call after the timeout.
+	"""
+	now = [0.0]
+	breaker = wrapper_base.CircuitBreaker('down.example.com', failure_threshold=2,
+		reset_timeout=30, clock=lambda: now[0])
+	breaker.before_call()
+	breaker.record_failure()
+	breaker.record_failure()
+	with pytest.raises(wrapper_base.CircuitOpenError):
+		breaker.before_call()
+	now[0] += 31
+	breaker.before_call()
+	# a second caller during the trial still fails fast
+	with pytest.raises(wrapper_base.CircuitOpenError):
+		breaker.before_call()
+	breaker.record_success()
+	breaker.before_call()